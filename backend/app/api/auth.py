@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models import models, schemas
 from app.services.auth_service import AuthService, verify_token
+from app.services.principal_cache import Principal, principal_cache
 from passlib.context import CryptContext
 
 router = APIRouter()
@@ -21,7 +25,7 @@ class DemoLoginRequest(BaseModel):
     password: str
 
 @router.post("/google", response_model=schemas.TokenResponse)
-async def google_auth(
+def google_auth(
     request: GoogleTokenRequest,
     db: Session = Depends(get_db)
 ):
@@ -52,25 +56,32 @@ async def google_auth(
 @router.post("/demo", response_model=schemas.TokenResponse)
 async def demo_auth(
     request: DemoLoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Demo authentication for testing without Google OAuth"""
     # Create or get demo user
-    demo_user = db.query(models.User).filter(models.User.email == request.email).first()
+    demo_user = (await db.execute(
+        select(models.User).where(models.User.email == request.email)
+    )).scalars().first()
     
+    # bcrypt is deliberately slow CPU work; keep it off the event loop
     if not demo_user:
         demo_user = models.User(
             email=request.email,
             name=request.email.split('@')[0].title(),
             google_id=f"demo_{request.email}",
-            password_hash=pwd_context.hash(request.password)
+            password_hash=await run_in_threadpool(pwd_context.hash, request.password)
         )
         db.add(demo_user)
-        db.commit()
-        db.refresh(demo_user)
+        await db.commit()
+        await db.refresh(demo_user)
+        # A recycled user id must not resolve to a previous user's principal
+        await principal_cache.ainvalidate(demo_user.id)
     else:
         # Check password
-        if not demo_user.password_hash or not pwd_context.verify(request.password, demo_user.password_hash):
+        if not demo_user.password_hash or not await run_in_threadpool(
+            pwd_context.verify, request.password, demo_user.password_hash
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -89,14 +100,14 @@ async def demo_auth(
 @router.get("/me", response_model=schemas.User)
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current authenticated user"""
     token = credentials.credentials
     payload = verify_token(token)
     
     user_id = int(payload.get("sub"))
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     
     if not user:
         raise HTTPException(
@@ -108,14 +119,21 @@ async def get_current_user(
 
 async def get_current_user_dependency(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    """Dependency to get current user for protected routes"""
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """Dependency to get current user for protected routes.
+
+    Returns a cached Principal; the users table is only queried on a cache miss.
+    """
     token = credentials.credentials
     payload = verify_token(token)
     
     user_id = int(payload.get("sub"))
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    principal = await principal_cache.aget(user_id)
+    if principal is not None:
+        return principal
+    
+    user = await db.get(models.User, user_id)
     
     if not user:
         raise HTTPException(
@@ -123,4 +141,6 @@ async def get_current_user_dependency(
             detail="User not found"
         )
     
-    return user
+    principal = Principal.from_user(user)
+    await principal_cache.aset(principal)
+    return principal
@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Union
+from fastapi import HTTPException, status
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import models
+
+# Response header carrying the cursor for the next page of list endpoints
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque keyset cursor for the sort key of the last row on a page"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor, or raise 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError("wrong shape")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def entry_cursor(entry: models.Entry) -> str:
+    """Cursor positioned after this entry in (created_at desc, id desc) order"""
+    return encode_cursor([entry.created_at.isoformat(), entry.id])
+
+def entries_before_cursor(db: Union[Session, AsyncSession], cursor: str):
+    """Filter for entries strictly after the cursor in (created_at desc, id desc) order.
+
+    Uses a row-value comparison so the (user_id, ..., created_at, id) indexes
+    serve it as a range scan.
+    """
+    created_at, entry_id = decode_cursor(cursor, 2)
+    try:
+        created_at = datetime.fromisoformat(created_at)
+        entry_id = int(entry_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    created_value = created_at
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite compares the stored text; server defaults are written without
+        # fractional seconds, so bind the value in the same shape
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if created_at.microsecond else "%Y-%m-%d %H:%M:%S"
+        created_value = literal(created_at.strftime(fmt), String)
+    return tuple_(models.Entry.created_at, models.Entry.id) < tuple_(created_value, entry_id)
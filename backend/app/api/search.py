@@ -1,24 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import List
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import or_
+from typing import List, Optional
 
 from app.core.database import get_db, engine
 from app.models import models, schemas
 from app.api.auth import get_current_user_dependency
+from app.services.principal_cache import Principal
+from app.api.pagination import encode_cursor, decode_cursor
+from app.services.embedding_service import EmbeddingService
+from app.services.chunk_service import ChunkService
+from app.services.fulltext_index import sqlite_fts_available, search_sqlite_fts, search_postgres_fts
+from app.services.semantic_index import semantic_indexes
 
 router = APIRouter()
 
 def is_postgres():
     return str(engine.url).startswith("postgresql")
 
+def matching_passages(db: Session, entries: List[models.Entry], query: str) -> List[Optional[schemas.Passage]]:
+    """Best-matching passage of each entry, in result order"""
+    best = ChunkService.best_passages(db, [entry.id for entry in entries], query)
+    return [schemas.Passage.model_validate(best[entry.id]) if entry.id in best else None for entry in entries]
+
 @router.post("/", response_model=schemas.SearchResult)
-async def search_entries(
+def search_entries(
     search_query: schemas.SearchQuery,
-    current_user: models.User = Depends(get_current_user_dependency),
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
-    """Search user's entries using full-text search if PostgreSQL, else fallback to ilike"""
+    """Search user's entries using full-text search (PostgreSQL tsvector or SQLite FTS5), else fallback to ilike.
+
+    Full-text results are ranked and paginated by keyset: pass next_cursor back
+    as cursor for the following page.
+    """
     
     if not search_query.query.strip():
         raise HTTPException(
@@ -26,19 +41,52 @@ async def search_entries(
             detail="Search query cannot be empty"
         )
     
+    after = None
+    if search_query.cursor:
+        after = tuple(decode_cursor(search_query.cursor, 2))
+    
     if is_postgres():
-        # Use PostgreSQL full-text search
-        ts_vector = (
-            func.to_tsvector('english', models.Entry.title) +
-            func.to_tsvector('english', func.coalesce(models.Entry.content, '')) +
-            func.to_tsvector('english', func.coalesce(models.Entry.original_filename, ''))
+        # Generated, weighted tsvector column with a GIN index, ranked by ts_rank_cd
+        # One extra row tells whether another page follows
+        hits, total = search_postgres_fts(db, current_user.id, search_query.query, search_query.limit + 1, after)
+        next_cursor = None
+        if len(hits) > search_query.limit:
+            hits = hits[:search_query.limit]
+            last_entry, last_rank = hits[-1]
+            next_cursor = encode_cursor([last_rank, last_entry.id])
+        return schemas.SearchResult(
+            entries=[schemas.EntrySummary.model_validate(entry) for entry, _ in hits],
+            total=total,
+            scores=[rank for _, rank in hits],
+            passages=matching_passages(db, [entry for entry, _ in hits], search_query.query),
+            next_cursor=next_cursor
+        )
+    elif sqlite_fts_available(db):
+        # SQLite FTS5 index, ranked by BM25 with highlighted snippets
+        hits, total = search_sqlite_fts(db, current_user.id, search_query.query, search_query.limit + 1, after)
+        next_cursor = None
+        if len(hits) > search_query.limit:
+            hits = hits[:search_query.limit]
+            last_id, last_rank, _ = hits[-1]
+            next_cursor = encode_cursor([last_rank, last_id])
+        entries_by_id = {
+            entry.id: entry for entry in db.query(models.Entry).options(
+                load_only(*models.ENTRY_SUMMARY_COLUMNS)
+            ).filter(
+                models.Entry.id.in_([entry_id for entry_id, _, _ in hits])
+            ).all()
+        }
+        hits = [hit for hit in hits if hit[0] in entries_by_id]
+        entries = [entries_by_id[entry_id] for entry_id, _, _ in hits]
+        return schemas.SearchResult(
+            entries=[schemas.EntrySummary.model_validate(entry) for entry in entries],
+            total=total,
+            # bm25() is lower-is-better; flip it so higher means more relevant
+            scores=[-rank for _, rank, _ in hits],
+            snippets=[snippet for _, _, snippet in hits],
+            passages=matching_passages(db, entries, search_query.query),
+            next_cursor=next_cursor
         )
-        ts_query = func.plainto_tsquery('english', search_query.query)
-        entries = db.query(models.Entry).filter(
-            models.Entry.user_id == current_user.id,
-            models.Entry.processed == True,
-            ts_vector.op('@@')(ts_query)
-        ).limit(search_query.limit).all()
     else:
         # Fallback to ilike
         query_terms = search_query.query.lower().split()
@@ -49,35 +97,80 @@ async def search_entries(
                 models.Entry.content.ilike(f"%{term}%"),
                 models.Entry.original_filename.ilike(f"%{term}%")
             ])
-        entries = db.query(models.Entry).filter(
+        entries = db.query(models.Entry).options(
+            load_only(*models.ENTRY_SUMMARY_COLUMNS)
+        ).filter(
             models.Entry.user_id == current_user.id,
             models.Entry.processed == True,
             or_(*search_conditions)
         ).limit(search_query.limit).all()
     
     return schemas.SearchResult(
-        entries=[schemas.Entry.model_validate(entry) for entry in entries],
-        total=len(entries)
+        entries=[schemas.EntrySummary.model_validate(entry) for entry in entries],
+        total=len(entries),
+        passages=matching_passages(db, entries, search_query.query)
+    )
+
+@router.post("/semantic", response_model=schemas.SearchResult)
+def semantic_search(
+    search_query: schemas.SearchQuery,
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Search user's entries by meaning using their stored embeddings"""
+    
+    if not search_query.query.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query cannot be empty"
+        )
+    
+    try:
+        query_vector = EmbeddingService.encode([search_query.query])[0]
+    except ImportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    hits = semantic_indexes.search(db, current_user.id, query_vector, search_query.limit)
+    
+    # Hydrate in rank order; ids deleted since the index was synced drop out here
+    entries_by_id = {
+        entry.id: entry for entry in db.query(models.Entry).options(
+            load_only(*models.ENTRY_SUMMARY_COLUMNS)
+        ).filter(
+            models.Entry.id.in_([entry_id for entry_id, _ in hits]),
+            models.Entry.user_id == current_user.id
+        ).all()
+    }
+    ranked = [(entries_by_id[entry_id], score) for entry_id, score in hits if entry_id in entries_by_id]
+    
+    return schemas.SearchResult(
+        entries=[schemas.EntrySummary.model_validate(entry) for entry, _ in ranked],
+        total=len(ranked),
+        scores=[score for _, score in ranked],
+        # Embeddings are per entry; the passage shown is the one sharing most query terms
+        passages=matching_passages(db, [entry for entry, _ in ranked], search_query.query)
     )
 
 @router.get("/suggestions")
-async def get_search_suggestions(
-    current_user: models.User = Depends(get_current_user_dependency),
+def get_search_suggestions(
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """Get search suggestions based on user's content"""
     
-    # Get common words from titles and content
-    entries = db.query(models.Entry).filter(
+    # Only titles are needed; content is never loaded
+    titles = db.query(models.Entry.title).filter(
         models.Entry.user_id == current_user.id,
         models.Entry.processed == True
     ).limit(100).all()
     
     # Extract common terms (sanitized, unique, limited)
     suggestions = set()
-    for entry in entries:
-        if entry.title:
-            suggestion = entry.title[:30].strip()
+    for (title,) in titles:
+        if title:
+            suggestion = title[:30].strip()
             if suggestion:
                 suggestions.add(suggestion)
         if len(suggestions) >= 10:
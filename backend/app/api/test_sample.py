@@ -67,6 +67,30 @@ def test_file_upload_too_large(monkeypatch):
     response = client.post("/uploads/file", files=files, data=data, headers=headers)
     assert response.status_code == 413  # Should be 413 for file too large
 
+def test_oversized_upload_body_is_refused_before_parsing(monkeypatch):
+    from app.core import config
+    from app.api import uploads
+    monkeypatch.setattr(config.settings, "max_file_size", 1024)
+    headers = {"Authorization": f"Bearer {get_auth_token()}"}
+    body = b"x" * (uploads.MULTIPART_OVERHEAD_BYTES + 2048)
+    # Content-Length over the limit: refused from the headers alone
+    files = {"file": ("big.txt", io.BytesIO(body), "text/plain")}
+    response = client.post("/uploads/file", files=files, headers=headers)
+    assert response.status_code == 413
+    # No Content-Length: cut off once the streamed body passes the limit
+    read = []
+    def chunks():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.txt\"\r\n\r\n"
+        for start in range(0, len(body), 8192):
+            read.append(start)
+            yield body[start:start + 8192]
+        yield b"\r\n--b--\r\n"
+    response = client.post("/uploads/file", content=chunks(), headers={
+        **headers, "Content-Type": "multipart/form-data; boundary=b"
+    })
+    assert response.status_code == 413
+    assert len(read) * 8192 <= uploads.MULTIPART_OVERHEAD_BYTES + 1024 + 8192
+
 def test_auth_demo():
     payload = {"email": "demo@example.com", "password": "testpass"}
     response = client.post("/auth/demo", json=payload)
@@ -124,4 +148,983 @@ def test_db_pool_settings():
     print("Pool size:", getattr(engine.pool, 'size', lambda: 'n/a')())
     print("Max overflow:", getattr(engine.pool, '_max_overflow', 'n/a'))
     print("Timeout:", getattr(engine.pool, '_timeout', 'n/a'))
-    print("Recycle:", getattr(engine.pool, '_recycle', 'n/a')) 
\ No newline at end of file
+    print("Recycle:", getattr(engine.pool, '_recycle', 'n/a')) 
+
+
+def test_stream_upload_to_disk(tmp_path):
+    import asyncio
+    import hashlib
+    from fastapi import UploadFile
+    from app.services.file_service import stream_upload_to_disk, FileTooLargeError, SNIFF_BYTES
+    data = b"x" * (SNIFF_BYTES * 3)
+    saved = asyncio.run(stream_upload_to_disk(
+        UploadFile(file=io.BytesIO(data), filename="big.txt"), tmp_path / "big.txt", max_size=len(data)
+    ))
+    assert saved.file_size == len(data)
+    assert saved.content_hash == hashlib.sha256(data).hexdigest()
+    assert saved.head == data[:SNIFF_BYTES]
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(stream_upload_to_disk(
+            UploadFile(file=io.BytesIO(data), filename="big.txt"), tmp_path / "too_big.txt", max_size=len(data) - 1
+        ))
+    assert not (tmp_path / "too_big.txt").exists()
+
+def test_blob_store_dedup_and_refcount(tmp_path):
+    from app.services.blob_store import BlobStore
+    store = BlobStore(tmp_path)
+    content_hash = "ab" * 32
+    paths, spares = [], []
+    for index in range(2):
+        staged = store.staging_dir / f"upload{index}.tmp"
+        staged.write_bytes(b"same bytes")
+        path, spare = store.commit_file(staged, content_hash)
+        paths.append(path)
+        spares.append(spare)
+    assert paths[0] == paths[1] == str(tmp_path / "blobs" / "ab" / "ab" / content_hash)
+    assert spares[0] is None and os.path.exists(spares[1])
+    # A blob deleted before the second reference committed is restored from the spare
+    os.remove(paths[0])
+    BlobStore.settle(paths[1], spares[1])
+    assert os.path.exists(paths[0]) and not list(store.staging_dir.iterdir())
+    db = SessionLocal()
+    try:
+        BlobStore.acquire(db, content_hash, paths[0], 10)
+        db.commit()
+        BlobStore.acquire(db, content_hash, paths[0], 10)
+        db.commit()
+        assert BlobStore.release(db, content_hash) is None
+        db.commit()
+        assert BlobStore.release(db, content_hash) == paths[0]
+        db.commit()
+        assert not BlobStore.is_referenced(db, content_hash)
+    finally:
+        db.close()
+
+def test_semantic_index_incremental_sync():
+    import numpy as np
+    from app.services.embedding_service import EmbeddingService
+    from app.services.semantic_index import SemanticIndexRegistry
+    db = SessionLocal()
+    registry = SemanticIndexRegistry()
+    entries = []
+    try:
+        for i, axis in enumerate([0, 1]):
+            entry = models.Entry(user_id=999, title=f"Semantic {i}", entry_type="text", processed=True)
+            db.add(entry)
+            db.flush()
+            vector = np.zeros(4, dtype=np.float32)
+            vector[axis] = 1.0
+            db.add(models.SearchIndex(entry_id=entry.id, embedding=EmbeddingService.to_bytes(vector)))
+            db.commit()
+            entries.append(entry)
+            query = np.zeros(4, dtype=np.float32)
+            query[axis] = 1.0
+            # Each new row is picked up incrementally on the next search
+            assert registry.search(db, 999, query, 1)[0][0] == entry.id
+        index = registry.get(db, 999).index
+        assert len(index) == 2
+        db.query(models.SearchIndex).filter(models.SearchIndex.entry_id == entries[1].id).delete()
+        db.commit()
+        registry.remove_entry(999, entries[1].id)
+        assert [entry_id for entry_id, _ in registry.search(db, 999, query, 2)] == [entries[0].id]
+        # Updated in place, not rebuilt
+        assert registry.get(db, 999).index is index
+    finally:
+        for entry in entries:
+            db.query(models.SearchIndex).filter(models.SearchIndex.entry_id == entry.id).delete()
+            db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_embed_pending_batches(monkeypatch, tmp_path):
+    import numpy as np
+    from app.services.embedding_service import EmbeddingService
+    from app.services.model_registry import model_registry
+    from app.services.vector_store import ShardIndexRegistry
+    monkeypatch.setattr(settings, "semantic_index_backend", "mmap")
+    monkeypatch.setattr(settings, "vector_dir", str(tmp_path))
+
+    class FakeModel:
+        calls = []
+        def encode(self, texts, batch_size, convert_to_numpy, normalize_embeddings):
+            self.calls.append(len(texts))
+            return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+    monkeypatch.setitem(model_registry._models, "embedding", FakeModel())
+    db = SessionLocal()
+    entries = [
+        models.Entry(user_id=998, title=f"Batch {i}", content="notes", entry_type="text", processed=True)
+        for i in range(5)
+    ]
+    db.add_all(entries)
+    db.commit()
+    entry_ids = [entry.id for entry in entries]
+    try:
+        assert EmbeddingService.embed_pending(db, batch_size=2) == 5
+        assert FakeModel.calls == [2, 2, 1]
+        assert db.query(models.SearchIndex).filter(models.SearchIndex.entry_id.in_(entry_ids)).count() == 5
+        assert EmbeddingService.embed_pending(db, batch_size=2) == 0
+        hits = ShardIndexRegistry(tmp_path).search(db, 998, np.ones(4, dtype=np.float32) / 2, 10)
+        assert sorted(entry_id for entry_id, _ in hits) == sorted(entry_ids)
+        # Reprocessed to no text: the old vector is tombstoned and nothing re-embeds it
+        from app.tasks.processing_tasks import save_extracted_content
+        from app.services.chunk_service import ChunkService
+        cleared = db.get(models.Entry, entry_ids[0])
+        save_extracted_content(db, cleared, "")
+        ChunkService.discard(db, cleared.id)
+        db.commit()
+        assert EmbeddingService.pending_entries_query(db).filter(models.Entry.id == cleared.id).count() == 0
+        assert EmbeddingService.embed_pending(db, batch_size=2) == 0
+        hits = ShardIndexRegistry(tmp_path).search(db, 998, np.ones(4, dtype=np.float32) / 2, 10)
+        assert sorted(entry_id for entry_id, _ in hits) == sorted(entry_ids[1:])
+    finally:
+        db.query(models.SearchIndex).filter(models.SearchIndex.entry_id.in_(entry_ids)).delete()
+        db.query(models.Entry).filter(models.Entry.id.in_(entry_ids)).delete()
+        db.commit()
+        db.close()
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_vector_shard_delta_tombstones_and_compaction(tmp_path, dtype):
+    import numpy as np
+    from app.services.vector_store import VectorShard, ShardSnapshot
+    shard = VectorShard(tmp_path, 1)
+    eye = np.eye(4, dtype=np.float32)
+    shard.append(np.array([10, 11, 12]), eye[:3], dtype=dtype)
+    shard.delete([11])
+    shard.append(np.array([12]), eye[3:4], dtype=dtype)  # re-embedded: newest vector wins
+
+    def top(snapshot, axis):
+        return snapshot.search(eye[axis], 1)[0][0]
+
+    snapshot = ShardSnapshot.open(shard)
+    assert isinstance(snapshot.delta_vectors, np.memmap)
+    assert sorted(snapshot.live()[0].tolist()) == [10, 12]
+    assert top(snapshot, 3) == 12
+    shard.append(np.array([11]), eye[1:2], dtype=dtype)  # re-added after delete
+    assert not snapshot.is_current()
+    shard.compact()
+    compacted = ShardSnapshot.open(shard)
+    assert compacted.delta_count == 0 and compacted.base_count == 3
+    assert top(compacted, 1) == 11 and top(compacted, 3) == 12
+    # The old snapshot keeps serving from its (now unlinked) mapping
+    assert top(snapshot, 0) == 10
+
+def test_search_sqlite_fts_ranked_with_snippets():
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    entries = [
+        models.Entry(user_id=user_id, title="Kayak trip", content="Paddled across the lake at dawn", entry_type="text", processed=True),
+        models.Entry(user_id=user_id, title="Groceries", content="Bought lakeside honey", entry_type="text", processed=False),
+    ]
+    db.add_all(entries)
+    db.commit()
+    try:
+        response = client.post("/search/", json={"query": "lake", "limit": 5}, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        # Unprocessed entries are not searchable yet
+        assert [e["title"] for e in data["entries"]] == ["Kayak trip"]
+        assert data["total"] == 1
+        assert "<mark>lake</mark>" in data["snippets"][0]
+        # Processing completion updates the index through the update trigger
+        entries[1].processed = True
+        entries[1].content = "Bought honey by the lake"
+        db.commit()
+        data = client.post("/search/", json={"query": "honey", "limit": 5}, headers=headers).json()
+        assert [e["title"] for e in data["entries"]] == ["Groceries"]
+    finally:
+        for entry in entries:
+            db.delete(entry)
+        db.commit()
+        data = client.post("/search/", json={"query": "lake", "limit": 5}, headers=headers).json()
+        assert data["total"] == 0
+        db.close()
+
+def test_search_keyset_pagination():
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    entries = [
+        models.Entry(user_id=user_id, title=f"Run {i}", content="morning run " * (i + 1), entry_type="text", processed=True)
+        for i in range(3)
+    ]
+    db.add_all(entries)
+    db.commit()
+    try:
+        first = client.post("/search/", json={"query": "run", "limit": 2}, headers=headers).json()
+        assert first["total"] == 3 and len(first["entries"]) == 2 and first["next_cursor"]
+        second = client.post("/search/", json={"query": "run", "limit": 2, "cursor": first["next_cursor"]}, headers=headers).json()
+        titles = [e["title"] for e in first["entries"] + second["entries"]]
+        assert sorted(titles) == ["Run 0", "Run 1", "Run 2"]
+        assert second["next_cursor"] is None
+        # A last page that is exactly full does not point at an empty one
+        exact = client.post("/search/", json={"query": "run", "limit": 3}, headers=headers).json()
+        assert len(exact["entries"]) == 3 and exact["next_cursor"] is None
+        bad = client.post("/search/", json={"query": "run", "cursor": "not-a-cursor"}, headers=headers)
+        assert bad.status_code == 400
+    finally:
+        for entry in entries:
+            db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_timeline_cursor_pagination_with_timestamp_ties():
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    # Inserted in one transaction, so they share a created_at second
+    entries = [
+        models.Entry(user_id=user_id, title=f"Page {i}", content="", entry_type="pagetest", processed=i % 2 == 0)
+        for i in range(5)
+    ]
+    db.add_all(entries)
+    db.commit()
+    try:
+        seen, cursor = [], None
+        while True:
+            params = {"entry_type": "pagetest", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/timeline/", params=params, headers=headers)
+            assert response.status_code == 200
+            seen += [e["id"] for e in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == sorted((e.id for e in entries), reverse=True)
+        processed = client.get("/uploads/", params={"entry_type": "pagetest", "processed": True}, headers=headers).json()
+        assert [e["title"] for e in processed] == ["Page 4", "Page 2", "Page 0"]
+        assert client.get("/timeline/", params={"cursor": "bogus"}, headers=headers).status_code == 400
+    finally:
+        for entry in entries:
+            db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_user_stats_counters_track_entry_writes():
+    from app.services.stats_service import StatsService
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        db.query(models.UserStats).filter(models.UserStats.user_id == user_id).delete()
+        db.commit()
+        before = client.get("/timeline/stats", headers=headers).json()
+        entries = [
+            models.Entry(user_id=user_id, title=f"Stats {i}", entry_type=entry_type, processed=False)
+            for i, entry_type in enumerate(["text", "audio", "audio"])
+        ]
+        for entry in entries:
+            db.add(entry)
+            StatsService.entry_added(db, entry)
+        db.commit()
+        StatsService.set_processed(db, entries[1], True)
+        StatsService.set_processed(db, entries[1], True)  # no-op, already processed
+        db.commit()
+        db.delete(entries[0])
+        StatsService.entry_deleted(db, entries[0])
+        db.commit()
+        stats = client.get("/timeline/stats", headers=headers).json()
+        assert stats["total_entries"] == before["total_entries"] + 2
+        assert stats["entries_by_type"]["audio"] == before["entries_by_type"]["audio"] + 2
+        assert stats["entries_by_type"]["text"] == before["entries_by_type"]["text"]
+        assert stats["processed_entries"] == before["processed_entries"] + 1
+        assert stats["pending_entries"] == before["pending_entries"] + 1
+        # Counters agree with a full recount of the entries table
+        recount = StatsService.aggregate(db, user_id)
+        for key in ("total_entries", "processed_entries", "entries_by_type", "recent_activity"):
+            assert stats[key] == recount[key]
+        for entry in entries[1:]:
+            db.delete(entry)
+            StatsService.entry_deleted(db, entry)
+        db.commit()
+    finally:
+        db.close()
+
+def test_activity_histogram_reads_daily_rollup():
+    from datetime import datetime, timedelta
+    from app.services.stats_service import StatsService
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        StatsService.rebuild_daily_activity(db)
+        today = datetime.utcnow().date()
+        params = {"date_from": (today - timedelta(days=13)).isoformat(), "date_to": today.isoformat()}
+        before = client.get("/timeline/activity", params=params, headers=headers).json()
+        assert len(before["buckets"]) == 14 and before["buckets"][-1]["start"] == today.isoformat()
+        entries = [
+            models.Entry(user_id=user_id, title=f"Activity {i}", entry_type=entry_type, file_size=100, processed=entry_type == "text")
+            for i, entry_type in enumerate(["text", "image", "image"])
+        ]
+        for entry in entries:
+            db.add(entry)
+            StatsService.entry_added(db, entry)
+        db.commit()
+        days = client.get("/timeline/activity", params=params, headers=headers).json()["buckets"]
+        assert days[-1]["entry_count"] == before["buckets"][-1]["entry_count"] + 3
+        assert days[-1]["total_bytes"] == before["buckets"][-1]["total_bytes"] + 300
+        assert days[-1]["by_type"]["image"] >= 2
+        weeks = client.get("/timeline/activity", params={**params, "bucket": "week"}, headers=headers).json()["buckets"]
+        assert all(datetime.fromisoformat(b["start"]).weekday() == 0 for b in weeks)
+        assert sum(b["entry_count"] for b in weeks) == sum(b["entry_count"] for b in days)
+        # Incremental maintenance matches a rebuild from scratch
+        incremental = {(r.user_id, r.day, r.entry_type): (r.entry_count, r.processed_count, r.total_bytes)
+                       for r in db.query(models.DailyActivity).all() if r.entry_count}
+        StatsService.rebuild_daily_activity(db)
+        rebuilt = {(r.user_id, r.day, r.entry_type): (r.entry_count, r.processed_count, r.total_bytes)
+                   for r in db.query(models.DailyActivity).all()}
+        assert incremental == rebuilt
+        assert client.get("/timeline/activity", params={"bucket": "year"}, headers=headers).status_code == 400
+        for entry in entries:
+            db.delete(entry)
+            StatsService.entry_deleted(db, entry)
+        db.commit()
+    finally:
+        db.close()
+
+def test_concurrently_opened_activity_bucket_is_incremented():
+    from datetime import datetime
+    from sqlalchemy import event
+    from app.services.stats_service import StatsService
+    db = SessionLocal()
+    user = models.User(email="buckets@example.com", name="Buckets")
+    db.add(user)
+    db.commit()
+    StatsService.get_stats(db, user.id)
+    seeded = []
+    def seed_bucket(conn, cursor, statement, parameters, context, executemany):
+        # Another upload opens the bucket between our UPDATE and INSERT
+        if statement.startswith("UPDATE daily_activity") and not seeded:
+            seeded.append(True)
+            cursor.connection.execute(
+                "INSERT INTO daily_activity (user_id, day, entry_type, entry_count, processed_count, total_bytes) "
+                "VALUES (?, ?, 'text', 5, 0, 500)", (user.id, datetime.utcnow().date().isoformat())
+            )
+    event.listen(engine, "after_cursor_execute", seed_bucket)
+    entry = models.Entry(user_id=user.id, title="Bucket", entry_type="text", file_size=100)
+    try:
+        db.add(entry)
+        StatsService.entry_added(db, entry)
+        db.commit()
+        bucket = db.query(models.DailyActivity).filter(models.DailyActivity.user_id == user.id).one()
+        assert (bucket.entry_count, bucket.total_bytes) == (6, 600)
+        assert db.query(models.Entry).filter(models.Entry.id == entry.id).count() == 1
+    finally:
+        event.remove(engine, "after_cursor_execute", seed_bucket)
+        db.rollback()
+        db.query(models.Entry).filter(models.Entry.user_id == user.id).delete()
+        for model in (models.UserStats, models.DailyActivity):
+            db.query(model).filter(model.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
+
+def test_concurrently_seeded_user_stats_are_incremented():
+    from sqlalchemy import event
+    from app.services.stats_service import StatsService
+    db = SessionLocal()
+    user = models.User(email="seeding@example.com", name="Seeding")
+    db.add(user)
+    db.commit()
+    seeded = []
+    def seed_counters(conn, cursor, statement, parameters, context, executemany):
+        # Another upload seeds the counters between our UPDATE and INSERT
+        if statement.startswith("UPDATE user_stats") and not seeded:
+            seeded.append(True)
+            cursor.connection.execute(
+                "INSERT INTO user_stats (user_id, total_entries, processed_entries, text_entries, audio_entries, image_entries) "
+                "VALUES (?, 5, 0, 5, 0, 0)", (user.id,)
+            )
+    event.listen(engine, "after_cursor_execute", seed_counters)
+    entry = models.Entry(user_id=user.id, title="Seeded", entry_type="text")
+    try:
+        db.add(entry)
+        StatsService.entry_added(db, entry)
+        db.commit()
+        counters = db.get(models.UserStats, user.id)
+        assert seeded and (counters.total_entries, counters.text_entries) == (6, 6)
+        assert db.query(models.Entry).filter(models.Entry.id == entry.id).count() == 1
+    finally:
+        event.remove(engine, "after_cursor_execute", seed_counters)
+        db.rollback()
+        db.query(models.Entry).filter(models.Entry.user_id == user.id).delete()
+        for model in (models.UserStats, models.DailyActivity):
+            db.query(model).filter(model.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
+
+def test_principal_cache_skips_users_lookup():
+    from sqlalchemy import event
+    from app.services.auth_service import AuthService
+    from app.core.database import async_engine
+    from app.services.principal_cache import Principal, principal_cache
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    principal_cache.clear()
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    engines = [engine, async_engine.sync_engine]
+    for bind in engines:
+        event.listen(bind, "before_cursor_execute", record)
+    try:
+        for _ in range(3):
+            assert client.get("/timeline/stats", headers=headers).status_code == 200
+    finally:
+        for bind in engines:
+            event.remove(bind, "before_cursor_execute", record)
+    assert sum("FROM users" in statement for statement in statements) == 1
+    # Profile updates invalidate the cached principal
+    db = SessionLocal()
+    try:
+        user = AuthService.get_or_create_user(db, {
+            "google_id": "principal-test", "email": "principal@example.com", "name": "Before", "picture": None
+        })
+        principal_cache.set(Principal.from_user(user))
+        AuthService.get_or_create_user(db, {
+            "google_id": "principal-test", "email": "principal@example.com", "name": "After", "picture": None
+        })
+        assert principal_cache.get(user.id) is None
+        db.delete(user)
+        db.commit()
+    finally:
+        db.close()
+
+def test_verified_token_cache_respects_exp_and_revocation(monkeypatch):
+    import time
+    from fastapi import HTTPException
+    from app.services import auth_service
+    from app.services.auth_service import AuthService, VerifiedTokenCache, verify_token
+    monkeypatch.setattr(auth_service, "token_cache", VerifiedTokenCache(max_size=2))
+    token = AuthService.create_access_token(data={"sub": "1"})
+    assert verify_token(token)["sub"] == verify_token(token)["sub"] == "1"
+    assert auth_service.token_cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+    # Callers get their own copy of the cached claims
+    verify_token(token)["sub"] = "2"
+    assert verify_token(token)["sub"] == "1"
+    # A cached payload past its exp is not served
+    real_time = time.time
+    monkeypatch.setattr(auth_service.time, "time", lambda: real_time() + 10 ** 6)
+    assert auth_service.token_cache.get(token) is None
+    monkeypatch.setattr(auth_service.time, "time", real_time)
+    verify_token(token)
+    AuthService.revoke_token(token)
+    try:
+        with pytest.raises(HTTPException) as exc:
+            verify_token(token)
+        assert exc.value.status_code == 401
+    finally:
+        auth_service.REVOKED_TOKENS.discard(token)
+
+def test_unreachable_redis_principal_cache_is_bypassed():
+    import asyncio
+    import time
+    from app.services.principal_cache import Principal, RedisPrincipalCache
+    cache = RedisPrincipalCache("redis://127.0.0.1:1/0", ttl=60, timeout=0.1)
+    start = time.monotonic()
+    assert asyncio.run(cache.aget(1)) is None
+    assert time.monotonic() - start < 5
+    # Further calls skip Redis until the retry window passes
+    cache._client = None
+    assert asyncio.run(cache.aget(1)) is None
+    asyncio.run(cache.aset(Principal(id=1)))
+
+def test_async_database_url_uses_async_drivers():
+    from app.core.database import async_database_url
+    assert async_database_url("sqlite:////tmp/lifelog.db") == "sqlite+aiosqlite:////tmp/lifelog.db"
+    assert async_database_url("postgresql://lifelog:password@db:5432/lifelog_db") == \
+        "postgresql+asyncpg://lifelog:password@db:5432/lifelog_db"
+
+def test_model_registry_loads_lazily_and_only_in_allowed_roles():
+    from app.services.file_service import FileService
+    from app.services.model_registry import ModelRegistry, ModelNotAllowedError, API_ROLE, WORKER_ROLE
+    loads = []
+    registry = ModelRegistry(role=API_ROLE)
+    registry.register("whisper", lambda: loads.append("whisper") or "whisper-model")
+    registry.register("embedding", lambda: loads.append("embedding") or "embedding-model", roles=(API_ROLE, WORKER_ROLE))
+    with pytest.raises(ModelNotAllowedError):
+        registry.get("whisper")
+    registry.warm_up(["whisper"])  # skipped in the API role
+    assert loads == [] and not registry.is_loaded("whisper")
+    assert registry.get("embedding") == registry.get("embedding") == "embedding-model"
+    registry.set_role(WORKER_ROLE)
+    registry.warm_up(["whisper"])
+    assert registry.get("whisper") == "whisper-model"
+    assert loads == ["embedding", "whisper"]
+    # Constructing a FileService in the API never loads a model
+    FileService()
+    from app.services.model_registry import model_registry
+    assert model_registry.role == API_ROLE and not model_registry.is_loaded("transcription")
+
+def test_entry_points_defer_heavy_imports():
+    import sys
+    heavy = ["openai", "whisper", "faster_whisper", "torch", "sentence_transformers", "pytesseract", "PIL", "faiss", "redis"]
+    code = (
+        "import sys, app.main, app.celery_app, app.tasks.processing_tasks; "
+        f"print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+def test_processing_routes_to_per_media_queues(monkeypatch):
+    from app.tasks import processing_tasks
+    sent = []
+    monkeypatch.setattr(processing_tasks.process_file_task, "apply_async", lambda args, queue: sent.append((args, queue)))
+    for entry_id, entry_type in enumerate(["text", "image", "audio"]):
+        processing_tasks.schedule_processing(models.Entry(id=entry_id, entry_type=entry_type))
+    assert sent == [((0,), "text"), ((1,), "ocr"), ((2,), "transcription")]
+    router = celery_app.amqp.router
+    assert router.route({}, "app.tasks.processing_tasks.embed_pending_entries_task")["queue"].name == "embeddings"
+    assert router.route({}, "app.tasks.processing_tasks.generate_weekly_summary_task")["queue"].name == "summaries"
+    assert router.route({}, "app.tasks.processing_tasks.finish_transcription_task")["queue"].name == "text"
+
+def test_long_audio_transcribed_in_checkpointed_segments(monkeypatch, tmp_path):
+    import wave
+    import numpy as np
+    from app.services.audio_segments import SAMPLE_RATE
+    from app.services.model_registry import model_registry
+    from app.services.transcription_service import TranscriptionService
+    from app.services.chunk_service import ChunkService
+    # 12s recording: a half-second tone starting every 2s, silence in between
+    t = np.arange(12 * SAMPLE_RATE) / SAMPLE_RATE
+    samples = np.where((t % 2) < 0.5, 0.5 * np.sin(2 * np.pi * 440 * t), 0.0)
+    audio_path = tmp_path / "memo.wav"
+    with wave.open(str(audio_path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    
+    class FakeTranscriber:
+        calls = 0
+        def transcribe(self, audio):
+            # One "word" per tone burst, timed relative to the decoded slice
+            self.calls += 1
+            loud = np.abs(audio.reshape(-1, SAMPLE_RATE // 10)).max(axis=1) > 0.1
+            starts = [i for i in range(len(loud)) if loud[i] and (i == 0 or not loud[i - 1])]
+            return [{"start": i / 10, "end": i / 10 + 0.5, "text": " beep"} for i in starts]
+    transcriber = FakeTranscriber()
+    monkeypatch.setitem(model_registry._models, "transcription", transcriber)
+    monkeypatch.setattr(settings, "transcription_segment_seconds", 4)
+    monkeypatch.setattr(settings, "transcription_overlap_seconds", 1.0)
+    
+    db = SessionLocal()
+    user = models.User(email="segments@example.com", name="Segments")
+    db.add(user)
+    db.commit()
+    entry = models.Entry(user_id=user.id, title="memo", entry_type="audio", file_path=str(audio_path), processed=False)
+    db.add(entry)
+    db.commit()
+    try:
+        process_file_task.apply(args=(entry.id,)).get()
+        segments = TranscriptionService.segments(db, entry.id)
+        assert len(segments) >= 3 and transcriber.calls == len(segments)
+        # Cuts fall in the silences, and each tone is kept exactly once
+        assert all(0.5 <= segment.end_seconds % 2 for segment in segments[:-1])
+        starts = [start for segment in segments for start, _, _ in segment.timestamps]
+        assert starts == pytest.approx([0, 2, 4, 6, 8, 10])
+        db.refresh(entry)
+        assert entry.processed and entry.content == " ".join(["beep"] * 6)
+        # A retry only redoes segments without a checkpoint
+        segments[1].text = None
+        db.commit()
+        process_file_task.apply(args=(entry.id,)).get()
+        assert transcriber.calls == len(segments) + 1
+        
+        # Segments that never finish leave the entry failed rather than stuck
+        from app.tasks.processing_tasks import finish_transcription_task, fail_transcription_task
+        segments[0].text = None
+        db.commit()
+        with pytest.raises(Exception, match="untranscribed segments"):
+            finish_transcription_task.apply(args=(entry.id,))
+        assert fail_transcription_task.apply(args=(entry.id,)).get()["missing_segments"] == [0]
+        db.refresh(entry)
+        assert not entry.processed
+    finally:
+        TranscriptionService.discard(db, entry.id)
+        ChunkService.discard(db, entry.id)
+        db.delete(entry)
+        for model in (models.UserStats, models.DailyActivity):
+            db.query(model).filter(model.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
+
+def test_vad_keeps_silence_away_from_transcription(monkeypatch, tmp_path):
+    import wave
+    import numpy as np
+    from app.services.audio_segments import SAMPLE_RATE
+    from app.services.model_registry import model_registry
+    from app.services.chunk_service import ChunkService
+    received = []
+    class FakeTranscriber:
+        def transcribe(self, audio):
+            received.append(len(audio) / SAMPLE_RATE)
+            return [{"start": 0.3, "end": 1.3, "text": " hello"}]
+    monkeypatch.setitem(model_registry._models, "transcription", FakeTranscriber())
+    
+    def write_wav(name, samples):
+        path = tmp_path / name
+        with wave.open(str(path), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+        return str(path)
+    rng = np.random.default_rng(0)
+    noise = 0.002 * rng.standard_normal(20 * SAMPLE_RATE)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    memo = noise.copy()
+    memo[12 * SAMPLE_RATE:13 * SAMPLE_RATE] += 0.3 * np.sin(2 * np.pi * 300 * t)
+    
+    db = SessionLocal()
+    user = models.User(email="vad@example.com", name="VAD")
+    db.add(user)
+    db.commit()
+    memo_path = write_wav("memo.wav", memo)
+    memo_hash = "cd" * 32
+    entries = [
+        models.Entry(user_id=user.id, title="noise.wav", entry_type="audio", file_path=write_wav("noise.wav", noise)),
+        # The same recording uploaded twice; the copy reuses the first one's results
+        models.Entry(user_id=user.id, title="memo.wav", entry_type="audio", file_path=memo_path, content_hash=memo_hash),
+        models.Entry(user_id=user.id, title="memo copy.wav", entry_type="audio", file_path=memo_path, content_hash=memo_hash),
+    ]
+    db.add_all(entries)
+    db.commit()
+    try:
+        for entry in entries:
+            process_file_task.apply(args=(entry.id,)).get()
+            db.refresh(entry)
+        silent, memo_entry, memo_copy = entries
+        assert silent.processed and silent.content == "" and silent.speech_ratio == 0
+        # Only the one-second tone (plus padding) is transcribed, and only once
+        assert received == [pytest.approx(1.6)]
+        assert memo_entry.content == "hello" and memo_entry.speech_ratio == pytest.approx(1.6 / 20)
+        assert memo_copy.content == "hello" and memo_copy.speech_ratio == memo_entry.speech_ratio
+        # A duplicate caught at upload time is stored processed, with the same ratio
+        from app.api import uploads
+        from app.services.file_service import FileService, SavedUpload
+        monkeypatch.setattr(uploads, "schedule_embedding", lambda: None)
+        saved = SavedUpload(file_path=memo_path, original_filename="memo again.wav",
+                            file_size=os.path.getsize(memo_path), content_hash=memo_hash, head=b"")
+        uploaded = uploads.store_upload(db, FileService(), saved, "audio", None, user.id)
+        entries.append(db.get(models.Entry, uploaded.id))
+        assert uploaded.processed and uploaded.speech_ratio == memo_entry.speech_ratio
+    finally:
+        db.query(models.FileBlob).filter(models.FileBlob.sha256 == memo_hash).delete()
+        for entry in entries:
+            ChunkService.discard(db, entry.id)
+            db.delete(entry)
+        for model in (models.UserStats, models.DailyActivity):
+            db.query(model).filter(model.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
+
+def test_transcription_backend_selected_from_settings(monkeypatch, tmp_path):
+    import wave
+    import numpy as np
+    from app.services.audio_segments import SAMPLE_RATE
+    from app.services.file_service import FileService
+    from app.services.model_registry import model_registry, load_transcription_backend
+    from app.services.transcription_backends import FakeBackend, create_transcription_backend
+    with pytest.raises(ValueError):
+        create_transcription_backend("whisper.cpp", "base")
+    monkeypatch.setattr(settings, "transcription_backend", "fake")
+    monkeypatch.setattr(settings, "whisper_model", "small")
+    monkeypatch.setattr(settings, "transcription_threads", 2)
+    backend = load_transcription_backend()
+    assert isinstance(backend, FakeBackend) and (backend.model_size, backend.threads) == ("small", 2)
+    monkeypatch.setitem(model_registry._models, "transcription", backend)
+    
+    # Two seconds of tone in four seconds of digital silence
+    t = np.arange(4 * SAMPLE_RATE) / SAMPLE_RATE
+    samples = np.where((t >= 1) & (t < 3), 0.3 * np.sin(2 * np.pi * 300 * t), 0.0)
+    audio_path = tmp_path / "tone.wav"
+    with wave.open(str(audio_path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    assert FileService().process_audio_file(str(audio_path)) == "[2.6s of speech]"
+
+def test_ocr_pipeline_normalizes_skips_blank_images_and_tiles(tmp_path):
+    from PIL import Image, ImageDraw
+    from app.services.ocr_pipeline import open_normalized, run_ocr, tile_rows
+    # A 3000x2000 "page": rows of glyph-sized blocks with blank gaps between lines
+    page = Image.new("RGB", (3000, 2000), "white")
+    draw = ImageDraw.Draw(page)
+    for top in range(100, 1900, 60):
+        for left in range(100, 2900, 30):
+            draw.rectangle((left, top, left + 18, top + 30), fill="black")
+    page_path = tmp_path / "page.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+    page.save(page_path, dpi=(600, 600), exif=exif)
+    blank_path = tmp_path / "sky.png"
+    Image.linear_gradient("L").resize((3000, 2000)).save(blank_path)
+    
+    tiles = []
+    def image_to_string(tile):
+        tiles.append(tile.size)
+        return f"strip {len(tiles)}\n"
+    result = run_ocr(str(page_path), image_to_string, max_pixels=12_000_000, workers=1)
+    # Upright and halved to 300 DPI, small enough for a single strip
+    assert sum(height for _, height in tiles) == 1500 and {width for width, _ in tiles} == {1000}
+    assert result.tiles == len(tiles) == 1 and result.text == "strip 1"
+    tiles.clear()
+    big_page_path = tmp_path / "big.png"
+    page.save(big_page_path)
+    result = run_ocr(str(big_page_path), image_to_string, max_pixels=12_000_000, workers=4)
+    assert result.tiles == len(tiles) == 2 and sum(height for _, height in tiles) == 2000
+    (_, cut), _ = tile_rows(open_normalized(str(big_page_path), 12_000_000))
+    assert (cut - 100) % 60 > 30  # between two lines of blocks
+    assert set(result.timings) == {"normalize", "detect", "tile", "ocr"}
+    # Text-free images never reach Tesseract
+    tiles.clear()
+    result = run_ocr(str(blank_path), image_to_string, max_pixels=12_000_000, workers=4)
+    assert result.skipped and result.text == "" and tiles == []
+
+def make_pdf(pages):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def test_document_extraction_streams_pdf_docx_and_text(tmp_path):
+    import zipfile
+    from app.services.document_extraction import UnsupportedDocumentError, extract_document
+    progress = []
+    def record(done, total, unit):
+        progress.append((done, total, unit))
+    
+    pdf_path = tmp_path / "notes.pdf"
+    pdf_path.write_bytes(make_pdf(["First page", "Second page", "Third page"]))
+    assert extract_document(str(pdf_path), 10_000, record) == "First page\n\nSecond page\n\nThird page"
+    assert progress == [(1, 3, "page"), (2, 3, "page"), (3, 3, "page")]
+    
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    docx_path = tmp_path / "notes.docx"
+    with zipfile.ZipFile(docx_path, "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document {w}><w:body>'
+                         '<w:p><w:r><w:t>Dear </w:t></w:r><w:r><w:t>diary,</w:t></w:r></w:p>'
+                         '<w:p><w:r><w:t>Ran</w:t><w:tab/><w:t>5km</w:t></w:r></w:p></w:body></w:document>')
+    assert extract_document(str(docx_path), 10_000) == "Dear diary,\nRan\t5km"
+    
+    # Non-UTF-8 text is decoded from a prefix sniff instead of becoming mojibake
+    text_path = tmp_path / "journal.txt"
+    text_path.write_bytes("Café crème, naïve résumé\n".encode("cp1252") * 1000)
+    content = extract_document(str(text_path), 10_000)
+    assert content.startswith("Café crème, naïve résumé") and len(content) <= 10_000
+    assert content.count("Café") == 10_000 // 25  # capped, whole lines here
+    text_path.write_bytes("Привет".encode("utf-16"))
+    assert extract_document(str(text_path), 10_000) == "Привет"
+    
+    doc_path = tmp_path / "old.doc"
+    doc_path.write_bytes(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 512)
+    with pytest.raises(UnsupportedDocumentError):
+        extract_document(str(doc_path), 10_000)
+    # An entry in such a format fails at once rather than being retried
+    db = SessionLocal()
+    entry = models.Entry(user_id=1, title="Legacy doc", entry_type="text", file_path=str(doc_path))
+    db.add(entry)
+    db.commit()
+    try:
+        result = process_file_task.apply(args=(entry.id,))
+        outcome = result.get()
+        assert outcome["status"] == "failed" and "Legacy .doc" in outcome["error"]
+        db.refresh(entry)
+        assert not entry.processed
+    finally:
+        db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_entry_chunks_give_search_the_matching_passage(tmp_path):
+    from app.services.chunk_service import CHUNK_WORDS, ChunkService
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    words = [f"word{i}" for i in range(1000)]
+    words[700] = "zeppelin"
+    notes_path = tmp_path / "notes.txt"
+    notes_path.write_text(" ".join(words))
+    db = SessionLocal()
+    entry = models.Entry(user_id=user_id, title="Long notes", entry_type="text", file_path=str(notes_path))
+    db.add(entry)
+    db.commit()
+    try:
+        process_file_task.apply(args=(entry.id,)).get()
+        db.refresh(entry)
+        chunks = db.query(models.EntryChunk).filter(models.EntryChunk.entry_id == entry.id).order_by(models.EntryChunk.position).all()
+        assert len(chunks) > 1 and all(len(chunk.text.split()) <= CHUNK_WORDS for chunk in chunks)
+        assert all(entry.content[chunk.start_char:chunk.end_char] == chunk.text for chunk in chunks)
+        # Neighbouring passages overlap
+        assert all(later.start_char < earlier.end_char for earlier, later in zip(chunks, chunks[1:]))
+        data = client.post("/search/", json={"query": "zeppelin", "limit": 5}, headers=headers).json()
+        assert [e["title"] for e in data["entries"]] == ["Long notes"]
+        passage = data["passages"][0]
+        assert "zeppelin" in passage["text"] and len(passage["text"]) < len(entry.content) / 2
+        
+        # Transcript passages carry the time range they cover
+        entry.content = "hello there general kenobi"
+        ChunkService.rebuild(db, entry, [(0.0, 1.5, "hello there"), (4.0, 6.0, "general kenobi")])
+        db.commit()
+        chunk = db.query(models.EntryChunk).filter(models.EntryChunk.entry_id == entry.id).one()
+        assert (chunk.start_seconds, chunk.end_seconds) == (0.0, 6.0)
+    finally:
+        ChunkService.discard(db, entry.id)
+        db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_list_views_defer_content_and_content_is_served_in_ranges():
+    from sqlalchemy import event
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    entry = models.Entry(user_id=user_id, title="Transcript", content="x" * 250_000, entry_type="audio", processed=True)
+    db.add(entry)
+    db.commit()
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    from app.core.database import async_engine
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        for path in ("/timeline/?limit=5", "/uploads/?limit=5"):
+            listed = client.get(path, headers=headers).json()
+            assert listed[0]["title"] == "Transcript" and "content" not in listed[0]
+            assert listed[0]["preview"] == "x" * models.ENTRY_PREVIEW_CHARS
+        assert not any("entries.content" in statement for statement in statements)
+        
+        first = client.get(f"/uploads/{entry.id}/content?limit=100000", headers=headers).json()
+        assert (first["offset"], first["total_length"], len(first["content"])) == (0, 250_000, 100_000)
+        last = client.get(f"/uploads/{entry.id}/content?offset=200000&limit=100000", headers=headers).json()
+        assert len(last["content"]) == 50_000 and first["next_offset"] == 100_000 and last["next_offset"] is None
+        assert client.get("/uploads/999999/content", headers=headers).status_code == 404
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+        db.delete(entry)
+        db.commit()
+        db.close()
+
+def test_weekly_summary_jobs_are_queued_shared_and_polled(monkeypatch):
+    from app.api import timeline
+    from app.tasks.processing_tasks import generate_weekly_summary_task
+    token = get_auth_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr(settings, "openai_api_key", None)
+    queued = []
+    class RecordingTask:
+        def delay(self, job_id):
+            queued.append(job_id)
+    monkeypatch.setattr(timeline, "generate_weekly_summary_task", RecordingTask())
+    db = SessionLocal()
+    try:
+        first = client.post("/timeline/generate-summary", headers=headers)
+        second = client.post("/timeline/generate-summary", headers=headers)
+        assert first.status_code == 202 and first.json()["status"] == "pending"
+        # Concurrent requests for the same week share one job
+        assert second.json()["id"] == first.json()["id"] and queued == [first.json()["id"]]
+        
+        job_id = first.json()["id"]
+        assert generate_weekly_summary_task.apply(args=(job_id,)).get()["status"] == "success"
+        job = client.get(f"/timeline/summary-jobs/{job_id}", headers=headers).json()
+        assert job["status"] == "done" and job["summary"]["summary"]
+        
+        # A finished week is served as is unless a refresh is asked for
+        assert client.post("/timeline/generate-summary", headers=headers).json()["status"] == "done"
+        assert queued == [job_id]
+        assert client.post("/timeline/generate-summary?refresh=true", headers=headers).json()["status"] == "pending"
+        assert queued == [job_id, job_id]
+        assert client.get("/timeline/summary-jobs/999999", headers=headers).status_code == 404
+    finally:
+        job = db.get(models.SummaryJob, job_id)
+        db.query(models.WeeklySummary).filter(models.WeeklySummary.id == job.summary_id).delete()
+        db.delete(job)
+        db.commit()
+        db.close()
+
+def test_weekly_summary_map_reduce_reuses_cached_summaries(monkeypatch):
+    from datetime import datetime
+    from app.services import summary_service
+    from app.services.chunk_service import ChunkService
+    from app.services.summary_service import SummaryService, week_bounds
+    monkeypatch.setattr(settings, "openai_api_key", "test-key")
+    calls = []
+    def fake_complete(system, prompt, max_tokens):
+        calls.append(prompt)
+        return f"summary {len(calls)}"
+    monkeypatch.setattr(summary_service, "complete", fake_complete)
+    db = SessionLocal()
+    user = models.User(email="summaries@example.com", name="Summaries")
+    db.add(user)
+    db.commit()
+    week_start, week_end = week_bounds(datetime.utcnow().date())
+    def add_entry(title, content):
+        entry = models.Entry(user_id=user.id, title=title, content=content, entry_type="text", processed=True)
+        db.add(entry)
+        db.flush()
+        ChunkService.rebuild(db, entry)
+        db.commit()
+        return entry
+    try:
+        # Entries without content leave nothing to reduce; the week is described instead
+        add_entry("Empty", "")
+        assert SummaryService.write_week(db, user.id, week_start, week_end).summary.startswith("Weekly summary for 1 entries")
+        assert calls == []
+        long_entry = add_entry("Long", " ".join(f"word{i}" for i in range(500)))
+        passages = db.query(models.EntryChunk).filter(models.EntryChunk.entry_id == long_entry.id).count()
+        SummaryService.write_week(db, user.id, week_start, week_end)
+        db.commit()
+        # One call per passage, then the entry, the day and the week
+        assert len(calls) == passages + 3
+        
+        # A new short entry stands for itself; only its day and the week are redone
+        add_entry("Short", "Went for a run")
+        calls.clear()
+        summary = SummaryService.write_week(db, user.id, week_start, week_end)
+        db.commit()
+        assert len(calls) == 2 and "Went for a run" in calls[0] and summary.summary == "summary 2"
+        calls.clear()
+        SummaryService.write_week(db, user.id, week_start, week_end)
+        assert calls == []
+        
+        # Longer periods reduce the stored weekly summaries
+        assert SummaryService.summarize_weeks(db, user.id, week_start.date(), week_end.date()) == "summary 1"
+        assert "summary 2" in calls[0]
+    finally:
+        for entry in db.query(models.Entry).filter(models.Entry.user_id == user.id):
+            ChunkService.discard(db, entry.id)
+            db.delete(entry)
+        for model in (models.WeeklySummary, models.SummaryCache):
+            db.query(model).filter(model.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
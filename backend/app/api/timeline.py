@@ -1,28 +1,44 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import desc, select
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models import models, schemas
 from app.api.auth import get_current_user_dependency
+from app.services.principal_cache import Principal
+from app.services.stats_service import StatsService, ACTIVITY_BUCKETS
+from app.services.summary_service import SummaryService
+from app.tasks.processing_tasks import generate_weekly_summary_task
+from app.api.pagination import NEXT_CURSOR_HEADER, entry_cursor, entries_before_cursor
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.Entry])
+# Longest range /activity serves in one request (ten years of day buckets)
+MAX_ACTIVITY_DAYS = 3660
+
+@router.get("/", response_model=List[schemas.EntrySummary])
 async def get_timeline(
+    response: Response,
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     entry_type: Optional[str] = Query(None, description="Filter by entry type"),
-    skip: int = Query(0, ge=0),
+    processed: Optional[bool] = Query(None, description="Filter by processing status"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(50, ge=1, le=100),
-    current_user: models.User = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's timeline entries with optional filtering"""
+    """Get user's timeline entries with optional filtering.
+
+    Pages are ordered newest first by (created_at, id); when more entries
+    follow, the cursor for the next page is returned in X-Next-Cursor.
+    """
     
-    query = db.query(models.Entry).filter(
+    query = select(models.Entry).options(load_only(*models.ENTRY_SUMMARY_COLUMNS)).filter(
         models.Entry.user_id == current_user.id
     )
     
@@ -53,74 +69,75 @@ async def get_timeline(
     if entry_type:
         query = query.filter(models.Entry.entry_type == entry_type)
     
-    # Order by creation date (newest first)
-    entries = query.order_by(desc(models.Entry.created_at)).offset(skip).limit(limit).all()
+    if processed is not None:
+        query = query.filter(models.Entry.processed == processed)
+    
+    if cursor:
+        query = query.filter(entries_before_cursor(db, cursor))
+    elif skip:
+        query = query.offset(skip)
     
-    return [schemas.Entry.model_validate(entry) for entry in entries]
+    # Newest first; id breaks created_at ties so pages never skip or repeat rows
+    entries = (await db.execute(query.order_by(
+        desc(models.Entry.created_at), desc(models.Entry.id)
+    ).limit(limit + 1))).scalars().all()
+    
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = entry_cursor(entries[-1])
+    
+    return [schemas.EntrySummary.model_validate(entry) for entry in entries]
 
 @router.get("/stats")
-async def get_timeline_stats(
-    current_user: models.User = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db),
-    batch: Optional[int] = Query(None, description="Batch number for stats (optional)"),
-    batch_size: Optional[int] = Query(None, description="Batch size for stats (optional)")
+def get_timeline_stats(
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
 ):
-    """Get timeline statistics for the user, optionally in batches for large datasets"""
-    query = db.query(models.Entry).filter(
-        models.Entry.user_id == current_user.id
-    )
-    if batch is not None and batch_size is not None:
-        query = query.offset(batch * batch_size).limit(batch_size)
-    
-    # Total entries (batched if requested)
-    total_entries = query.count()
-    
-    # Entries by type
-    entries_by_type = {}
-    for entry_type in ['text', 'audio', 'image']:
-        type_query = db.query(models.Entry).filter(
-            models.Entry.user_id == current_user.id,
-            models.Entry.entry_type == entry_type
+    """Get timeline statistics for the user.
+
+    Totals come from the per-user counters (O(1) regardless of history);
+    only the last-7-days count touches entries, via the (user_id, created_at) index.
+    """
+    return StatsService.get_stats(db, current_user.id)
+
+@router.get("/activity", response_model=schemas.ActivityHistogram)
+def get_activity(
+    date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD), default 364 days before date_to"),
+    date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD), default today (UTC)"),
+    bucket: str = Query("day", description="Histogram bucket: day, week or month"),
+    entry_type: Optional[str] = Query(None, description="Filter by entry type"),
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Entry counts and bytes per day/week/month, for heatmaps and histograms"""
+    if bucket not in ACTIVITY_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid bucket: '{bucket}'. Expected one of: {', '.join(ACTIVITY_BUCKETS)}."
+        )
+    try:
+        end = date.fromisoformat(date_to) if date_to else datetime.utcnow().date()
+        start = date.fromisoformat(date_from) if date_from else end - timedelta(days=364)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid date format. Expected YYYY-MM-DD."
+        )
+    if start > end:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (end - start).days > MAX_ACTIVITY_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range too large; at most {MAX_ACTIVITY_DAYS} days per request."
         )
-        if batch is not None and batch_size is not None:
-            type_query = type_query.offset(batch * batch_size).limit(batch_size)
-        count = type_query.count()
-        entries_by_type[entry_type] = count
-    
-    # Recent activity (last 7 days)
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_query = db.query(models.Entry).filter(
-        models.Entry.user_id == current_user.id,
-        models.Entry.created_at >= week_ago
-    )
-    if batch is not None and batch_size is not None:
-        recent_query = recent_query.offset(batch * batch_size).limit(batch_size)
-    recent_entries = recent_query.count()
-    
-    # Processing status
-    processed_query = db.query(models.Entry).filter(
-        models.Entry.user_id == current_user.id,
-        models.Entry.processed == True
-    )
-    if batch is not None and batch_size is not None:
-        processed_query = processed_query.offset(batch * batch_size).limit(batch_size)
-    processed_entries = processed_query.count()
-    
-    pending_entries = total_entries - processed_entries
     
-    return {
-        "total_entries": total_entries,
-        "entries_by_type": entries_by_type,
-        "recent_activity": recent_entries,
-        "processed_entries": processed_entries,
-        "pending_entries": pending_entries
-    }
+    return StatsService.activity_histogram(db, current_user.id, start, end, bucket, entry_type)
 
 @router.get("/weekly-summaries", response_model=List[schemas.WeeklySummary])
-async def get_weekly_summaries(
+def get_weekly_summaries(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=50),
-    current_user: models.User = Depends(get_current_user_dependency),
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """Get user's weekly summaries"""
@@ -132,134 +149,38 @@ async def get_weekly_summaries(
     return [schemas.WeeklySummary.model_validate(summary) for summary in summaries]
 
 
-@router.post("/generate-summary")
-async def generate_weekly_summary(
-    current_user: models.User = Depends(get_current_user_dependency),
+@router.post("/generate-summary", response_model=schemas.SummaryJob, status_code=202)
+def generate_weekly_summary(
+    refresh: bool = Query(False, description="Regenerate even if this week already has a summary"),
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
-    """Generate a new weekly summary for the current user"""
-    from datetime import datetime, timedelta
-    
-    try:
-        # Calculate the date range for the current week
-        today = datetime.now()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
-        
-        # Get user's entries for the week
-        entries = db.query(models.Entry).filter(
-            models.Entry.user_id == current_user.id,
-            models.Entry.created_at >= week_start,
-            models.Entry.created_at <= week_end + timedelta(days=1)
-        ).all()
-        
-        # Generate summary using OpenAI (even if no entries)
-        from app.core.config import settings
-        import openai
-        import logging
-        
-        # Debug output
-        import os
-        print(f"DEBUG: OpenAI API key configured: {bool(settings.openai_api_key)}")
-        print(f"DEBUG: Raw env var OPENAI_API_KEY: {bool(os.getenv('OPENAI_API_KEY'))}")
-        if os.getenv('OPENAI_API_KEY'):
-            print(f"DEBUG: Raw env var starts with: {os.getenv('OPENAI_API_KEY')[:10]}...")
-        if settings.openai_api_key:
-            print(f"DEBUG: Settings API key starts with: {settings.openai_api_key[:10]}...")
-        
-        if not entries:
-            # No entries case - use GPT to provide helpful feedback
-            if not settings.openai_api_key:
-                print("DEBUG: Using fallback summary - no OpenAI key (no entries)")
-                summary = f"No entries were logged for the week of {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}. Consider adding some activities to track your weekly progress!"
-            else:
-                # Use OpenAI to generate helpful feedback for no entries
-                openai.api_key = settings.openai_api_key
-                
-                try:
-                    print("DEBUG: Attempting OpenAI API call for no entries case...")
-                    response = openai.ChatCompletion.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful life coach assistant. The user has no logged activities for this week."},
-                            {"role": "user", "content": f"I have no logged activities for the week of {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}. Please provide encouraging and helpful feedback about this, and suggest ways to start tracking activities."}
-                        ],
-                        max_tokens=200
-                    )
-                    summary = response.choices[0].message.content
-                    print("DEBUG: OpenAI API call successful for no entries case")
-                except Exception as e:
-                    print(f"DEBUG: OpenAI API call failed for no entries: {str(e)}")
-                    summary = f"No entries were logged for the week of {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}. Consider adding some activities to track your weekly progress! (OpenAI error: {str(e)})"
-        else:
-            # Check if summary already exists for this week
-            existing_summary = db.query(models.WeeklySummary).filter(
-                models.WeeklySummary.user_id == current_user.id,
-                models.WeeklySummary.week_start == week_start.date(),
-                models.WeeklySummary.week_end == week_end.date()
-            ).first()
-            
-            if existing_summary:
-                return {
-                    "message": "Weekly summary already exists for this week",
-                    "status": "already_exists",
-                    "summary": existing_summary.summary
-                }
-            
-            # Entries exist case - use GPT to generate comprehensive summary
-            if not settings.openai_api_key:
-                # Fallback to simple summary if no OpenAI key
-                print("DEBUG: Using fallback summary - no OpenAI key")
-                summary = f"Weekly summary for {len(entries)} entries from {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}. " \
-                         f"Activities included: {', '.join(set(e.entry_type for e in entries))}."
-            else:
-                # Use OpenAI to generate summary
-                openai.api_key = settings.openai_api_key
-                
-                # Combine all content
-                combined_content = "\n\n".join([
-                    f"Entry {i+1} ({entry.entry_type}): {entry.content[:500]}..."
-                    for i, entry in enumerate(entries)
-                ])
-                
-                try:
-                    print("DEBUG: Attempting OpenAI API call...")
-                    response = openai.ChatCompletion.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant that creates concise weekly summaries of life activities."},
-                            {"role": "user", "content": f"Please create a brief weekly summary of these activities:\n\n{combined_content}"}
-                        ],
-                        max_tokens=300
-                    )
-                    summary = response.choices[0].message.content
-                    print("DEBUG: OpenAI API call successful")
-                except Exception as e:
-                    # Fallback if OpenAI fails
-                    print(f"DEBUG: OpenAI API call failed: {str(e)}")
-                    summary = f"Weekly summary for {len(entries)} entries from {week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}. " \
-                             f"Activities included: {', '.join(set(e.entry_type for e in entries))}. (OpenAI error: {str(e)})"
-        
-        # Save summary to database
-        weekly_summary = models.WeeklySummary(
-            user_id=current_user.id,
-            week_start=week_start.date(),
-            week_end=week_end.date(),
-            summary=summary
-        )
-        
-        db.add(weekly_summary)
-        db.commit()
-        db.refresh(weekly_summary)
-        
-        return {
-            "message": "Weekly summary generated successfully",
-            "status": "success",
-            "summary": summary
-        }
-        
-    except Exception as e:
-        return {
-            "message": f"Error generating weekly summary: {str(e)}",
-            "status": "error"
-        }
+    """Queue generation of the current week's summary and return its job.
+
+    Requests for a week whose job is queued or running share that job; poll
+    GET /timeline/summary-jobs/{id} for the result.
+    """
+    job, queue = SummaryService.request_week(db, current_user.id, datetime.utcnow().date(), refresh)
+    if queue:
+        try:
+            generate_weekly_summary_task.delay(job.id)
+        except Exception as e:
+            SummaryService.fail(db, job, f"Could not queue summary generation: {str(e)}")
+            raise HTTPException(status_code=503, detail="Summary generation is unavailable right now")
+        db.refresh(job)
+    return schemas.SummaryJob.model_validate(job)
+
+@router.get("/summary-jobs/{job_id}", response_model=schemas.SummaryJob)
+def get_summary_job(
+    job_id: int,
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: Session = Depends(get_db)
+):
+    """Status of a weekly summary job, with the summary once it is done"""
+    job = db.query(models.SummaryJob).filter(
+        models.SummaryJob.id == job_id,
+        models.SummaryJob.user_id == current_user.id
+    ).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Summary job not found")
+    return schemas.SummaryJob.model_validate(job)
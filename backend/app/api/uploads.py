@@ -1,116 +1,228 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional
 import os
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.models import models, schemas
 from app.api.auth import get_current_user_dependency
-from app.services.file_service import FileService
-from app.tasks.processing_tasks import process_file_task
+from app.services.principal_cache import Principal
+from app.api.pagination import NEXT_CURSOR_HEADER, entry_cursor, entries_before_cursor
+from app.services.file_service import FileService, FileTooLargeError, SavedUpload
+from app.services.blob_store import BlobStore
+from app.services.stats_service import StatsService
+from app.services.transcription_service import TranscriptionService
+from app.services.chunk_service import ChunkService
+from app.services.semantic_index import semantic_indexes
+from app.tasks.processing_tasks import schedule_processing, schedule_embedding
 from app.core.config import settings
 
 router = APIRouter()
 
-@router.post("/file", response_model=schemas.Entry)
-async def upload_file(
-    file: UploadFile = File(...),
-    title: Optional[str] = Form(None),
-    current_user: models.User = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
-):
-    """Upload and process a file"""
-    
-    # Read file content to check size
-    file_content = await file.read()
-    file_size = len(file_content)
-    if file_size > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds maximum limit of {settings.max_file_size} bytes"
-        )
-    # Reset file pointer for downstream consumers
-    file.file.seek(0)
-    
-    file_service = FileService()
-    
-    # Determine file type using content-based validation
-    file_type = file_service.get_file_type(file.filename, file_content=file_content)
+# Room for multipart boundaries, part headers and the title field around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds maximum limit of {settings.max_file_size} bytes"
+    )
+
+class UploadSizeLimitMiddleware:
+    """Refuse oversized upload bodies before the multipart parser spools them to disk.
+
+    A Content-Length over the limit is rejected without reading the body; a
+    body without one is counted as it arrives and cut off at the limit.
+    """
+
+    def __init__(self, app, paths: tuple):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        max_body = settings.max_file_size + MULTIPART_OVERHEAD_BYTES
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > max_body:
+            await self.reject(scope, receive, send)
+            return
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    # Raised inside request.form(); FastAPI answers it as the 413 it is
+                    raise upload_too_large()
+            return message
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def reject(scope, receive, send):
+        error = upload_too_large()
+        response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+        await response(scope, receive, send)
+
+def discard_unreferenced_blob(db: Session, file_service: FileService, saved: SavedUpload):
+    """Remove a freshly stored blob unless an existing entry already references it"""
+    if saved.spare_path and os.path.exists(saved.spare_path):
+        file_service.delete_file(saved.spare_path)
+    if not BlobStore.is_referenced(db, saved.content_hash) and os.path.exists(saved.file_path):
+        file_service.delete_file(saved.file_path)
+
+def store_upload(
+    db: Session, file_service: FileService, saved: SavedUpload, file_type: str, title: Optional[str], user_id: int
+) -> schemas.Entry:
+    """Create the entry for a file already in the blob store and queue its processing"""
+    file_path = saved.file_path
     if file_type == 'unknown':
+        discard_unreferenced_blob(db, file_service, saved)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Unsupported or unrecognized file type"
         )
     
     try:
-        # Save file
-        file_path, original_filename = await file_service.save_file(file, current_user.id)
-        file_saved = True
+        # If these exact bytes were already processed, reuse the extracted content
+        duplicate = BlobStore.find_processed_duplicate(db, saved.content_hash)
         
         # Create entry in database
         entry = models.Entry(
-            user_id=current_user.id,
-            title=title or original_filename,
+            user_id=user_id,
+            title=title or saved.original_filename,
+            content=duplicate.content if duplicate else None,
             entry_type=file_type,
             file_path=file_path,
-            original_filename=original_filename,
-            file_size=file_size,
-            processed=False
+            original_filename=saved.original_filename,
+            file_size=saved.file_size,
+            content_hash=saved.content_hash,
+            speech_ratio=duplicate.speech_ratio if duplicate else None,
+            processed=duplicate is not None
         )
         
         db.add(entry)
+        BlobStore.acquire(db, saved.content_hash, file_path, saved.file_size)
+        StatsService.entry_added(db, entry)
+        if duplicate:
+            ChunkService.copy(db, duplicate.id, entry)
         try:
             db.commit()
             db.refresh(entry)
         except Exception as db_exc:
             # Rollback and cleanup file if DB commit fails
             db.rollback()
-            if file_saved and os.path.exists(file_path):
-                file_service.delete_file(file_path)
+            discard_unreferenced_blob(db, file_service, saved)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to save entry to database: {str(db_exc)}"
             )
+        BlobStore.settle(file_path, saved.spare_path)
         
-        # Start background processing task
-        process_file_task.delay(entry.id)
+        # Start background processing task unless the content was reused
+        if entry.processed:
+            schedule_embedding()
+        else:
+            schedule_processing(entry)
         
         return schemas.Entry.model_validate(entry)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        # Cleanup file if it was saved
-        if 'file_path' in locals() and os.path.exists(file_path):
-            file_service.delete_file(file_path)
+        # Cleanup file if no other entry shares it
+        db.rollback()
+        discard_unreferenced_blob(db, file_service, saved)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload file: {str(e)}"
         )
 
-@router.get("/", response_model=List[schemas.Entry])
-async def get_user_entries(
-    skip: int = 0,
-    limit: int = 50,
-    current_user: models.User = Depends(get_current_user_dependency),
+@router.post("/file", response_model=schemas.Entry)
+async def upload_file(
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
-    """Get user's uploaded entries"""
-    entries = db.query(models.Entry).filter(
+    """Upload and process a file"""
+    
+    too_large = upload_too_large()
+    # Bodies far over the limit were refused by UploadSizeLimitMiddleware;
+    # this catches files just over it
+    if file.size is not None and file.size > settings.max_file_size:
+        raise too_large
+    
+    file_service = FileService()
+    
+    # Stream the upload to disk in chunks, enforcing the size limit as we go
+    try:
+        saved = await file_service.save_file(file)
+    except FileTooLargeError:
+        raise too_large
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload file: {str(e)}"
+        )
+    
+    # Determine file type from the leading bytes only
+    file_type = file_service.get_file_type(saved.original_filename, file_content=saved.head)
+    
+    # The rest is blocking database work; run it on the thread pool
+    return await run_in_threadpool(store_upload, db, file_service, saved, file_type, title, current_user.id)
+
+@router.get("/", response_model=List[schemas.EntrySummary])
+async def get_user_entries(
+    response: Response,
+    entry_type: Optional[str] = None,
+    processed: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get user's uploaded entries, newest first, paged by X-Next-Cursor"""
+    query = select(models.Entry).options(load_only(*models.ENTRY_SUMMARY_COLUMNS)).filter(
         models.Entry.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    )
+    if entry_type:
+        query = query.filter(models.Entry.entry_type == entry_type)
+    if processed is not None:
+        query = query.filter(models.Entry.processed == processed)
+    if cursor:
+        query = query.filter(entries_before_cursor(db, cursor))
+    elif skip:
+        query = query.offset(skip)
     
-    return [schemas.Entry.model_validate(entry) for entry in entries]
+    entries = (await db.execute(query.order_by(
+        desc(models.Entry.created_at), desc(models.Entry.id)
+    ).limit(limit + 1))).scalars().all()
+    
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = entry_cursor(entries[-1])
+    
+    return [schemas.EntrySummary.model_validate(entry) for entry in entries]
 
 @router.get("/{entry_id}", response_model=schemas.Entry)
 async def get_entry(
     entry_id: int,
-    current_user: models.User = Depends(get_current_user_dependency),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific entry"""
-    entry = db.query(models.Entry).filter(
+    entry = (await db.execute(select(models.Entry).filter(
         models.Entry.id == entry_id,
         models.Entry.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not entry:
         raise HTTPException(
@@ -120,10 +232,43 @@ async def get_entry(
     
     return schemas.Entry.model_validate(entry)
 
+@router.get("/{entry_id}/content", response_model=schemas.EntryContent)
+async def get_entry_content(
+    entry_id: int,
+    offset: int = Query(0, ge=0, description="First character to return"),
+    limit: int = Query(64 * 1024, ge=1, le=1024 * 1024, description="Most characters to return"),
+    current_user: Principal = Depends(get_current_user_dependency),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a character range of an entry's content; the database reads only that range where it can"""
+    row = (await db.execute(select(
+        func.substr(models.Entry.content, offset + 1, limit),
+        func.length(models.Entry.content)
+    ).filter(
+        models.Entry.id == entry_id,
+        models.Entry.user_id == current_user.id
+    ))).first()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Entry not found"
+        )
+    
+    content, total_length = row[0] or "", row[1] or 0
+    end = offset + len(content)
+    return schemas.EntryContent(
+        entry_id=entry_id,
+        offset=offset,
+        total_length=total_length,
+        content=content,
+        next_offset=end if end < total_length else None
+    )
+
 @router.delete("/{entry_id}")
-async def delete_entry(
+def delete_entry(
     entry_id: int,
-    current_user: models.User = Depends(get_current_user_dependency),
+    current_user: Principal = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """Delete entry and associated file"""
@@ -138,13 +283,28 @@ async def delete_entry(
             detail="Entry not found"
         )
     
-    # Delete file from filesystem
-    file_service = FileService()
-    if entry.file_path and os.path.exists(entry.file_path):
-        file_service.delete_file(entry.file_path)
+    # Drop the blob reference; the file goes only when no other entry shares it.
+    # Entries uploaded before the blob store own their file outright.
+    if entry.content_hash:
+        orphaned_path = BlobStore.release(db, entry.content_hash)
+    else:
+        orphaned_path = entry.file_path
     
-    # Delete entry from database
+    # Delete entry and its embedding from database
+    db.query(models.SearchIndex).filter(models.SearchIndex.entry_id == entry.id).delete(synchronize_session=False)
+    TranscriptionService.discard(db, entry.id)
+    ChunkService.discard(db, entry.id)
     db.delete(entry)
+    StatsService.entry_deleted(db, entry)
     db.commit()
+    semantic_indexes.remove_entry(current_user.id, entry_id)
+    
+    # Delete file from filesystem, unless an identical upload took a new
+    # reference to the blob since our transaction committed
+    if entry.content_hash and orphaned_path and BlobStore.is_referenced(db, entry.content_hash):
+        orphaned_path = None
+    if orphaned_path and os.path.exists(orphaned_path):
+        file_service = FileService()
+        file_service.delete_file(orphaned_path)
     
     return {"message": "Entry deleted successfully"}
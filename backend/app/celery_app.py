@@ -1,9 +1,41 @@
 from celery import Celery
+from celery.signals import worker_process_init
+from kombu import Queue
 from app.core.config import settings
 
 if not settings.redis_url or not isinstance(settings.redis_url, str) or not settings.redis_url.strip():
     raise RuntimeError("Celery configuration error: settings.redis_url is not set or invalid. Please check your configuration.")
 
+# Work is split by cost so a burst of long transcriptions cannot starve cheap
+# text extraction: each queue gets its own worker pool.
+TEXT_QUEUE = "text"
+OCR_QUEUE = "ocr"
+TRANSCRIPTION_QUEUE = "transcription"
+EMBEDDINGS_QUEUE = "embeddings"
+SUMMARIES_QUEUE = "summaries"
+
+ENTRY_TYPE_QUEUES = {
+    "text": TEXT_QUEUE,
+    "image": OCR_QUEUE,
+    "audio": TRANSCRIPTION_QUEUE,
+}
+
+# (concurrency, prefetch multiplier) for a worker serving a single queue. Cheap
+# text tasks prefetch freely; inference tasks take one message at a time so a
+# long job never holds others hostage in its local buffer.
+QUEUE_POOLS = {
+    TEXT_QUEUE: (8, 4),
+    OCR_QUEUE: (2, 1),
+    TRANSCRIPTION_QUEUE: (1, 1),
+    EMBEDDINGS_QUEUE: (1, 1),
+    # Multi-call LLM jobs: mostly waiting on the API, but each one is long
+    SUMMARIES_QUEUE: (4, 1),
+}
+
+def queue_for_entry_type(entry_type: str) -> str:
+    """Queue that process_file_task should run on for an entry of this type"""
+    return ENTRY_TYPE_QUEUES.get(entry_type, TEXT_QUEUE)
+
 celery_app = Celery(
     "lifelog",
     broker=settings.redis_url,
@@ -18,4 +50,36 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     result_expires=3600,
+    task_queues=[Queue(name) for name in QUEUE_POOLS],
+    task_default_queue=TEXT_QUEUE,
+    task_routes={
+        "app.tasks.processing_tasks.transcribe_segment_task": {"queue": TRANSCRIPTION_QUEUE},
+        # Stitching segments is quick database work; keep it off the busy transcription pool
+        "app.tasks.processing_tasks.finish_transcription_task": {"queue": TEXT_QUEUE},
+        "app.tasks.processing_tasks.fail_transcription_task": {"queue": TEXT_QUEUE},
+        "app.tasks.processing_tasks.embed_pending_entries_task": {"queue": EMBEDDINGS_QUEUE},
+        "app.tasks.processing_tasks.compact_vector_shards_task": {"queue": EMBEDDINGS_QUEUE},
+        "app.tasks.processing_tasks.generate_weekly_summary_task": {"queue": SUMMARIES_QUEUE},
+    },
+    beat_schedule={
+        # Catch entries whose on-completion embedding trigger was lost
+        "embed-pending-entries": {
+            "task": "app.tasks.processing_tasks.embed_pending_entries_task",
+            "schedule": 300.0,
+        },
+        "compact-vector-shards": {
+            "task": "app.tasks.processing_tasks.compact_vector_shards_task",
+            "schedule": 3600.0,
+        },
+    },
 )
+
+if settings.worker_queue in QUEUE_POOLS:
+    celery_app.conf.worker_concurrency, celery_app.conf.worker_prefetch_multiplier = QUEUE_POOLS[settings.worker_queue]
+
+@worker_process_init.connect
+def warm_up_worker_models(**kwargs):
+    """Load the configured models in each pool process before it takes a task"""
+    from app.services.model_registry import model_registry
+    names = [name.strip() for name in settings.worker_warm_models.split(",") if name.strip()]
+    model_registry.warm_up(names)
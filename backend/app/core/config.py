@@ -16,15 +16,47 @@ class Settings(BaseSettings):
     
     # OpenAI
     openai_api_key: Optional[str] = None
+    summary_model: str = os.environ.get("SUMMARY_MODEL", "gpt-3.5-turbo")
+    summary_job_timeout: int = int(os.environ.get("SUMMARY_JOB_TIMEOUT", 600))  # seconds before a stuck job may be requeued
     
     # JWT
     jwt_secret: str = os.environ.get("JWT_SECRET", "your-secret-key-change-in-production")
     jwt_algorithm: str = os.environ.get("JWT_ALGORITHM", "HS256")
     jwt_expiration_hours: int = int(os.environ.get("JWT_EXPIRATION_HOURS", 24))
+    token_cache_size: int = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))  # verified tokens kept per process; 0 disables
     
     # File uploads
     upload_dir: str = os.environ.get("UPLOAD_DIR", "uploads")
     max_file_size: int = int(os.environ.get("MAX_FILE_SIZE", 100 * 1024 * 1024))  # 100MB
+    max_extracted_chars: int = int(os.environ.get("MAX_EXTRACTED_CHARS", 2_000_000))  # text kept per document
+    
+    # Inference models (loaded lazily by worker processes, see model_registry)
+    transcription_backend: str = os.environ.get("TRANSCRIPTION_BACKEND", "whisper")  # 'whisper', 'faster-whisper' (int8 CPU) or 'fake'
+    whisper_model: str = os.environ.get("WHISPER_MODEL", "base")  # model size for either whisper backend
+    transcription_threads: int = int(os.environ.get("TRANSCRIPTION_THREADS", 0))  # CPU threads per process, 0 = library default
+    ocr_max_pixels: int = int(os.environ.get("OCR_MAX_PIXELS", 12_000_000))  # larger images are downscaled before OCR
+    ocr_threads: int = int(os.environ.get("OCR_THREADS", 4))  # tiles OCRed at once, each by its own tesseract process
+    worker_warm_models: str = os.environ.get("WORKER_WARM_MODELS", "")  # comma-separated, e.g. "transcription,embedding"
+    # Longer recordings are split at pauses into segments transcribed in parallel
+    transcription_segment_seconds: int = int(os.environ.get("TRANSCRIPTION_SEGMENT_SECONDS", 300))
+    transcription_overlap_seconds: float = float(os.environ.get("TRANSCRIPTION_OVERLAP_SECONDS", 1.0))  # context decoded each side
+    
+    # Celery queue this worker consumes (-Q); picks its pool size and prefetch from celery_app.QUEUE_POOLS
+    worker_queue: str = os.environ.get("WORKER_QUEUE", "")  # 'text', 'ocr', 'transcription', 'embeddings', 'summaries' or '' for all
+    
+    # Semantic search
+    embedding_model: str = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    embedding_batch_size: int = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+    embedding_batch_delay: int = int(os.environ.get("EMBEDDING_BATCH_DELAY", 10))  # seconds to coalesce triggers
+    semantic_index_backend: str = os.environ.get("SEMANTIC_INDEX_BACKEND", "mmap")  # 'mmap' shards or 'memory'
+    vector_dir: str = os.environ.get("VECTOR_DIR", "vectors")  # must be shared by API and workers for 'mmap'
+    vector_dtype: str = os.environ.get("VECTOR_DTYPE", "float32")  # 'float16' halves disk/page cache but scores slower
+    
+    # Authenticated-principal cache (saves the users lookup on each request)
+    principal_cache_backend: str = os.environ.get("PRINCIPAL_CACHE_BACKEND", "memory")  # 'memory' or 'redis'
+    principal_cache_ttl: int = int(os.environ.get("PRINCIPAL_CACHE_TTL", 60))  # seconds
+    principal_cache_size: int = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+    principal_cache_redis_timeout: float = float(os.environ.get("PRINCIPAL_CACHE_REDIS_TIMEOUT", 0.25))  # seconds per connect/read
     
     test_env_path: Optional[str] = None
     
@@ -38,5 +70,3 @@ settings = Settings()
 if settings.jwt_secret == "your-secret-key-change-in-production":
     warnings.warn("WARNING: You are using the default JWT secret. Set JWT_SECRET in your environment for production.")
 
-print("ENV FILE PATH:", os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../.env')))
-print(".env exists:", os.path.exists(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../.env'))))
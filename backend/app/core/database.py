@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from app.core.config import settings
 import os
 
@@ -32,3 +34,36 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async drivers for the same database, for handlers that await their queries
+# instead of blocking the event loop
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    return url.set(
+        drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    ).render_as_string(hide_password=False)
+
+try:
+    if settings.database_url.startswith('sqlite'):
+        async_engine = create_async_engine(async_database_url(settings.database_url))
+    else:
+        async_engine = create_async_engine(
+            async_database_url(settings.database_url),
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        )
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+except ImportError:
+    # aiosqlite/asyncpg not installed; get_async_db reports it on first use
+    async_engine = None
+    AsyncSessionLocal = None
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database access needs the aiosqlite or asyncpg package")
+    async with AsyncSessionLocal() as db:
+        yield db
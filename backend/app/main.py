@@ -12,6 +12,10 @@ from app.core.database import get_db, engine
 #models.Base.metadata.create_all(bind=engine)
 from app.api import auth, uploads, timeline, search
 from app.services.auth_service import verify_token
+from app.services.model_registry import API_ROLE, model_registry
+
+# API workers never load transcription/OCR models; that work runs in Celery
+model_registry.set_role(API_ROLE)
 
 app = FastAPI(
     title="LifeLog AI API",
@@ -26,8 +30,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Refuse oversized uploads from their headers, before the body is spooled
+app.add_middleware(uploads.UploadSizeLimitMiddleware, paths=("/uploads/file",))
+
 # Security
 security = HTTPBearer()
 
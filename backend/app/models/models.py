@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, LargeBinary, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Date, DateTime, Text, JSON, ForeignKey, Boolean, LargeBinary, UniqueConstraint, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
+from app.services.fulltext_index import install_sqlite_fts, install_postgres_fts
 
 class User(Base):
     __tablename__ = "users"
@@ -26,11 +27,14 @@ class Entry(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     title = Column(String)
     content = Column(Text)
+    preview = Column(String)  # first ENTRY_PREVIEW_CHARS of content, kept in sync on assignment
     entry_type = Column(String)  # 'text', 'audio', 'image'
     file_path = Column(String)
     original_filename = Column(String)
     file_size = Column(Integer)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the uploaded file (FileBlob key)
     processed = Column(Boolean, default=False)
+    speech_ratio = Column(Float)  # audio only: fraction of the recording with voice activity
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -38,11 +42,110 @@ class Entry(Base):
         # Example unique constraint: user cannot have two entries with the same title
         # (adjust as needed for your use case)
         UniqueConstraint('user_id', 'title', name='uq_user_entry_title'),
+        # Keyset pagination of timeline/uploads listings: newest first, with
+        # optional entry_type or processed filters
+        Index('ix_entries_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_entries_user_type_created', 'user_id', 'entry_type', 'created_at', 'id'),
+        Index('ix_entries_user_processed_created', 'user_id', 'processed', 'created_at', 'id'),
     )
     
     # Relationships
     user = relationship("User", back_populates="entries")
 
+# List views load only these columns, so multi-megabyte content is never read
+# for them (see schemas.EntrySummary); the full text is served in ranges by
+# GET /uploads/{id}/content
+ENTRY_PREVIEW_CHARS = 200
+ENTRY_SUMMARY_COLUMNS = (
+    Entry.id, Entry.user_id, Entry.title, Entry.entry_type, Entry.file_size,
+    Entry.processed, Entry.preview, Entry.created_at,
+)
+
+@event.listens_for(Entry.content, "set")
+def update_entry_preview(entry, value, oldvalue, initiator):
+    entry.preview = value[:ENTRY_PREVIEW_CHARS] if value else None
+
+@event.listens_for(Entry.__table__, "after_create")
+def create_entry_fulltext_index(target, connection, **kw):
+    # SQLite gets an FTS5 index kept in sync by triggers, Postgres a generated
+    # tsvector column with a GIN index; existing databases are migrated by init_db.py
+    if connection.dialect.name == "sqlite":
+        install_sqlite_fts(connection)
+    elif connection.dialect.name == "postgresql":
+        install_postgres_fts(connection)
+
+class AudioSegment(Base):
+    __tablename__ = "audio_segments"
+    
+    # One slice of a long recording, transcribed on its own; a row with text
+    # set is a checkpoint that retries of the entry do not redo
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("entries.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    start_seconds = Column(Float, nullable=False)
+    end_seconds = Column(Float, nullable=False)
+    text = Column(Text)  # None until transcribed
+    timestamps = Column(JSON)  # [[start, end, text], ...] in seconds from the start of the recording
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('entry_id', 'position', name='uq_audio_segment_position'),
+    )
+
+class EntryChunk(Base):
+    __tablename__ = "entry_chunks"
+    
+    # Overlapping passages of an entry's content, so search can point at the
+    # matching part of a long document or transcript (see ChunkService)
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("entries.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    start_char = Column(Integer, nullable=False)  # offsets into Entry.content
+    end_char = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    start_seconds = Column(Float)  # transcripts only
+    end_seconds = Column(Float)
+    
+    __table_args__ = (
+        UniqueConstraint('entry_id', 'position', name='uq_entry_chunk_position'),
+    )
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    
+    # Content-addressed upload storage: one file on disk per distinct SHA-256,
+    # shared by every entry that uploaded the same bytes
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String, nullable=False)
+    file_size = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    
+    # Running per-user entry counters, updated in the same transaction as the
+    # entry changes they count (see StatsService)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_entries = Column(Integer, nullable=False, default=0)
+    processed_entries = Column(Integer, nullable=False, default=0)
+    text_entries = Column(Integer, nullable=False, default=0)
+    audio_entries = Column(Integer, nullable=False, default=0)
+    image_entries = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class DailyActivity(Base):
+    __tablename__ = "daily_activity"
+    
+    # Per-user, per-UTC-day, per-type rollup of entries, maintained alongside
+    # UserStats so activity histograms never scan the entries table
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    entry_type = Column(String, primary_key=True)
+    entry_count = Column(Integer, nullable=False, default=0)
+    processed_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+
 class WeeklySummary(Base):
     __tablename__ = "weekly_summaries"
     
@@ -56,12 +159,49 @@ class WeeklySummary(Base):
     # Relationships
     user = relationship("User", back_populates="summaries")
 
+class SummaryJob(Base):
+    __tablename__ = "summary_jobs"
+    
+    # One weekly summary generation per user and week; requests arriving while
+    # it is queued or running share it instead of each calling the LLM
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    week_start = Column(DateTime(timezone=True), nullable=False)
+    week_end = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done or failed
+    summary_id = Column(Integer, ForeignKey("weekly_summaries.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'week_start', name='uq_summary_job_week'),
+    )
+    
+    summary = relationship("WeeklySummary")
+
+class SummaryCache(Base):
+    __tablename__ = "summary_cache"
+    
+    # LLM summaries keyed by a hash of the model, level and input text, so an
+    # unchanged passage, entry, day or week is never summarized twice (see SummaryService)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    input_hash = Column(String(64), nullable=False)  # SHA-256
+    level = Column(String, nullable=False)  # passage, entry, day, week or period
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'input_hash', name='uq_summary_cache_input'),
+    )
+
 class SearchIndex(Base):
     __tablename__ = "search_index"
     
     id = Column(Integer, primary_key=True, index=True)
-    entry_id = Column(Integer, ForeignKey("entries.id", ondelete="CASCADE"))
-    embedding = Column(LargeBinary)  # Store FAISS embeddings
+    entry_id = Column(Integer, ForeignKey("entries.id", ondelete="CASCADE"), unique=True, index=True)
+    embedding = Column(LargeBinary)  # float32 vector bytes, see EmbeddingService
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
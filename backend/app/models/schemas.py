@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Dict, Optional, List
 
 class UserBase(BaseModel):
     email: str
@@ -33,11 +33,31 @@ class Entry(EntryBase):
     original_filename: Optional[str] = None
     file_size: Optional[int] = None
     processed: bool = False
+    speech_ratio: Optional[float] = None  # audio only, once processed
     created_at: datetime
     updated_at: Optional[datetime] = None
     
     model_config = {"from_attributes": True}
 
+class EntrySummary(BaseModel):
+    """List-view projection of an entry: no content, only its preview"""
+    id: int
+    title: Optional[str] = None
+    entry_type: str
+    file_size: Optional[int] = None
+    processed: bool = False
+    preview: Optional[str] = None  # start of the content, once processed
+    created_at: datetime
+    
+    model_config = {"from_attributes": True}
+
+class EntryContent(BaseModel):
+    entry_id: int
+    offset: int  # in characters
+    total_length: int
+    content: str
+    next_offset: Optional[int] = None  # pass as offset for the following range, None at the end
+
 class WeeklySummaryBase(BaseModel):
     summary: str
 
@@ -50,6 +70,16 @@ class WeeklySummary(WeeklySummaryBase):
     
     model_config = {"from_attributes": True}
 
+class SummaryJob(BaseModel):
+    id: int
+    week_start: datetime
+    week_end: datetime
+    status: str  # pending, running, done or failed
+    error: Optional[str] = None
+    summary: Optional[WeeklySummary] = None  # set once done
+
+    model_config = {"from_attributes": True}
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -58,7 +88,34 @@ class TokenResponse(BaseModel):
 class SearchQuery(BaseModel):
     query: str
     limit: int = 10
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+class Passage(BaseModel):
+    text: str
+    start_char: int  # offsets into the entry's content
+    end_char: int
+    start_seconds: Optional[float] = None  # transcripts only
+    end_seconds: Optional[float] = None
+    
+    model_config = {"from_attributes": True}
 
 class SearchResult(BaseModel):
-    entries: List[Entry]
+    entries: List[EntrySummary]
     total: int
+    scores: Optional[List[float]] = None  # relevance per entry, when the backend ranks results
+    snippets: Optional[List[str]] = None  # highlighted match context per entry, SQLite FTS only
+    passages: Optional[List[Optional[Passage]]] = None  # best-matching passage per entry, if any contains a query term
+    next_cursor: Optional[str] = None  # pass back as SearchQuery.cursor for the next page
+
+class ActivityBucket(BaseModel):
+    start: date
+    entry_count: int = 0
+    processed_count: int = 0
+    total_bytes: int = 0
+    by_type: Dict[str, int] = {}  # entry_count per entry type
+
+class ActivityHistogram(BaseModel):
+    bucket: str  # 'day', 'week' (starting Monday) or 'month'
+    date_from: date
+    date_to: date
+    buckets: List[ActivityBucket]  # every bucket in the range, oldest first, empty ones included
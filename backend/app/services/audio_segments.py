@@ -0,0 +1,194 @@
+import subprocess
+import wave
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Whisper's input format: mono float32 PCM at 16kHz
+SAMPLE_RATE = 16000
+
+# Loudness is tracked per 100ms frame; cut points are chosen at frame granularity
+FRAME_SECONDS = 0.1
+FRAME_SAMPLES = int(SAMPLE_RATE * FRAME_SECONDS)
+
+# How far before a segment's target end to look for the quietest cut point
+CUT_SEARCH_SECONDS = 30.0
+
+# Audio is decoded this much at a time when only loudness is needed
+BLOCK_SECONDS = 60
+
+# Voice activity: a frame counts as speech when it is louder than a few times
+# the recording's noise floor (its quietest decile). The threshold is clamped
+# so near-digital silence is never speech and steady loud audio is never all
+# dropped; detected speech is padded so word edges survive.
+SPEECH_RMS_MIN = 0.005  # about -46 dBFS
+SPEECH_RMS_MAX = 0.02  # about -34 dBFS
+NOISE_FLOOR_FACTOR = 3.0
+SPEECH_PAD_FRAMES = 3
+
+Timestamp = Tuple[float, float, str]  # (start seconds, end seconds, text)
+
+def _is_plain_wav(file_path: str) -> bool:
+    """True for 16-bit PCM WAV already at SAMPLE_RATE, which needs no ffmpeg"""
+    try:
+        with wave.open(file_path, "rb") as wav:
+            return wav.getsampwidth() == 2 and wav.getframerate() == SAMPLE_RATE
+    except (wave.Error, EOFError, OSError):
+        return False
+
+def _iter_wav_blocks(file_path: str, start: float, duration: Optional[float], block_samples: int) -> Iterator[np.ndarray]:
+    with wave.open(file_path, "rb") as wav:
+        channels = wav.getnchannels()
+        wav.setpos(min(int(start * SAMPLE_RATE), wav.getnframes()))
+        remaining = None if duration is None else int(duration * SAMPLE_RATE)
+        while remaining is None or remaining > 0:
+            count = block_samples if remaining is None else min(block_samples, remaining)
+            frames = wav.readframes(count)
+            if not frames:
+                break
+            samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+            if channels > 1:
+                samples = samples.reshape(-1, channels).mean(axis=1)
+            if remaining is not None:
+                remaining -= len(samples)
+            yield samples
+
+def _iter_ffmpeg_blocks(file_path: str, start: float, duration: Optional[float], block_samples: int) -> Iterator[np.ndarray]:
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start:
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", file_path]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg is required to decode audio. Please install it.")
+    try:
+        while True:
+            data = process.stdout.read(block_samples * 2)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {file_path}: {stderr.decode(errors='replace').strip()}")
+
+def iter_audio_blocks(
+    file_path: str, start: float = 0.0, duration: Optional[float] = None, block_seconds: float = BLOCK_SECONDS
+) -> Iterator[np.ndarray]:
+    """Decode [start, start + duration) of a recording as SAMPLE_RATE mono float32 blocks"""
+    block_samples = int(block_seconds * SAMPLE_RATE)
+    if _is_plain_wav(file_path):
+        return _iter_wav_blocks(file_path, start, duration, block_samples)
+    return _iter_ffmpeg_blocks(file_path, start, duration, block_samples)
+
+def read_audio(file_path: str, start: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    """Decode a slice of a recording into one array, as transcription backends accept"""
+    blocks = list(iter_audio_blocks(file_path, start, duration))
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+def _frame_rms(samples: np.ndarray) -> np.ndarray:
+    """RMS per whole frame; a trailing partial frame is ignored"""
+    whole = len(samples) // FRAME_SAMPLES * FRAME_SAMPLES
+    frames = samples[:whole].reshape(-1, FRAME_SAMPLES)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+def frame_energies(file_path: str) -> np.ndarray:
+    """RMS loudness of each FRAME_SECONDS frame, decoded block by block in constant memory"""
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)
+    for block in iter_audio_blocks(file_path):
+        samples = np.concatenate([carry, block]) if len(carry) else block
+        whole = len(samples) // FRAME_SAMPLES * FRAME_SAMPLES
+        energies.append(_frame_rms(samples[:whole]))
+        carry = samples[whole:]
+    if len(carry):
+        energies.append(np.sqrt(np.mean(carry * carry, keepdims=True)))
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+def speech_mask(energies: np.ndarray) -> np.ndarray:
+    """Per-frame voice activity from frame loudness"""
+    if not len(energies):
+        return np.zeros(0, dtype=bool)
+    noise_floor = float(np.percentile(energies, 10))
+    threshold = min(max(NOISE_FLOOR_FACTOR * noise_floor, SPEECH_RMS_MIN), SPEECH_RMS_MAX)
+    mask = energies > threshold
+    if mask.any():
+        mask = np.convolve(mask, np.ones(2 * SPEECH_PAD_FRAMES + 1), mode="same") > 0
+    return mask
+
+def speech_ratio(mask: np.ndarray) -> float:
+    return round(float(mask.mean()), 4) if len(mask) else 0.0
+
+def speech_regions(mask: np.ndarray) -> List[Tuple[float, float]]:
+    """(start, end) seconds of each run of speech frames"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return [(start * FRAME_SECONDS, end * FRAME_SECONDS) for start, end in zip(starts, ends)]
+
+def compact_speech(samples: np.ndarray) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+    """Cut the non-speech out of samples.
+
+    Returns the speech audio and, per kept region, (its start in the compacted
+    audio, its start in samples) for mapping timestamps back with restore_time.
+    """
+    regions = speech_regions(speech_mask(_frame_rms(samples)))
+    pieces, speech_map, position = [], [], 0.0
+    for start, end in regions:
+        piece = samples[int(round(start * SAMPLE_RATE)):int(round(end * SAMPLE_RATE))]
+        speech_map.append((position, start))
+        pieces.append(piece)
+        position += len(piece) / SAMPLE_RATE
+    speech = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+    return speech, speech_map
+
+def restore_time(speech_map: Sequence[Tuple[float, float]], t: float, end: bool = False) -> float:
+    """Map a time in compacted speech audio back to the original; region boundaries
+    belong to the earlier region for end times and the later one for start times"""
+    starts = [compact for compact, _ in speech_map]
+    index = (bisect_left(starts, t) if end else bisect_right(starts, t)) - 1
+    compact, original = speech_map[max(index, 0)]
+    return original + (t - compact)
+
+def plan_segments(
+    energies: np.ndarray, segment_seconds: float, search_seconds: float = CUT_SEARCH_SECONDS
+) -> List[Tuple[float, float]]:
+    """Split a recording into consecutive (start, end) ranges of at most segment_seconds.
+
+    Each cut lands on the quietest frame in the search window before the
+    target length, so segments break in pauses rather than mid-word.
+    """
+    total = len(energies) * FRAME_SECONDS
+    cuts = [0.0]
+    while total - cuts[-1] > segment_seconds:
+        target = cuts[-1] + segment_seconds
+        low = max(cuts[-1] + segment_seconds / 2, target - search_seconds)
+        first, last = int(round(low / FRAME_SECONDS)), int(round(target / FRAME_SECONDS))
+        cuts.append((first + int(np.argmin(energies[first:last]))) * FRAME_SECONDS)
+    cuts.append(total)
+    return [(round(start, 3), round(end, 3)) for start, end in zip(cuts, cuts[1:])]
+
+def own_timestamps(segments: Sequence[dict], offset: float, start: float, end: float) -> List[Timestamp]:
+    """Shift transcribed segments decoded from offset to absolute time, keeping those centred in [start, end).
+
+    Neighbouring segments are decoded with some overlap for context; each
+    phrase is kept only by the segment whose range contains its midpoint, so
+    nothing is transcribed twice in the stitched result.
+    """
+    owned = []
+    for segment in segments:
+        seg_start, seg_end = offset + segment["start"], offset + segment["end"]
+        if start <= (seg_start + seg_end) / 2 < end:
+            owned.append((round(seg_start, 3), round(seg_end, 3), segment["text"].strip()))
+    return owned
+
+def stitch_timestamps(parts: Sequence[Sequence[Timestamp]]) -> Tuple[str, List[Timestamp]]:
+    """Join per-segment timestamps, in segment order, into one transcript"""
+    timestamps = [tuple(timestamp) for part in parts for timestamp in part]
+    text = " ".join(text for _, _, text in timestamps if text)
+    return text, timestamps
@@ -1,20 +1,86 @@
-from google.auth.transport import requests
-from google.oauth2 import id_token
 from jose import JWTError, jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.models import models, schemas
-from typing import Optional, Set
+from app.services.principal_cache import principal_cache
+from typing import Dict, Optional, Set
+import hashlib
+import threading
+import time
 
 # In-memory revoked tokens set (for demonstration; use persistent store in production)
 REVOKED_TOKENS: Set[str] = set()
 
+class VerifiedTokenCache:
+    """Bounded LRU of verified JWT payloads keyed by the token's SHA-256 digest.
+
+    A hit is only served while the token's exp lies in the future; callers
+    still check revocation on every request.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self.key(token)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None and payload["exp"] <= time.time():
+                del self._entries[key]
+                payload = None
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Copies, so a caller mutating its claims cannot change the cached ones
+            return dict(payload)
+
+    def set(self, token: str, payload: dict):
+        # Tokens without a numeric exp would never age out; always verify those
+        if self.max_size <= 0 or not isinstance(payload.get("exp"), (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = dict(payload)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+token_cache = VerifiedTokenCache(settings.token_cache_size)
+
 class AuthService:
     @staticmethod
     def verify_google_token(token: str) -> dict:
         """Verify Google OAuth token and return user info"""
+        # google-auth pulls in requests; only Google sign-in needs it
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
         try:
             idinfo = id_token.verify_oauth2_token(
                 token, requests.Request(), settings.google_client_id
@@ -90,8 +156,9 @@ class AuthService:
 
     @staticmethod
     def revoke_token(token: str):
-        """Revoke a refresh token (add to blacklist)"""
+        """Revoke a token (add to blacklist)"""
         REVOKED_TOKENS.add(token)
+        token_cache.discard(token)
 
     @staticmethod
     def is_token_revoked(token: str) -> bool:
@@ -115,20 +182,34 @@ class AuthService:
             user.picture = user_data['picture']
             db.commit()
             db.refresh(user)
+            principal_cache.invalidate(user.id)
             
         return user
 
 def verify_token(token: str) -> dict:
-    """Verify JWT token and return payload"""
+    """Verify JWT token and return payload.
+
+    Signature checks are cached per token until it expires; revocation is
+    checked on every call.
+    """
+    if token in REVOKED_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(
             token, 
             settings.jwt_secret, 
             algorithms=[settings.jwt_algorithm]
         )
-        return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
+    token_cache.set(token, payload)
+    return payload
@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import models
+
+class BlobStore:
+    """Content-addressed storage for uploaded files.
+
+    Files live at <upload_dir>/blobs/<h[0:2]>/<h[2:4]>/<h> keyed by their SHA-256,
+    so identical uploads share one file on disk. The file_blobs table keeps a
+    reference count per blob; the file is removed when the last entry using it
+    is deleted.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or settings.upload_dir) / "blobs"
+        self.staging_dir = self.root / "tmp"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> Path:
+        """Fan-out path for a blob so no single directory grows unbounded"""
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def commit_file(self, staged_path: Path, content_hash: str) -> Tuple[str, Optional[str]]:
+        """Move a fully written staging file into its content-addressed location.
+
+        Returns the blob path and, when identical bytes were already stored,
+        the staging file kept as a spare: a concurrent delete may still remove
+        the existing blob before the caller's reference commits (see settle).
+        """
+        blob_path = self.path_for(content_hash)
+        if blob_path.exists():
+            return str(blob_path), str(staged_path)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged_path, blob_path)
+        return str(blob_path), None
+
+    @staticmethod
+    def settle(file_path: str, spare_path: Optional[str]) -> None:
+        """Once the reference is committed, drop the spare copy from commit_file,
+        or move it into place if the blob was deleted in the meantime"""
+        if not spare_path or not os.path.exists(spare_path):
+            return
+        if os.path.exists(file_path):
+            os.remove(spare_path)
+        else:
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(spare_path, file_path)
+
+    @staticmethod
+    def acquire(db: Session, content_hash: str, file_path: str, file_size: int) -> None:
+        """Add a reference to a blob within the caller's transaction"""
+        increment = db.query(models.FileBlob).filter(models.FileBlob.sha256 == content_hash)
+        if increment.update({models.FileBlob.ref_count: models.FileBlob.ref_count + 1}, synchronize_session=False):
+            return
+        try:
+            # Savepoint, so losing the race below leaves the caller's transaction intact
+            with db.begin_nested():
+                db.add(models.FileBlob(
+                    sha256=content_hash,
+                    file_path=file_path,
+                    file_size=file_size,
+                    ref_count=1
+                ))
+        except IntegrityError:
+            # An identical upload inserted the row first
+            increment.update({models.FileBlob.ref_count: models.FileBlob.ref_count + 1}, synchronize_session=False)
+
+    @staticmethod
+    def release(db: Session, content_hash: str) -> Optional[str]:
+        """Drop a reference to a blob within the caller's transaction.
+
+        Returns the blob's file path if this was the last reference; the caller
+        deletes the file once the transaction has committed.
+        """
+        blob = db.query(models.FileBlob).filter(
+            models.FileBlob.sha256 == content_hash
+        ).with_for_update().first()
+        if not blob:
+            return None
+        if blob.ref_count <= 1:
+            db.delete(blob)
+            return blob.file_path
+        blob.ref_count = models.FileBlob.ref_count - 1
+        return None
+
+    @staticmethod
+    def is_referenced(db: Session, content_hash: str) -> bool:
+        return db.query(models.FileBlob.sha256).filter(
+            models.FileBlob.sha256 == content_hash
+        ).first() is not None
+
+    @staticmethod
+    def find_processed_duplicate(db: Session, content_hash: str, exclude_entry_id: Optional[int] = None) -> Optional[models.Entry]:
+        """Find an already processed entry with the same file content, if any"""
+        query = db.query(models.Entry).filter(
+            models.Entry.content_hash == content_hash,
+            models.Entry.processed == True
+        )
+        if exclude_entry_id is not None:
+            query = query.filter(models.Entry.id != exclude_entry_id)
+        return query.first()
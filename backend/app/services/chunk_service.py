@@ -0,0 +1,133 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+from app.models import models
+from app.services.audio_segments import Timestamp
+from app.services.transcription_service import TranscriptionService
+
+# Passages are bounded by word count, a cheap stand-in for model tokens, and
+# overlap so a sentence cut at one boundary is whole in the neighbouring passage
+CHUNK_WORDS = 200
+CHUNK_OVERLAP_WORDS = 40
+
+WORD = re.compile(r"\S+")
+
+def split_passages(text: str, max_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of overlapping passages of at most max_words words"""
+    words = [match.span() for match in WORD.finditer(text)]
+    passages = []
+    for first in range(0, len(words), max_words - overlap):
+        last = min(first + max_words, len(words)) - 1
+        passages.append((words[first][0], words[last][1]))
+        if last == len(words) - 1:
+            break
+    return passages
+
+def timestamp_spans(timestamps: Sequence[Timestamp]) -> List[Tuple[int, float, float]]:
+    """(start character, start seconds, end seconds) of each timestamped piece of a
+    transcript joined the way stitch_timestamps joins it"""
+    spans, position = [], 0
+    for start, end, text in timestamps:
+        if text:
+            spans.append((position, start, end))
+            position += len(text) + 1
+    return spans
+
+class ChunkService:
+    """Maintains EntryChunk passages and picks the one matching a search"""
+
+    @staticmethod
+    def discard(db: Session, entry_id: int):
+        """Drop an entry's passages (caller commits)"""
+        db.query(models.EntryChunk).filter(
+            models.EntryChunk.entry_id == entry_id
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def rebuild(db: Session, entry: models.Entry, timestamps: Optional[Sequence[Timestamp]] = None) -> int:
+        """Replace an entry's passages from its content (caller commits).
+
+        timestamps, for transcripts, are the pieces the content was stitched
+        from; each passage then carries the time range it covers.
+        """
+        ChunkService.discard(db, entry.id)
+        content = entry.content or ""
+        spans = timestamp_spans(timestamps) if timestamps else []
+        span_starts = [start_char for start_char, _, _ in spans]
+        rows = []
+        for position, (start, end) in enumerate(split_passages(content)):
+            row = {
+                "entry_id": entry.id, "position": position, "start_char": start, "end_char": end,
+                "text": content[start:end], "start_seconds": None, "end_seconds": None,
+            }
+            if spans:
+                first = spans[max(bisect_right(span_starts, start) - 1, 0)]
+                last = spans[max(bisect_right(span_starts, end - 1) - 1, 0)]
+                row["start_seconds"], row["end_seconds"] = first[1], last[2]
+            rows.append(row)
+        if rows:
+            db.execute(insert(models.EntryChunk), rows)
+        return len(rows)
+
+    @staticmethod
+    def copy(db: Session, source_entry_id: int, entry: models.Entry) -> int:
+        """Give an entry the passages of another with identical content (caller commits)"""
+        if entry.id is None:
+            db.flush()
+        ChunkService.discard(db, entry.id)
+        columns = ("position", "start_char", "end_char", "text", "start_seconds", "end_seconds")
+        rows = [
+            dict(zip(columns, values), entry_id=entry.id)
+            for values in db.query(*(getattr(models.EntryChunk, column) for column in columns)).filter(
+                models.EntryChunk.entry_id == source_entry_id
+            )
+        ]
+        if rows:
+            db.execute(insert(models.EntryChunk), rows)
+        return len(rows)
+
+    @staticmethod
+    def best_passages(db: Session, entry_ids: Sequence[int], query: str) -> Dict[int, models.EntryChunk]:
+        """The passage of each entry that best matches the query terms.
+
+        Only passages containing at least one term are loaded; they are ranked
+        by distinct terms matched, then total occurrences, then position.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms or not entry_ids:
+            return {}
+        chunks = db.query(models.EntryChunk).filter(
+            models.EntryChunk.entry_id.in_(list(entry_ids)),
+            or_(*[models.EntryChunk.text.ilike(f"%{term}%") for term in terms])
+        ).all()
+        best, best_scores = {}, {}
+        for chunk in chunks:
+            text = chunk.text.lower()
+            score = (sum(term in text for term in terms), sum(text.count(term) for term in terms), -chunk.position)
+            if chunk.entry_id not in best or score > best_scores[chunk.entry_id]:
+                best[chunk.entry_id], best_scores[chunk.entry_id] = chunk, score
+        return best
+
+    @classmethod
+    def rebuild_all(cls, db: Session, batch_size: int = 100) -> int:
+        """Re-chunk every processed entry from its content, with timestamps for segmented
+        recordings; returns entries chunked"""
+        chunked = 0
+        last_id = 0
+        while True:
+            batch = db.query(models.Entry).filter(
+                models.Entry.processed == True,
+                models.Entry.id > last_id
+            ).order_by(models.Entry.id).limit(batch_size).all()
+            if not batch:
+                return chunked
+            for entry in batch:
+                stitched = TranscriptionService.stitch(db, entry.id) if entry.entry_type == "audio" else None
+                cls.rebuild(db, entry, stitched[1] if stitched else None)
+            db.commit()
+            chunked += len(batch)
+            last_id = batch[-1].id
+            # Release the loaded content before the next batch
+            db.expunge_all()
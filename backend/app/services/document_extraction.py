@@ -0,0 +1,115 @@
+import codecs
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+# Plain text is read this many bytes at a time; the encoding is chosen from the first chunk
+TEXT_CHUNK_BYTES = 256 * 1024
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# (done, total, unit): unit is 'page' for PDFs and 'byte' otherwise
+ProgressCallback = Callable[[int, int, str], None]
+
+# Each reader yields (text, done, total, unit), text including its trailing separator
+Piece = Tuple[str, int, int, str]
+
+class UnsupportedDocumentError(Exception):
+    """Raised for document formats we cannot extract text from"""
+
+def document_kind(file_path: str) -> str:
+    """'pdf', 'docx' or 'text', from the leading bytes and the extension"""
+    with open(file_path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    extension = Path(file_path).suffix.lower()
+    if head.startswith(b"PK\x03\x04") and extension == ".docx":
+        return "docx"
+    if head.startswith(b"\xd0\xcf\x11\xe0") or extension == ".doc":
+        raise UnsupportedDocumentError("Legacy .doc files are not supported; please upload .docx or PDF")
+    return "text"
+
+def detect_encoding(prefix: bytes) -> str:
+    """Pick an encoding from a byte-order mark or a strict UTF-8 decode of the prefix"""
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        # Not final: the prefix may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+def iter_text(file_path: str) -> Iterator[Piece]:
+    total = Path(file_path).stat().st_size
+    with open(file_path, "rb") as f:
+        chunk = f.read(TEXT_CHUNK_BYTES)
+        decoder = codecs.getincrementaldecoder(detect_encoding(chunk))(errors="replace")
+        done = 0
+        while chunk:
+            done += len(chunk)
+            yield decoder.decode(chunk), done, total, "byte"
+            chunk = f.read(TEXT_CHUNK_BYTES)
+        yield decoder.decode(b"", final=True), done, total, "byte"
+
+def iter_pdf_pages(file_path: str) -> Iterator[Piece]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("The 'pypdf' package is required for PDF extraction. Please install it.")
+    reader = PdfReader(file_path)
+    total = len(reader.pages)
+    for number, page in enumerate(reader.pages, start=1):
+        yield (page.extract_text() or "").strip() + "\n\n", number, total, "page"
+
+class _CountingReader:
+    """File wrapper that records how many bytes have been read, for progress"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[Piece]:
+    with zipfile.ZipFile(file_path) as archive:
+        try:
+            member = archive.getinfo("word/document.xml")
+        except KeyError:
+            raise UnsupportedDocumentError("Not a Word document: word/document.xml is missing")
+        with archive.open(member) as raw:
+            stream = _CountingReader(raw)
+            parts = []
+            for event, element in iterparse(stream, events=("end",)):
+                if element.tag == WORD_NAMESPACE + "t":
+                    parts.append(element.text or "")
+                elif element.tag == WORD_NAMESPACE + "tab":
+                    parts.append("\t")
+                elif element.tag in (WORD_NAMESPACE + "br", WORD_NAMESPACE + "cr"):
+                    parts.append("\n")
+                elif element.tag == WORD_NAMESPACE + "p":
+                    yield "".join(parts) + "\n", stream.count, member.file_size, "byte"
+                    parts = []
+                    # Paragraphs are done with; drop them so memory stays flat
+                    element.clear()
+
+READERS = {"pdf": iter_pdf_pages, "docx": iter_docx_paragraphs, "text": iter_text}
+
+def extract_document(file_path: str, max_chars: int, progress: Optional[ProgressCallback] = None) -> str:
+    """Stream a document's text, stopping once max_chars have been extracted"""
+    pieces, length = [], 0
+    for text, done, total, unit in READERS[document_kind(file_path)](file_path):
+        if length + len(text) >= max_chars:
+            pieces.append(text[:max_chars - length])
+            break
+        pieces.append(text)
+        length += len(text)
+        if progress:
+            progress(done, total, unit)
+    return "".join(pieces).strip()
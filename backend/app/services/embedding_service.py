@@ -0,0 +1,160 @@
+import numpy as np
+from typing import List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+from app.core.config import settings
+from app.models import models
+from app.services.model_registry import model_registry
+from app.services.vector_store import VectorShard
+
+# Embeddings are stored as raw little-endian float32 bytes, L2-normalized so
+# inner product equals cosine similarity
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+class EmbeddingService:
+    @staticmethod
+    def get_model():
+        """The sentence-transformers model, loaded once per process on first use"""
+        return model_registry.get("embedding")
+
+    @classmethod
+    def encode(cls, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Encode texts into an (n, dim) float32 matrix of normalized vectors"""
+        vectors = cls.get_model().encode(
+            texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return np.ascontiguousarray(vectors, dtype=EMBEDDING_DTYPE)
+
+    @staticmethod
+    def to_bytes(vector: np.ndarray) -> bytes:
+        return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype=EMBEDDING_DTYPE)
+
+    @staticmethod
+    def entry_text(entry: models.Entry) -> Optional[str]:
+        """Text that represents an entry for embedding, or None if there is nothing to embed"""
+        parts = [part for part in (entry.title, entry.content) if part and part.strip()]
+        return "\n".join(parts) if parts else None
+
+    @staticmethod
+    def has_text(entry: models.Entry) -> bool:
+        """Whether processing left the entry any content to embed"""
+        return bool(entry.content and entry.content.strip())
+
+    @staticmethod
+    def pending_entries_query(db: Session):
+        """Processed entries with content that have no SearchIndex row yet"""
+        return db.query(models.Entry).outerjoin(
+            models.SearchIndex, models.SearchIndex.entry_id == models.Entry.id
+        ).filter(
+            models.Entry.processed == True,
+            # preview is None exactly when content is empty, and is cheap to test
+            models.Entry.preview.isnot(None),
+            models.SearchIndex.id.is_(None)
+        )
+
+    @staticmethod
+    def discard(db: Session, entry: models.Entry):
+        """Drop an entry's stale embedding (caller commits).
+
+        An entry with text gets a newer vector from embed_pending, which
+        supersedes the old one in its shard; one left without text never does,
+        so its old vector is tombstoned here.
+        """
+        db.query(models.SearchIndex).filter(models.SearchIndex.entry_id == entry.id).delete(synchronize_session=False)
+        if settings.semantic_index_backend == "mmap" and not EmbeddingService.has_text(entry):
+            shard = VectorShard(settings.vector_dir, entry.user_id)
+            if shard.exists():
+                shard.delete([entry.id])
+
+    @staticmethod
+    def _bulk_insert(db: Session, rows: List[dict]):
+        """Insert SearchIndex rows in one statement, skipping entries embedded concurrently"""
+        try:
+            db.execute(insert(models.SearchIndex), rows)
+            db.commit()
+        except IntegrityError:
+            # Another run embedded some of these entries first (unique entry_id)
+            db.rollback()
+            existing = {
+                entry_id for (entry_id,) in db.query(models.SearchIndex.entry_id).filter(
+                    models.SearchIndex.entry_id.in_([row["entry_id"] for row in rows])
+                )
+            }
+            remaining = [row for row in rows if row["entry_id"] not in existing]
+            if remaining:
+                db.execute(insert(models.SearchIndex), remaining)
+                db.commit()
+
+    @classmethod
+    def embed_pending(cls, db: Session, batch_size: Optional[int] = None, max_entries: Optional[int] = None) -> int:
+        """Embed pending entries in batches and return how many were embedded.
+
+        Walks pending entries in id order, so entries whose content is only
+        whitespace are passed over once per run instead of being re-selected forever.
+        """
+        batch_size = batch_size or settings.embedding_batch_size
+        embedded = 0
+        last_id = 0
+        while max_entries is None or embedded < max_entries:
+            limit = batch_size if max_entries is None else min(batch_size, max_entries - embedded)
+            batch = cls.pending_entries_query(db).options(
+                load_only(models.Entry.id, models.Entry.user_id, models.Entry.title, models.Entry.content)
+            ).filter(models.Entry.id > last_id).order_by(models.Entry.id).limit(limit).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            texts = [(entry.id, entry.user_id, cls.entry_text(entry)) for entry in batch if cls.has_text(entry)]
+            # Release the loaded content before encoding the next batch
+            db.expunge_all()
+            if not texts:
+                continue
+            vectors = cls.encode([text for _, _, text in texts], batch_size=batch_size)
+            cls._bulk_insert(db, [
+                {"entry_id": entry_id, "embedding": cls.to_bytes(vector)}
+                for (entry_id, _, _), vector in zip(texts, vectors)
+            ])
+            if settings.semantic_index_backend == "mmap":
+                cls._append_to_shards([user_id for _, user_id, _ in texts], [entry_id for entry_id, _, _ in texts], vectors)
+            embedded += len(texts)
+        return embedded
+
+    @staticmethod
+    def _append_to_shards(user_ids: List[int], entry_ids: List[int], vectors: np.ndarray):
+        """Append new vectors to each user's on-disk shard, compacting when the delta grows"""
+        user_ids = np.asarray(user_ids)
+        entry_ids = np.asarray(entry_ids, dtype=np.int64)
+        for user_id in np.unique(user_ids):
+            mask = user_ids == user_id
+            shard = VectorShard(settings.vector_dir, int(user_id))
+            shard.append(entry_ids[mask], vectors[mask], dtype=settings.vector_dtype)
+            if shard.needs_compaction():
+                shard.compact()
+
+    @classmethod
+    def rebuild_vector_shards(cls, db: Session) -> int:
+        """Rewrite every user's shard from the search_index table; returns users rebuilt"""
+        rows = db.query(
+            models.Entry.user_id, models.SearchIndex.entry_id, models.SearchIndex.embedding
+        ).join(
+            models.Entry, models.Entry.id == models.SearchIndex.entry_id
+        ).order_by(models.Entry.user_id, models.SearchIndex.id).yield_per(1000)
+        
+        users = 0
+        current_user, ids, vectors = None, [], []
+        for user_id, entry_id, embedding in rows:
+            if user_id != current_user and ids:
+                VectorShard(settings.vector_dir, current_user).rewrite(np.array(ids), np.vstack(vectors), settings.vector_dtype)
+                users += 1
+                ids, vectors = [], []
+            current_user = user_id
+            ids.append(entry_id)
+            vectors.append(cls.from_bytes(embedding))
+        if ids:
+            VectorShard(settings.vector_dir, current_user).rewrite(np.array(ids), np.vstack(vectors), settings.vector_dtype)
+            users += 1
+        return users
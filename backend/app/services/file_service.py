@@ -1,13 +1,18 @@
 import os
 import uuid
-import whisper
-import pytesseract
-from PIL import Image
-import openai
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
-from fastapi import UploadFile
+from typing import List, Optional
+# Starlette directly rather than fastapi, which Celery workers need not import
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 from app.core.config import settings
+from app.services.blob_store import BlobStore
+from app.services.model_registry import model_registry
+from app.services.audio_segments import Timestamp, compact_speech, own_timestamps, read_audio, restore_time, stitch_timestamps
+from app.services.document_extraction import ProgressCallback, extract_document
+from app.services.ocr_pipeline import run_ocr
 
 try:
     import magic
@@ -15,74 +20,147 @@ try:
 except ImportError:
     HAS_MAGIC = False
 
-class FileService:
-    _whisper_model = None
+# Uploads are copied to disk in fixed-size chunks so memory per request stays
+# constant regardless of file size; only the first SNIFF_BYTES are kept around
+# for content-type detection.
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+SNIFF_BYTES = 8 * 1024  # 8KB
+
+# Documents stored as 'text' entries; their text is extracted by document_extraction
+DOCUMENT_MIME_TYPES = {
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the size limit while being streamed"""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File size exceeds maximum limit of {max_size} bytes")
+
+@dataclass
+class SavedUpload:
+    """Result of streaming an upload to disk"""
+    file_path: str
+    original_filename: str
+    file_size: int
+    content_hash: str  # SHA-256 hex digest
+    head: bytes  # first SNIFF_BYTES of the file, for type detection
+    spare_path: Optional[str] = None  # staged copy of an already stored blob, see BlobStore.settle
+
+async def stream_upload_to_disk(file: UploadFile, file_path: Path, max_size: int) -> SavedUpload:
+    """Copy an upload to file_path chunk by chunk, hashing and size-checking as it goes.
+
+    Aborts with FileTooLargeError as soon as max_size is exceeded; the partial
+    file is removed on any failure. Hashing and disk writes run on the thread
+    pool so the event loop keeps serving other requests.
+    """
+    hasher = hashlib.sha256()
+    head = b""
+    file_size = 0
+    try:
+        with open(file_path, "wb") as f:
+            def write_chunk(chunk: bytes):
+                hasher.update(chunk)
+                f.write(chunk)
+            
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise FileTooLargeError(max_size)
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                await run_in_threadpool(write_chunk, chunk)
+    except BaseException:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        raise
+    
+    return SavedUpload(
+        file_path=str(file_path),
+        original_filename=file.filename,
+        file_size=file_size,
+        content_hash=hasher.hexdigest(),
+        head=head,
+    )
 
+class FileService:
     def __init__(self):
         self.upload_dir = Path(settings.upload_dir)
         self.upload_dir.mkdir(exist_ok=True)
         
-        # Initialize Whisper model only once per process
-        if whisper is None:
-            raise ImportError("The 'whisper' package is required for audio processing. Please install it.")
-        if FileService._whisper_model is None:
-            FileService._whisper_model = whisper.load_model("base")
-        self.whisper_model = FileService._whisper_model
-        
-        # Set OpenAI API key
-        if openai is None:
-            raise ImportError("The 'openai' package is required for OpenAI integration. Please install it.")
-        if settings.openai_api_key:
-            openai.api_key = settings.openai_api_key
+        # Transcription and OCR models come from the model registry on first use, in
+        # worker processes only
     
-    async def save_file(self, file: UploadFile, user_id: int) -> Tuple[str, str]:
-        """Save uploaded file and return file path and filename"""
-        # Create user directory
-        user_dir = self.upload_dir / str(user_id)
-        user_dir.mkdir(exist_ok=True)
-        
-        # Generate unique filename
-        file_extension = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = user_dir / unique_filename
-        
-        # Save file
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+    async def save_file(self, file: UploadFile, max_size: Optional[int] = None) -> SavedUpload:
+        """Stream uploaded file into the content-addressed blob store.
+
+        Returns the blob path, size, hash and leading bytes. Identical uploads
+        resolve to the same path; reference counting is done by the caller
+        (BlobStore.acquire) in the same transaction as the entry insert.
+        """
+        blob_store = BlobStore(self.upload_dir)
         
-        return str(file_path), file.filename
+        # Stage under a unique name, then move into place once the hash is known
+        staged_path = blob_store.staging_dir / f"{uuid.uuid4()}{Path(file.filename).suffix}"
+        if max_size is None:
+            max_size = settings.max_file_size
+        saved = await stream_upload_to_disk(file, staged_path, max_size)
+        saved.file_path, saved.spare_path = blob_store.commit_file(staged_path, saved.content_hash)
+        return saved
     
-    def process_text_file(self, file_path: str) -> str:
-        """Process text file and extract content"""
+    def process_text_file(self, file_path: str, progress: Optional[ProgressCallback] = None) -> str:
+        """Stream text out of a plain text, PDF or DOCX file, up to max_extracted_chars"""
+        return extract_document(file_path, settings.max_extracted_chars, progress)
+    
+    def _transcribe_speech(self, samples) -> List[dict]:
+        """Transcribed segments for the speech in samples; silence and noise never reach the model"""
+        speech, speech_map = compact_speech(samples)
+        if not len(speech):
+            return []
+        transcriber = model_registry.get("transcription")
+        return [
+            {
+                "start": restore_time(speech_map, segment["start"]),
+                "end": restore_time(speech_map, segment["end"], end=True),
+                "text": segment["text"],
+            }
+            for segment in transcriber.transcribe(speech)
+        ]
+    
+    def transcribe_audio_file(self, file_path: str) -> List[Timestamp]:
+        """Transcribe a whole recording into timestamped pieces"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return content
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(file_path, 'r', encoding='latin-1') as f:
-                content = f.read()
-            return content
+            segments = self._transcribe_speech(read_audio(file_path))
+        except Exception as e:
+            raise Exception(f"Audio transcription failed: {str(e)}")
+        return own_timestamps(segments, 0.0, 0.0, float("inf"))
     
     def process_audio_file(self, file_path: str) -> str:
-        """Process audio file using Whisper and return transcription"""
-        if whisper is None:
-            raise ImportError("The 'whisper' package is required for audio processing. Please install it.")
+        """Transcribe an audio file with the configured transcription backend"""
+        text, _ = stitch_timestamps([self.transcribe_audio_file(file_path)])
+        return text
+    
+    def transcribe_audio_range(self, file_path: str, start: float, end: float) -> List[Timestamp]:
+        """Transcribe [start, end) of a recording, returning timestamps from the start of the file"""
+        offset = max(0.0, start - settings.transcription_overlap_seconds)
+        samples = read_audio(file_path, offset, end + settings.transcription_overlap_seconds - offset)
         try:
-            result = self.whisper_model.transcribe(file_path)
-            return result["text"]
+            segments = self._transcribe_speech(samples)
         except Exception as e:
             raise Exception(f"Audio transcription failed: {str(e)}")
+        return own_timestamps(segments, offset, start, end)
     
     def process_image_file(self, file_path: str) -> str:
-        """Process image file using Tesseract OCR and return extracted text"""
-        if pytesseract is None or Image is None:
-            raise ImportError("The 'pytesseract' and 'Pillow' packages are required for image processing. Please install them.")
+        """Extract text from an image with Tesseract, after normalizing and tiling it"""
+        pytesseract = model_registry.get("tesseract")
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text.strip()
+            return run_ocr(file_path, pytesseract.image_to_string, settings.ocr_max_pixels, settings.ocr_threads).text
         except Exception as e:
             raise Exception(f"Image text extraction failed: {str(e)}")
     
@@ -90,7 +168,7 @@ class FileService:
         """Determine file type based on content (if available) or extension"""
         extension = Path(filename).suffix.lower()
         
-        text_extensions = ['.txt', '.md', '.doc', '.docx', '.pdf']
+        text_extensions = ['.txt', '.md', '.docx', '.pdf']
         audio_extensions = ['.mp3', '.wav', '.m4a', '.flac', '.ogg']
         image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
         
@@ -98,7 +176,7 @@ class FileService:
         if HAS_MAGIC and file_content:
             import magic
             mime = magic.from_buffer(file_content, mime=True)
-            if mime.startswith('text/'):
+            if mime.startswith('text/') or mime in DOCUMENT_MIME_TYPES:
                 return 'text'
             elif mime.startswith('audio/'):
                 return 'audio'
@@ -0,0 +1,156 @@
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text, func, literal_column, or_, and_
+from sqlalchemy.orm import Session, load_only
+
+# External-content FTS5 index over entries. Triggers keep it in sync on insert,
+# on update (processing completion writes content) and on delete, so no
+# application code path can forget to update it.
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+        title, content, original_filename,
+        content='entries', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+        INSERT INTO entries_fts(rowid, title, content, original_filename)
+        VALUES (new.id, new.title, new.content, new.original_filename);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+        INSERT INTO entries_fts(entries_fts, rowid, title, content, original_filename)
+        VALUES ('delete', old.id, old.title, old.content, old.original_filename);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF title, content, original_filename ON entries BEGIN
+        INSERT INTO entries_fts(entries_fts, rowid, title, content, original_filename)
+        VALUES ('delete', old.id, old.title, old.content, old.original_filename);
+        INSERT INTO entries_fts(rowid, title, content, original_filename)
+        VALUES (new.id, new.title, new.content, new.original_filename);
+    END
+    """,
+]
+
+# bm25 column weights: title, content, original_filename
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+SNIPPET_TOKENS = 16
+
+# Postgres keeps a weighted tsvector as a stored generated column with a GIN
+# index, so queries never re-tokenize transcripts. It is not mapped on the ORM
+# model (SQLite has no tsvector); queries reference it by name.
+POSTGRES_FTS_DDL = [
+    """
+    ALTER TABLE entries ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(original_filename, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_entries_search_vector ON entries USING GIN (search_vector)",
+]
+
+search_vector = literal_column("entries.search_vector")
+
+_fts_installed = False
+
+def install_postgres_fts(connection):
+    """Add the generated tsvector column and its GIN index if missing"""
+    for statement in POSTGRES_FTS_DDL:
+        connection.execute(text(statement))
+
+def install_sqlite_fts(connection, rebuild: bool = False):
+    """Create the FTS table and triggers if missing; rebuild indexes existing rows"""
+    for statement in SQLITE_FTS_DDL:
+        connection.execute(text(statement))
+    if rebuild:
+        connection.execute(text("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')"))
+
+def sqlite_fts_available(db: Session) -> bool:
+    global _fts_installed
+    if not _fts_installed:
+        _fts_installed = db.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'"
+        )).first() is not None
+    return _fts_installed
+
+def build_match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: any term, each as a quoted prefix"""
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"*' for term in terms)
+
+def search_sqlite_fts(
+    db: Session, user_id: int, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+) -> Tuple[List[Tuple[int, float, str]], int]:
+    """Ranked (entry_id, bm25, snippet) hits for a user's processed entries, plus the total match count.
+
+    Results are ordered by (bm25, rowid); pass the last hit's (bm25, entry_id)
+    as `after` to fetch the next page without an offset.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return [], 0
+    params = {"match": match, "user_id": user_id, "limit": limit}
+    rank_expr = f"bm25(entries_fts, {', '.join(str(w) for w in BM25_WEIGHTS)})"
+    keyset = ""
+    if after is not None:
+        keyset = f"AND ({rank_expr} > :after_rank OR ({rank_expr} = :after_rank AND entries_fts.rowid > :after_id))"
+        params.update(after_rank=after[0], after_id=after[1])
+    hits = db.execute(text(f"""
+        SELECT entries_fts.rowid AS entry_id,
+               {rank_expr} AS rank,
+               snippet(entries_fts, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet
+        FROM entries_fts
+        JOIN entries ON entries.id = entries_fts.rowid
+        WHERE entries_fts MATCH :match
+          AND entries.user_id = :user_id
+          AND entries.processed = 1
+          {keyset}
+        ORDER BY rank, entries_fts.rowid
+        LIMIT :limit
+    """), params).all()
+    total = db.execute(text("""
+        SELECT count(*)
+        FROM entries_fts
+        JOIN entries ON entries.id = entries_fts.rowid
+        WHERE entries_fts MATCH :match
+          AND entries.user_id = :user_id
+          AND entries.processed = 1
+    """), {"match": match, "user_id": user_id}).scalar()
+    return [(row.entry_id, row.rank, row.snippet) for row in hits], total
+
+def search_postgres_fts(
+    db: Session, user_id: int, query: str, limit: int, after: Optional[Tuple[float, int]] = None
+) -> Tuple[List[Tuple[object, float]], int]:
+    """Ranked (entry, ts_rank_cd) hits for a user's processed entries, plus the total match count.
+
+    Results are ordered by (rank desc, id desc); pass the last hit's
+    (rank, entry_id) as `after` to fetch the next page without an offset.
+    """
+    from app.models import models
+    
+    ts_query = func.plainto_tsquery('english', query)
+    rank = func.ts_rank_cd(search_vector, ts_query)
+    filters = [
+        models.Entry.user_id == user_id,
+        models.Entry.processed == True,
+        search_vector.op('@@')(ts_query),
+    ]
+    total = db.query(func.count(models.Entry.id)).filter(*filters).scalar()
+    hits_query = db.query(models.Entry, rank.label("rank")).options(
+        load_only(*models.ENTRY_SUMMARY_COLUMNS)
+    ).filter(*filters)
+    if after is not None:
+        hits_query = hits_query.filter(or_(
+            rank < after[0],
+            and_(rank == after[0], models.Entry.id < after[1])
+        ))
+    hits = hits_query.order_by(rank.desc(), models.Entry.id.desc()).limit(limit).all()
+    return [(entry, float(entry_rank)) for entry, entry_rank in hits], total
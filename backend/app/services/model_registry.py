@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process roles: API processes serve requests, worker processes run Celery
+# tasks and CLI jobs. Heavy inference models are only ever loaded by workers.
+API_ROLE = "api"
+WORKER_ROLE = "worker"
+
+class ModelNotAllowedError(RuntimeError):
+    """Raised when a process role asks for a model it must not load"""
+
+class ModelRegistry:
+    """Process-wide, lazily loaded inference models.
+
+    Each model is loaded on its first get() (or by warm_up()), once per
+    process, and only in the roles it is registered for.
+    """
+
+    def __init__(self, role: str = WORKER_ROLE):
+        self.role = role
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._roles: Dict[str, FrozenSet[str]] = {}
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], roles: Iterable[str] = (WORKER_ROLE,)):
+        self._loaders[name] = loader
+        self._roles[name] = frozenset(roles)
+
+    def set_role(self, role: str):
+        self.role = role
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if self.role not in self._roles[name]:
+            raise ModelNotAllowedError(f"Model '{name}' is not loaded in the '{self.role}' role")
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = self._loaders[name]()
+                self._models[name] = model
+                logger.info(f"Loaded model '{name}' in {time.perf_counter() - start:.1f}s")
+            return model
+
+    def warm_up(self, names: Iterable[str]):
+        """Load models ahead of the first task, skipping those not allowed in this role"""
+        for name in names:
+            if self.role in self._roles.get(name, ()):
+                self.get(name)
+            else:
+                logger.warning(f"Not warming up model '{name}' in the '{self.role}' role")
+
+def load_transcription_backend():
+    from app.services.transcription_backends import create_transcription_backend
+    return create_transcription_backend(
+        settings.transcription_backend, settings.whisper_model, settings.transcription_threads
+    )
+
+def load_tesseract():
+    try:
+        import pytesseract
+    except ImportError:
+        raise ImportError("The 'pytesseract' and 'Pillow' packages are required for image processing. Please install them.")
+    # Tiles are OCRed by parallel tesseract processes; keep each single-threaded
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    # Fails fast if the tesseract binary itself is missing
+    pytesseract.get_tesseract_version()
+    return pytesseract
+
+def load_embedding_model():
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ImportError("The 'sentence-transformers' package is required for semantic search. Please install it.")
+    return SentenceTransformer(settings.embedding_model)
+
+model_registry = ModelRegistry()
+model_registry.register("transcription", load_transcription_backend)
+model_registry.register("tesseract", load_tesseract)
+# The API encodes semantic search queries, so it may load the embedding model too
+model_registry.register("embedding", load_embedding_model, roles=(API_ROLE, WORKER_ROLE))
@@ -0,0 +1,116 @@
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tesseract is most accurate around 300 DPI; scans above that are scaled down
+OCR_TARGET_DPI = 300
+
+# Text detection looks at a thumbnail with this long side. Text has many sharp
+# light/dark transitions; images with almost none (blank pages, sky, smooth
+# photos) skip Tesseract. Busy photos still get OCRed, which is only slower.
+DETECT_SIDE = 512
+EDGE_THRESHOLD = 48  # grey-level step between neighbouring pixels
+MIN_EDGE_FRACTION = 0.01
+
+# Images above this many pixels are cut into full-width strips OCRed in
+# parallel; cuts land on the emptiest pixel row so no line of text is split
+TILE_PIXELS = 4_000_000
+TILE_CUT_SEARCH = 0.25  # fraction of a strip's height searched for the cut
+
+@dataclass
+class OcrResult:
+    text: str
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per stage
+    tiles: int = 0
+    skipped: bool = False  # no text detected, Tesseract never ran
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+def open_normalized(file_path: str, max_pixels: int):
+    """Open an image upright, in greyscale, at no more than OCR_TARGET_DPI and max_pixels.
+
+    JPEGs are decoded straight at reduced size where possible, so a 48MP
+    photo never exists in memory at full resolution.
+    """
+    from PIL import Image, ImageOps
+    image = Image.open(file_path)
+    width, height = image.size
+    scale = min(1.0, math.sqrt(max_pixels / (width * height)))
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > OCR_TARGET_DPI:
+        scale = min(scale, OCR_TARGET_DPI / float(dpi[0]))
+    target = (max(1, int(width * scale)), max(1, int(height * scale)))
+    if scale < 1.0:
+        image.draft("L", target)
+    image = ImageOps.exif_transpose(image).convert("L")
+    if image.size[0] * image.size[1] > target[0] * target[1]:
+        # exif_transpose may have swapped the axes
+        size = target if (image.size[0] >= image.size[1]) == (width >= height) else target[::-1]
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return image
+
+def likely_has_text(image) -> bool:
+    """Cheap check for text-like edge density on a thumbnail"""
+    thumbnail = image.copy()
+    thumbnail.thumbnail((DETECT_SIDE, DETECT_SIDE))
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return False
+    edges = np.abs(np.diff(pixels, axis=1)) > EDGE_THRESHOLD
+    return float(edges.mean()) >= MIN_EDGE_FRACTION
+
+def tile_rows(image, tile_pixels: int = TILE_PIXELS) -> List[Tuple[int, int]]:
+    """(top, bottom) of each strip, cut at the rows with the least ink"""
+    width, height = image.size
+    count = math.ceil(width * height / tile_pixels)
+    if count < 2:
+        return [(0, height)]
+    ink = (np.asarray(image) < 128).sum(axis=1)
+    strip = height / count
+    cuts = [0]
+    for index in range(1, count):
+        target = int(index * strip)
+        low = max(cuts[-1] + 1, int(target - strip * TILE_CUT_SEARCH))
+        cuts.append(low + int(np.argmin(ink[low:target + 1])))
+    cuts.append(height)
+    return list(zip(cuts, cuts[1:]))
+
+def run_ocr(file_path: str, image_to_string: Callable, max_pixels: int, workers: int) -> OcrResult:
+    """Normalize, detect, tile and OCR an image, timing each stage"""
+    result = OcrResult(text="")
+    with timed(result.timings, "normalize"):
+        image = open_normalized(file_path, max_pixels)
+    with timed(result.timings, "detect"):
+        has_text = likely_has_text(image)
+    if has_text:
+        with timed(result.timings, "tile"):
+            width = image.size[0]
+            tiles = [image.crop((0, top, width, bottom)) for top, bottom in tile_rows(image)]
+        with timed(result.timings, "ocr"):
+            if len(tiles) == 1 or workers < 2:
+                texts = [image_to_string(tile) for tile in tiles]
+            else:
+                # Each call runs its own tesseract process, so threads OCR in parallel
+                with ThreadPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+                    texts = list(pool.map(image_to_string, tiles))
+        result.tiles = len(tiles)
+        result.text = "\n".join(text.strip() for text in texts if text.strip())
+    else:
+        result.skipped = True
+    stages = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in result.timings.items())
+    logger.info(f"OCR of {file_path}: {image.size[0]}x{image.size[1]}, {result.tiles} tiles, {stages}"
+                + (" (no text detected)" if result.skipped else ""))
+    return result
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional
+# Starlette directly rather than fastapi, which Celery workers need not import
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.models import models
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as protected routes see it: identity only, no ORM session"""
+    id: int
+    email: Optional[str] = None
+    name: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(id=user.id, email=user.email, name=user.name)
+
+class PrincipalCache:
+    """In-process LRU of principals by user id, each entry valid for `ttl` seconds.
+
+    Per-process only: an invalidation in one worker leaves other workers'
+    copies in place until their TTL runs out.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is None:
+                return None
+            principal, expires_at = cached
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Never blocks, so the async variants call straight through
+    async def aget(self, user_id: int) -> Optional[Principal]:
+        return self.get(user_id)
+
+    async def aset(self, principal: Principal):
+        self.set(principal)
+
+    async def ainvalidate(self, user_id: int):
+        self.invalidate(user_id)
+
+class RedisPrincipalCache:
+    """Principals shared by every API worker through Redis, so invalidation is immediate everywhere.
+
+    Calls block, so async code uses aget/aset, which run them on the thread
+    pool. After a Redis error the cache is bypassed for REDIS_RETRY_SECONDS
+    rather than paying the socket timeout on every request.
+    """
+
+    KEY_PREFIX = "lifelog:principal:"
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, url: str, ttl: float, timeout: float):
+        import redis
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._errors = redis.RedisError
+        self._down_until = 0.0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _failed(self, action: str, error: Exception):
+        self._down_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+        logger.warning(f"Principal cache {action} failed, bypassing Redis for {self.REDIS_RETRY_SECONDS}s: {error}")
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        if not self._available():
+            return None
+        try:
+            raw = self._client.get(f"{self.KEY_PREFIX}{user_id}")
+        except self._errors as e:
+            # The cache is an optimization; fall back to the database
+            self._failed("read", e)
+            return None
+        return Principal(**json.loads(raw)) if raw else None
+
+    def set(self, principal: Principal):
+        if not self._available():
+            return
+        try:
+            self._client.set(f"{self.KEY_PREFIX}{principal.id}", json.dumps(asdict(principal)), ex=max(1, int(self.ttl)))
+        except self._errors as e:
+            self._failed("write", e)
+
+    def invalidate(self, user_id: int):
+        # Attempted even while bypassed: a stale principal is worse than a slow write
+        try:
+            self._client.delete(f"{self.KEY_PREFIX}{user_id}")
+        except self._errors as e:
+            # The entry still expires after the TTL
+            self._failed("invalidation", e)
+
+    def clear(self):
+        for key in self._client.scan_iter(f"{self.KEY_PREFIX}*"):
+            self._client.delete(key)
+
+    async def aget(self, user_id: int) -> Optional[Principal]:
+        if not self._available():
+            return None
+        return await run_in_threadpool(self.get, user_id)
+
+    async def aset(self, principal: Principal):
+        if self._available():
+            await run_in_threadpool(self.set, principal)
+
+    async def ainvalidate(self, user_id: int):
+        await run_in_threadpool(self.invalidate, user_id)
+
+def create_principal_cache():
+    """Cache for the configured backend: 'redis' (needs a redis:// REDIS_URL) or in-process 'memory'"""
+    if settings.principal_cache_backend == "redis":
+        if settings.redis_url.startswith(("redis://", "rediss://")):
+            try:
+                return RedisPrincipalCache(settings.redis_url, settings.principal_cache_ttl, settings.principal_cache_redis_timeout)
+            except ImportError:
+                pass
+        logger.warning("PRINCIPAL_CACHE_BACKEND=redis needs the redis package and a redis:// REDIS_URL; using memory")
+    return PrincipalCache(settings.principal_cache_size, settings.principal_cache_ttl)
+
+principal_cache = create_principal_cache()
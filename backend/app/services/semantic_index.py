@@ -0,0 +1,196 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import models
+from app.services.embedding_service import EmbeddingService, EMBEDDING_DTYPE
+from app.services.vector_store import ShardIndexRegistry
+
+_faiss = None
+
+def load_faiss():
+    """The faiss module, imported on first use, or None if it is not installed"""
+    global _faiss
+    if _faiss is None:
+        try:
+            import faiss
+            _faiss = faiss
+        except ImportError:
+            _faiss = False
+    return _faiss or None
+
+# Per-process cap on how many users' indexes are kept in memory (LRU)
+MAX_CACHED_USERS = 1000
+
+class NumpyVectorIndex:
+    """Brute-force inner-product index over a growable float32 matrix"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vectors = np.empty((0, dim), dtype=EMBEDDING_DTYPE)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        self.remove(ids)
+        needed = self._size + len(ids)
+        if needed > len(self._ids):
+            # Grow geometrically so incremental adds stay amortized O(1)
+            capacity = max(needed, 2 * len(self._ids), 64)
+            vectors_buf = np.empty((capacity, self.dim), dtype=EMBEDDING_DTYPE)
+            ids_buf = np.empty(capacity, dtype=np.int64)
+            vectors_buf[:self._size] = self._vectors[:self._size]
+            ids_buf[:self._size] = self._ids[:self._size]
+            self._vectors, self._ids = vectors_buf, ids_buf
+        self._vectors[self._size:needed] = vectors
+        self._ids[self._size:needed] = ids
+        self._size = needed
+
+    def remove(self, ids: np.ndarray):
+        if not self._size:
+            return
+        keep = ~np.isin(self._ids[:self._size], ids)
+        if keep.all():
+            return
+        kept = int(keep.sum())
+        self._vectors[:kept] = self._vectors[:self._size][keep]
+        self._ids[:kept] = self._ids[:self._size][keep]
+        self._size = kept
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._size:
+            return []
+        scores = self._vectors[:self._size] @ query
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._ids[i]), float(scores[i])) for i in top]
+
+class FaissVectorIndex:
+    """Exact inner-product FAISS index keyed by entry id"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        faiss = load_faiss()
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def __len__(self) -> int:
+        return self._index.ntotal
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        self.remove(ids)
+        self._index.add_with_ids(vectors, ids)
+
+    def remove(self, ids: np.ndarray):
+        if self._index.ntotal:
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not self._index.ntotal:
+            return []
+        scores, ids = self._index.search(query.reshape(1, -1), min(k, self._index.ntotal))
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+
+def create_vector_index(dim: int):
+    return FaissVectorIndex(dim) if load_faiss() else NumpyVectorIndex(dim)
+
+class UserSemanticIndex:
+    """One user's entry vectors, plus the SearchIndex row id they are synced up to"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.index = None  # created once the embedding dimension is known
+        self.last_row_id = 0
+        self.lock = threading.Lock()
+
+    def _rows_query(self, db: Session):
+        return db.query(models.SearchIndex).join(
+            models.Entry, models.Entry.id == models.SearchIndex.entry_id
+        ).filter(models.Entry.user_id == self.user_id)
+
+    def _apply(self, rows):
+        if not rows:
+            return
+        # A re-embedded entry can appear more than once; keep its newest vector
+        newest = {row.entry_id: row for row in rows}
+        ids = np.fromiter(newest.keys(), dtype=np.int64, count=len(newest))
+        vectors = np.vstack([EmbeddingService.from_bytes(row.embedding) for row in newest.values()])
+        if self.index is None:
+            self.index = create_vector_index(vectors.shape[1])
+        self.index.add(ids, vectors)
+        self.last_row_id = max(self.last_row_id, rows[-1].id)
+
+    def sync(self, db: Session):
+        """Pull in embeddings written since the last sync.
+
+        Falls back to a full reload when the row count disagrees with the index,
+        which covers deletes made by other processes and rows committed out of
+        id order.
+        """
+        with self.lock:
+            new_rows = self._rows_query(db).filter(
+                models.SearchIndex.id > self.last_row_id
+            ).order_by(models.SearchIndex.id).all()
+            self._apply(new_rows)
+            expected = self._rows_query(db).with_entities(
+                func.count(func.distinct(models.SearchIndex.entry_id))
+            ).scalar()
+            if expected != (len(self.index) if self.index is not None else 0):
+                self.index = None
+                self.last_row_id = 0
+                self._apply(self._rows_query(db).order_by(models.SearchIndex.id).all())
+
+    def remove(self, entry_ids: List[int]):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove(np.asarray(entry_ids, dtype=np.int64))
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        with self.lock:
+            if self.index is None:
+                return []
+            return self.index.search(query, k)
+
+class SemanticIndexRegistry:
+    """Process-wide cache of per-user semantic indexes, updated incrementally"""
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[int, UserSemanticIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserSemanticIndex:
+        with self._lock:
+            user_index = self._indexes.get(user_id)
+            if user_index is None:
+                user_index = UserSemanticIndex(user_id)
+                self._indexes[user_id] = user_index
+                if len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(user_id)
+        user_index.sync(db)
+        return user_index
+
+    def search(self, db: Session, user_id: int, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-k (entry_id, score) pairs for a normalized query vector"""
+        return self.get(db, user_id).search(query, k)
+
+    def remove_entry(self, user_id: int, entry_id: int):
+        user_index = self._indexes.get(user_id)
+        if user_index is not None:
+            user_index.remove([entry_id])
+
+def create_semantic_registry():
+    """Registry for the configured backend: mmapped on-disk shards or in-memory indexes"""
+    if settings.semantic_index_backend == "mmap":
+        return ShardIndexRegistry(settings.vector_dir)
+    return SemanticIndexRegistry()
+
+semantic_indexes = create_semantic_registry()
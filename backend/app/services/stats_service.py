@@ -0,0 +1,250 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import models
+
+# Entry types with their own counter column on UserStats
+COUNTED_TYPES = ("text", "audio", "image")
+RECENT_DAYS = 7
+ACTIVITY_BUCKETS = ("day", "week", "month")
+
+def activity_day(created_at: datetime) -> date:
+    """UTC calendar day an entry is rolled up under"""
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+class StatsService:
+    """Per-user entry statistics, served from counters kept in step with entry writes"""
+
+    @staticmethod
+    def aggregate(db: Session, user_id: int) -> Dict:
+        """Compute all counts from the entries table in one grouped query"""
+        week_ago = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+        rows = db.query(
+            models.Entry.entry_type,
+            func.count(models.Entry.id),
+            func.coalesce(func.sum(case((models.Entry.processed == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((models.Entry.created_at >= week_ago, 1), else_=0)), 0),
+        ).filter(
+            models.Entry.user_id == user_id
+        ).group_by(models.Entry.entry_type).all()
+        
+        stats = {
+            "total_entries": 0,
+            "processed_entries": 0,
+            "recent_activity": 0,
+            "entries_by_type": {entry_type: 0 for entry_type in COUNTED_TYPES},
+        }
+        for entry_type, total, processed, recent in rows:
+            stats["total_entries"] += total
+            stats["processed_entries"] += int(processed)
+            stats["recent_activity"] += int(recent)
+            if entry_type in COUNTED_TYPES:
+                stats["entries_by_type"][entry_type] = total
+        return stats
+
+    @staticmethod
+    def _seed(db: Session, user_id: int) -> models.UserStats:
+        """Create a user's counters from the entries visible to this transaction"""
+        db.flush()
+        stats = StatsService.aggregate(db, user_id)
+        counters = models.UserStats(
+            user_id=user_id,
+            total_entries=stats["total_entries"],
+            processed_entries=stats["processed_entries"],
+            **{f"{entry_type}_entries": count for entry_type, count in stats["entries_by_type"].items()}
+        )
+        db.add(counters)
+        return counters
+
+    @staticmethod
+    def _adjust(db: Session, user_id: int, entry_type: Optional[str], total: int = 0, processed: int = 0) -> None:
+        values = {}
+        if total:
+            values[models.UserStats.total_entries] = models.UserStats.total_entries + total
+            if entry_type in COUNTED_TYPES:
+                column = getattr(models.UserStats, f"{entry_type}_entries")
+                values[column] = column + total
+        if processed:
+            values[models.UserStats.processed_entries] = models.UserStats.processed_entries + processed
+        if not values:
+            return
+        updated = db.query(models.UserStats).filter(
+            models.UserStats.user_id == user_id
+        ).update(values, synchronize_session=False)
+        if updated:
+            return
+        db.flush()
+        try:
+            # First write for this user: the flushed entries already include this
+            # change. Savepoint, so losing the race below leaves the caller's
+            # transaction intact.
+            with db.begin_nested():
+                StatsService._seed(db, user_id)
+        except IntegrityError:
+            # Seeded concurrently from a recount that cannot see our uncommitted
+            # entries, so apply this change on top
+            db.query(models.UserStats).filter(
+                models.UserStats.user_id == user_id
+            ).update(values, synchronize_session=False)
+
+    @staticmethod
+    def _adjust_day(db: Session, entry: models.Entry, count: int = 0, processed: int = 0, size: int = 0) -> None:
+        if entry.created_at is None:
+            db.flush()  # created_at is a server default; loaded on next access
+        key = (
+            models.DailyActivity.user_id == entry.user_id,
+            models.DailyActivity.day == activity_day(entry.created_at),
+            models.DailyActivity.entry_type == (entry.entry_type or "unknown"),
+        )
+        increments = {
+            models.DailyActivity.entry_count: models.DailyActivity.entry_count + count,
+            models.DailyActivity.processed_count: models.DailyActivity.processed_count + processed,
+            models.DailyActivity.total_bytes: models.DailyActivity.total_bytes + size,
+        }
+        updated = db.query(models.DailyActivity).filter(*key).update(increments, synchronize_session=False)
+        # Only a new entry opens a bucket; changes to entries from before the
+        # rollup existed are picked up by rebuild_daily_activity
+        if updated or count <= 0:
+            return
+        try:
+            # Savepoint, so losing the race below leaves the caller's transaction intact
+            with db.begin_nested():
+                db.add(models.DailyActivity(
+                    user_id=entry.user_id,
+                    day=activity_day(entry.created_at),
+                    entry_type=entry.entry_type or "unknown",
+                    entry_count=count,
+                    processed_count=processed,
+                    total_bytes=size
+                ))
+        except IntegrityError:
+            # Another upload opened the bucket first
+            db.query(models.DailyActivity).filter(*key).update(increments, synchronize_session=False)
+
+    @staticmethod
+    def entry_added(db: Session, entry: models.Entry) -> None:
+        """Count a new entry within the caller's transaction"""
+        processed = 1 if entry.processed else 0
+        StatsService._adjust(db, entry.user_id, entry.entry_type, total=1, processed=processed)
+        StatsService._adjust_day(db, entry, count=1, processed=processed, size=entry.file_size or 0)
+
+    @staticmethod
+    def entry_deleted(db: Session, entry: models.Entry) -> None:
+        """Uncount an entry within the caller's transaction, after db.delete(entry)"""
+        processed = -1 if entry.processed else 0
+        StatsService._adjust(db, entry.user_id, entry.entry_type, total=-1, processed=processed)
+        StatsService._adjust_day(db, entry, count=-1, processed=processed, size=-(entry.file_size or 0))
+
+    @staticmethod
+    def set_processed(db: Session, entry: models.Entry, processed: bool) -> None:
+        """Set entry.processed, adjusting the counters only when the value changes"""
+        if bool(entry.processed) == processed:
+            return
+        entry.processed = processed
+        StatsService._adjust(db, entry.user_id, entry.entry_type, processed=1 if processed else -1)
+        StatsService._adjust_day(db, entry, processed=1 if processed else -1)
+
+    @staticmethod
+    def get_stats(db: Session, user_id: int) -> Dict:
+        """Dashboard stats: counters for totals plus an indexed count of the last 7 days"""
+        counters = db.get(models.UserStats, user_id)
+        if counters is None:
+            try:
+                counters = StatsService._seed(db, user_id)
+                db.commit()
+            except IntegrityError:
+                # Seeded concurrently by another request or writer
+                db.rollback()
+                counters = db.get(models.UserStats, user_id)
+        week_ago = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+        recent_entries = db.query(func.count(models.Entry.id)).filter(
+            models.Entry.user_id == user_id,
+            models.Entry.created_at >= week_ago
+        ).scalar()
+        return {
+            "total_entries": counters.total_entries,
+            "entries_by_type": {
+                entry_type: getattr(counters, f"{entry_type}_entries") for entry_type in COUNTED_TYPES
+            },
+            "recent_activity": recent_entries,
+            "processed_entries": counters.processed_entries,
+            "pending_entries": counters.total_entries - counters.processed_entries
+        }
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """Recompute every user's counters from the entries table; returns users rebuilt"""
+        db.query(models.UserStats).delete(synchronize_session=False)
+        user_ids = [user_id for (user_id,) in db.query(models.User.id).all()]
+        for user_id in user_ids:
+            StatsService._seed(db, user_id)
+        db.commit()
+        return len(user_ids)
+
+    @staticmethod
+    def activity_histogram(
+        db: Session, user_id: int, date_from: date, date_to: date, bucket: str = "day", entry_type: Optional[str] = None
+    ) -> Dict:
+        """Entry activity between two UTC days (inclusive), read only from the daily rollup"""
+        query = db.query(models.DailyActivity).filter(
+            models.DailyActivity.user_id == user_id,
+            models.DailyActivity.day >= date_from,
+            models.DailyActivity.day <= date_to
+        )
+        if entry_type:
+            query = query.filter(models.DailyActivity.entry_type == entry_type)
+        
+        buckets: Dict[date, Dict] = {}
+        start = bucket_start(date_from, bucket)
+        while start <= date_to:
+            buckets[start] = {"start": start, "entry_count": 0, "processed_count": 0, "total_bytes": 0, "by_type": {}}
+            start = next_bucket(start, bucket)
+        for row in query.all():
+            totals = buckets[bucket_start(row.day, bucket)]
+            totals["entry_count"] += row.entry_count
+            totals["processed_count"] += row.processed_count
+            totals["total_bytes"] += row.total_bytes
+            totals["by_type"][row.entry_type] = totals["by_type"].get(row.entry_type, 0) + row.entry_count
+        return {"bucket": bucket, "date_from": date_from, "date_to": date_to, "buckets": list(buckets.values())}
+
+    @staticmethod
+    def rebuild_daily_activity(db: Session) -> int:
+        """Recompute the daily rollup from the entries table; returns rows written"""
+        db.query(models.DailyActivity).delete(synchronize_session=False)
+        rollup: Dict[tuple, List[int]] = {}
+        rows = db.query(
+            models.Entry.user_id, models.Entry.created_at, models.Entry.entry_type,
+            models.Entry.file_size, models.Entry.processed
+        ).yield_per(1000)
+        for user_id, created_at, entry_type, file_size, processed in rows:
+            totals = rollup.setdefault((user_id, activity_day(created_at), entry_type or "unknown"), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += 1 if processed else 0
+            totals[2] += file_size or 0
+        db.add_all([
+            models.DailyActivity(
+                user_id=user_id, day=day, entry_type=entry_type,
+                entry_count=count, processed_count=processed, total_bytes=size
+            )
+            for (user_id, day, entry_type), (count, processed, size) in rollup.items()
+        ])
+        db.commit()
+        return len(rollup)
@@ -0,0 +1,231 @@
+import hashlib
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+from app.core.config import settings
+from app.models import models
+from app.services.stats_service import activity_day
+
+logger = logging.getLogger(__name__)
+
+# New requests for a week share a job in these states rather than queuing another
+ACTIVE_JOB_STATES = ("pending", "running")
+
+# Summaries are built map-reduce: entry passages, then entries per day, then
+# days per week; months and years reduce stored weeks. Each model call gets
+# at most this much input, so heavy weeks are reduced in several rounds.
+SUMMARY_INPUT_CHARS = 12_000
+SUMMARY_PROMPTS = {
+    # level: (system prompt, max_tokens)
+    "passage": ("Summarize this passage from a personal journal in two or three sentences, keeping names, decisions and events.", 150),
+    "entry": ("Combine these summaries of consecutive passages of one journal entry into one short summary.", 200),
+    "day": ("Summarize this person's day from summaries of their journal entries, notes, recordings and images.", 200),
+    "week": ("You are a helpful assistant that creates concise weekly summaries of life activities. Summarize the week from these daily summaries.", 300),
+    "period": ("Summarize this stretch of time from these weekly summaries of a person's activities, highlighting themes and changes.", 400),
+}
+
+def week_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Midnight on the Monday and on the Sunday of day's week"""
+    monday = datetime.combine(day - timedelta(days=day.weekday()), time.min)
+    return monday, monday + timedelta(days=6)
+
+def complete(system: str, prompt: str, max_tokens: int) -> str:
+    """One chat completion from the configured summary model"""
+    try:
+        from openai import OpenAI
+    except ImportError:
+        raise ImportError("The 'openai' package is required for weekly summaries. Please install it.")
+    client = OpenAI(api_key=settings.openai_api_key)
+    response = client.chat.completions.create(
+        model=settings.summary_model,
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+class SummaryService:
+    """Weekly summaries, generated by one deduplicated background job per user and week
+    from cached per-passage, per-entry and per-day summaries"""
+
+    @staticmethod
+    def _job(db: Session, user_id: int, week_start: datetime) -> Optional[models.SummaryJob]:
+        return db.query(models.SummaryJob).filter(
+            models.SummaryJob.user_id == user_id,
+            models.SummaryJob.week_start == week_start
+        ).first()
+
+    @staticmethod
+    def request_week(db: Session, user_id: int, day: date, refresh: bool = False) -> Tuple[models.SummaryJob, bool]:
+        """The job for day's week and whether the caller must queue it.
+
+        A queued or running job is shared; a finished one is reused unless
+        refresh is set. Jobs stuck longer than summary_job_timeout (a lost
+        worker) are requeued.
+        """
+        week_start, week_end = week_bounds(day)
+        job = SummaryService._job(db, user_id, week_start)
+        if job is None:
+            try:
+                job = models.SummaryJob(user_id=user_id, week_start=week_start, week_end=week_end, status="pending")
+                db.add(job)
+                db.commit()
+                return job, True
+            except IntegrityError:
+                # Created concurrently by another request
+                db.rollback()
+                job = SummaryService._job(db, user_id, week_start)
+        if job.status == "done" and not refresh:
+            return job, False
+        # Of several concurrent requests, only the one whose update matches requeues
+        stale = datetime.utcnow() - timedelta(seconds=settings.summary_job_timeout)
+        claimed = db.execute(
+            update(models.SummaryJob).where(
+                models.SummaryJob.id == job.id,
+                or_(models.SummaryJob.status.notin_(ACTIVE_JOB_STATES), models.SummaryJob.updated_at < stale)
+            ).values(status="pending", error=None)
+        ).rowcount
+        db.commit()
+        db.refresh(job)
+        return job, bool(claimed)
+
+    @staticmethod
+    def fail(db: Session, job: models.SummaryJob, error: str):
+        """Record why a job failed; the next request for its week queues it again"""
+        job.status, job.error = "failed", error
+        db.commit()
+
+    @staticmethod
+    def summarize(db: Session, user_id: int, level: str, text: str) -> str:
+        """Summary of text at one level of the hierarchy, from the cache when this exact
+        input has been summarized before; new summaries are committed straight away
+        so a failed job resumes where it stopped"""
+        input_hash = hashlib.sha256(f"{settings.summary_model}\n{level}\n{text}".encode()).hexdigest()
+        cached = db.query(models.SummaryCache.summary).filter(
+            models.SummaryCache.user_id == user_id,
+            models.SummaryCache.input_hash == input_hash
+        ).scalar()
+        if cached is not None:
+            return cached
+        system, max_tokens = SUMMARY_PROMPTS[level]
+        summary = complete(system, text, max_tokens)
+        try:
+            db.add(models.SummaryCache(user_id=user_id, input_hash=input_hash, level=level, summary=summary))
+            db.commit()
+        except IntegrityError:
+            # Summarized concurrently by another job
+            db.rollback()
+        return summary
+
+    @staticmethod
+    def reduce(db: Session, user_id: int, level: str, parts: List[str]) -> Optional[str]:
+        """Summarize parts together, in rounds of batches that fit SUMMARY_INPUT_CHARS;
+        None when there is nothing to summarize"""
+        if not parts:
+            return None
+        while True:
+            batches, batch, length = [], [], 0
+            for part in parts:
+                part = part[:SUMMARY_INPUT_CHARS]
+                if batch and length + len(part) > SUMMARY_INPUT_CHARS:
+                    batches.append(batch)
+                    batch, length = [], 0
+                batch.append(part)
+                length += len(part) + 2
+            batches.append(batch)
+            parts = [SummaryService.summarize(db, user_id, level, "\n\n".join(batch)) for batch in batches]
+            if len(parts) == 1:
+                return parts[0]
+
+    @staticmethod
+    def summarize_entry(db: Session, entry: models.Entry) -> Optional[str]:
+        """An entry's summary, mapped over its EntryChunk passages and reduced.
+
+        An entry that fits in one passage is short enough to stand for itself.
+        """
+        passages = [text for (text,) in db.query(models.EntryChunk.text).filter(
+            models.EntryChunk.entry_id == entry.id
+        ).order_by(models.EntryChunk.position)]
+        if not passages:
+            return None
+        if len(passages) == 1:
+            return passages[0]
+        summaries = [SummaryService.summarize(db, entry.user_id, "passage", passage) for passage in passages]
+        return SummaryService.reduce(db, entry.user_id, "entry", summaries)
+
+    @staticmethod
+    def summarize_week(db: Session, user_id: int, entries: List[models.Entry]) -> Optional[str]:
+        """Map entries to summaries, reduce them per day, then reduce the days;
+        None when no entry has any content"""
+        days: Dict[date, List[str]] = {}
+        for entry in entries:
+            summary = SummaryService.summarize_entry(db, entry)
+            if summary:
+                days.setdefault(activity_day(entry.created_at), []).append(f"{entry.entry_type} '{entry.title}': {summary}")
+        day_summaries = [
+            f"{day.strftime('%A %Y-%m-%d')}: {SummaryService.reduce(db, user_id, 'day', parts)}"
+            for day, parts in sorted(days.items())
+        ]
+        return SummaryService.reduce(db, user_id, "week", day_summaries)
+
+    @staticmethod
+    def summarize_weeks(db: Session, user_id: int, start: date, end: date) -> Optional[str]:
+        """Summary of a month, year or any other period, built from its stored weekly summaries"""
+        weeks = db.query(models.WeeklySummary).filter(
+            models.WeeklySummary.user_id == user_id,
+            models.WeeklySummary.week_start >= datetime.combine(start, time.min),
+            models.WeeklySummary.week_start <= datetime.combine(end, time.min)
+        ).order_by(models.WeeklySummary.week_start).all()
+        if not weeks:
+            return None
+        parts = [f"Week of {week.week_start.strftime('%Y-%m-%d')}: {week.summary}" for week in weeks]
+        return SummaryService.reduce(db, user_id, "period", parts)
+
+    @staticmethod
+    def describe_week(entries: List[models.Entry], week_start: datetime, week_end: datetime) -> str:
+        """Text for a week with no entries, or for any week when no summary model is configured"""
+        period = f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}"
+        if entries:
+            return (f"Weekly summary for {len(entries)} entries from {period}. "
+                    f"Activities included: {', '.join(sorted(set(e.entry_type for e in entries)))}.")
+        fallback = f"No entries were logged for the week of {period}. Consider adding some activities to track your weekly progress!"
+        if not settings.openai_api_key:
+            return fallback
+        try:
+            return complete(
+                "You are a helpful life coach assistant. The user has no logged activities for this week.",
+                f"I have no logged activities for the week of {period}. Please provide encouraging and "
+                f"helpful feedback about this, and suggest ways to start tracking activities.",
+                200
+            )
+        except Exception as e:
+            logger.warning(f"Summary model call failed, using fallback summary: {str(e)}")
+            return fallback
+
+    @staticmethod
+    def write_week(db: Session, user_id: int, week_start: datetime, week_end: datetime) -> models.WeeklySummary:
+        """Generate and store the summary of a week, replacing any earlier one (caller commits)"""
+        # Content is never loaded whole; entries are summarized from their passages
+        entries = db.query(models.Entry).options(load_only(*models.ENTRY_SUMMARY_COLUMNS)).filter(
+            models.Entry.user_id == user_id,
+            models.Entry.created_at >= week_start,
+            models.Entry.created_at < week_end + timedelta(days=1),
+            models.Entry.processed == True
+        ).order_by(models.Entry.created_at, models.Entry.id).all()
+        text = None
+        if entries and settings.openai_api_key:
+            text = SummaryService.summarize_week(db, user_id, entries)
+        if text is None:
+            text = SummaryService.describe_week(entries, week_start, week_end)
+        summary = db.query(models.WeeklySummary).filter(
+            models.WeeklySummary.user_id == user_id,
+            models.WeeklySummary.week_start == week_start
+        ).first()
+        if summary is None:
+            summary = models.WeeklySummary(user_id=user_id, week_start=week_start, week_end=week_end)
+            db.add(summary)
+        summary.summary = text
+        db.flush()
+        return summary
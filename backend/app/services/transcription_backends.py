@@ -0,0 +1,78 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Type
+import numpy as np
+from app.services.audio_segments import SAMPLE_RATE
+
+class TranscriptionBackend(ABC):
+    """Speech-to-text engine used by FileService.
+
+    transcribe() takes mono float32 audio at SAMPLE_RATE and returns segments
+    as dicts with start and end (seconds into the audio) and text.
+    """
+
+    def __init__(self, model_size: str, threads: int = 0):
+        self.model_size = model_size
+        self.threads = threads
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray) -> List[dict]:
+        ...
+
+class WhisperBackend(TranscriptionBackend):
+    """openai-whisper in float32 (fp16 on GPU)"""
+
+    def __init__(self, model_size: str, threads: int = 0):
+        super().__init__(model_size, threads)
+        try:
+            import torch
+            import whisper
+        except ImportError:
+            raise ImportError("The 'openai-whisper' package is required for audio processing. Please install it.")
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = whisper.load_model(model_size)
+
+    def transcribe(self, audio: np.ndarray) -> List[dict]:
+        result = self.model.transcribe(audio, fp16=self.model.device.type == "cuda")
+        return [
+            {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+            for segment in result["segments"]
+        ]
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 whisper with int8 weights, for CPU-only workers"""
+
+    def __init__(self, model_size: str, threads: int = 0):
+        super().__init__(model_size, threads)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("The 'faster-whisper' package is required for the int8 transcription backend. Please install it.")
+        self.model = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, audio: np.ndarray) -> List[dict]:
+        # Segments are produced lazily as decoding proceeds
+        segments, _ = self.model.transcribe(audio)
+        return [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+
+class FakeBackend(TranscriptionBackend):
+    """Loads nothing and returns one segment describing the audio, for tests and benchmarks"""
+
+    def transcribe(self, audio: np.ndarray) -> List[dict]:
+        if not len(audio):
+            return []
+        seconds = len(audio) / SAMPLE_RATE
+        return [{"start": 0.0, "end": seconds, "text": f"[{seconds:.1f}s of speech]"}]
+
+TRANSCRIPTION_BACKENDS: Dict[str, Type[TranscriptionBackend]] = {
+    "whisper": WhisperBackend,
+    "faster-whisper": FasterWhisperBackend,
+    "fake": FakeBackend,
+}
+
+def create_transcription_backend(name: str, model_size: str, threads: int = 0) -> TranscriptionBackend:
+    try:
+        backend = TRANSCRIPTION_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription backend '{name}'; expected one of {', '.join(TRANSCRIPTION_BACKENDS)}")
+    return backend(model_size, threads)
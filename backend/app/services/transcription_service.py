@@ -0,0 +1,58 @@
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import models
+from app.services.audio_segments import FRAME_SECONDS, Timestamp, frame_energies, plan_segments, speech_mask, speech_ratio, stitch_timestamps
+
+class TranscriptionService:
+    """Splits long recordings into independently transcribed, checkpointed segments"""
+
+    @staticmethod
+    def segments(db: Session, entry_id: int) -> List[models.AudioSegment]:
+        return db.query(models.AudioSegment).filter(
+            models.AudioSegment.entry_id == entry_id
+        ).order_by(models.AudioSegment.position).all()
+
+    @staticmethod
+    def plan(db: Session, entry: models.Entry) -> List[models.AudioSegment]:
+        """Segments of a recording, split at pauses on first call and reused on retries.
+
+        Also records the entry's speech_ratio. Returns an empty list for
+        recordings short enough (or silent enough) to handle whole; segments
+        without speech are checkpointed as empty straight away.
+        """
+        segments = TranscriptionService.segments(db, entry.id)
+        if segments:
+            return segments
+        energies = frame_energies(entry.file_path)
+        mask = speech_mask(energies)
+        entry.speech_ratio = speech_ratio(mask)
+        if not entry.speech_ratio:
+            return []
+        ranges = plan_segments(energies, settings.transcription_segment_seconds)
+        if len(ranges) < 2:
+            return []
+        segments = []
+        for position, (start, end) in enumerate(ranges):
+            segment = models.AudioSegment(entry_id=entry.id, position=position, start_seconds=start, end_seconds=end)
+            if not mask[int(round(start / FRAME_SECONDS)):int(round(end / FRAME_SECONDS))].any():
+                segment.text, segment.timestamps = "", []
+            segments.append(segment)
+        db.add_all(segments)
+        db.commit()
+        return segments
+
+    @staticmethod
+    def stitch(db: Session, entry_id: int) -> Optional[Tuple[str, List[Timestamp]]]:
+        """Full transcript and its timestamps from the segments, or None while any is still pending"""
+        segments = TranscriptionService.segments(db, entry_id)
+        if not segments or any(segment.text is None for segment in segments):
+            return None
+        return stitch_timestamps([segment.timestamps or [] for segment in segments])
+
+    @staticmethod
+    def discard(db: Session, entry_id: int):
+        """Drop an entry's segments (caller commits)"""
+        db.query(models.AudioSegment).filter(
+            models.AudioSegment.entry_id == entry_id
+        ).delete(synchronize_session=False)
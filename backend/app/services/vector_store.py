@@ -0,0 +1,336 @@
+import fcntl
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+
+SHARD_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+ID_DTYPE = np.dtype("<i8")
+
+# float16 rows are upcast this many at a time while scoring, so memory stays
+# bounded without giving up BLAS
+SCORE_CHUNK_ROWS = 4096
+
+# Compact once the delta segment holds this many rows and this fraction of the base
+COMPACT_MIN_DELTA_ROWS = 1024
+COMPACT_DELTA_RATIO = 0.1
+
+# Per-process cap on open shard snapshots (LRU)
+MAX_OPEN_SHARDS = 1000
+
+class VectorShard:
+    """On-disk vectors for one user's entries.
+
+    Directory layout under <vector_dir>/<user_id>/:
+        CURRENT              generation number, replaced atomically by compaction
+        meta.json            {"dim": ..., "dtype": "float32" | "float16"}
+        base-<gen>.vec.npy   (n, dim) matrix, written once per compaction
+        base-<gen>.ids.npy   (n,) int64 entry ids
+        delta-<gen>.vec      append-only raw rows added since the compaction
+        delta-<gen>.ids      append-only int64 ids, one per delta row
+        tomb-<gen>.ids       append-only (entry_id, delta_rows_at_delete) int64 pairs
+
+    Readers mmap the files and never take the lock; writers (append, delete,
+    compact) serialize on an flock. The newest occurrence of an id wins, and a
+    tombstone hides every occurrence written before it.
+    """
+
+    def __init__(self, root, user_id: int):
+        self.path = Path(root) / str(user_id)
+
+    def file(self, kind: str, generation: int) -> Path:
+        names = {
+            "base_vec": f"base-{generation}.vec.npy",
+            "base_ids": f"base-{generation}.ids.npy",
+            "delta_vec": f"delta-{generation}.vec",
+            "delta_ids": f"delta-{generation}.ids",
+            "tomb": f"tomb-{generation}.ids",
+        }
+        return self.path / names[kind]
+
+    def read_generation(self) -> int:
+        try:
+            return int((self.path / "CURRENT").read_text().strip())
+        except FileNotFoundError:
+            return 0
+
+    def read_meta(self) -> Optional[dict]:
+        try:
+            return json.loads((self.path / "meta.json").read_text())
+        except FileNotFoundError:
+            return None
+
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    @contextmanager
+    def locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def delta_rows(path_vec: Path, path_ids: Path, row_bytes: int) -> int:
+        """Complete delta rows; a torn append leaves more vector bytes than ids"""
+        try:
+            vec_size = path_vec.stat().st_size
+            ids_size = path_ids.stat().st_size
+        except FileNotFoundError:
+            return 0
+        return min(vec_size // row_bytes, ids_size // ID_DTYPE.itemsize)
+
+    def _write_meta(self, dim: int, dtype: str) -> dict:
+        meta = {"dim": int(dim), "dtype": dtype}
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.path / "meta.json")
+        return meta
+
+    def _write_generation(self, generation: int):
+        tmp = self.path / "CURRENT.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self.path / "CURRENT")
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray, dtype: str = "float32") -> int:
+        """Append vectors to the delta segment; returns the delta row count afterwards"""
+        ids = np.asarray(ids, dtype=ID_DTYPE)
+        with self.locked():
+            meta = self.read_meta() or self._write_meta(vectors.shape[1], dtype)
+            if vectors.shape[1] != meta["dim"]:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match shard dimension {meta['dim']}")
+            row_dtype = SHARD_DTYPES[meta["dtype"]]
+            row_bytes = row_dtype.itemsize * meta["dim"]
+            generation = self.read_generation()
+            path_vec, path_ids = self.file("delta_vec", generation), self.file("delta_ids", generation)
+            rows = self.delta_rows(path_vec, path_ids, row_bytes)
+            # Drop any torn tail so the two files stay row-aligned
+            for path, size in ((path_vec, rows * row_bytes), (path_ids, rows * ID_DTYPE.itemsize)):
+                with open(path, "ab") as f:
+                    f.truncate(size)
+            with open(path_vec, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=row_dtype).tobytes())
+            with open(path_ids, "ab") as f:
+                f.write(ids.tobytes())
+            return rows + len(ids)
+
+    def delete(self, ids: List[int]):
+        """Tombstone entry ids; they stay hidden until re-appended"""
+        with self.locked():
+            meta = self.read_meta()
+            if meta is None:
+                return
+            generation = self.read_generation()
+            row_bytes = SHARD_DTYPES[meta["dtype"]].itemsize * meta["dim"]
+            rows = self.delta_rows(self.file("delta_vec", generation), self.file("delta_ids", generation), row_bytes)
+            pairs = np.column_stack([
+                np.asarray(ids, dtype=ID_DTYPE),
+                np.full(len(ids), rows, dtype=ID_DTYPE)
+            ])
+            with open(self.file("tomb", generation), "ab") as f:
+                f.write(pairs.tobytes())
+
+    def needs_compaction(self) -> bool:
+        snapshot = ShardSnapshot.open(self)
+        if snapshot is None:
+            return False
+        return snapshot.delta_count >= max(COMPACT_MIN_DELTA_ROWS, COMPACT_DELTA_RATIO * snapshot.base_count) \
+            or len(snapshot.tombstones) >= COMPACT_MIN_DELTA_ROWS
+
+    def rewrite(self, ids: np.ndarray, vectors: np.ndarray, dtype: Optional[str] = None):
+        """Replace the shard contents with exactly these vectors as a new base"""
+        with self.locked():
+            meta = self.read_meta()
+            dtype = dtype or (meta["dtype"] if meta else "float32")
+            if meta is None or meta["dim"] != vectors.shape[1] or meta["dtype"] != dtype:
+                meta = self._write_meta(vectors.shape[1], dtype)
+            self._install_base(np.asarray(ids, dtype=ID_DTYPE), vectors, meta)
+
+    def compact(self):
+        """Fold the delta segment and tombstones into a fresh base generation"""
+        with self.locked():
+            snapshot = ShardSnapshot.open(self)
+            if snapshot is None or (snapshot.delta_count == 0 and len(snapshot.tombstones) == 0):
+                return
+            ids, vectors = snapshot.live()
+            self._install_base(ids, vectors, snapshot.meta)
+
+    def _install_base(self, ids: np.ndarray, vectors: np.ndarray, meta: dict):
+        old_generation = self.read_generation()
+        generation = old_generation + 1
+        row_dtype = SHARD_DTYPES[meta["dtype"]]
+        with open(self.file("base_vec", generation), "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=row_dtype).reshape(-1, meta["dim"]))
+        with open(self.file("base_ids", generation), "wb") as f:
+            np.save(f, ids)
+        self._write_generation(generation)
+        # Readers that still map the old files keep working; unlinked data stays
+        # valid until their mappings go away
+        for kind in ("base_vec", "base_ids", "delta_vec", "delta_ids", "tomb"):
+            try:
+                os.remove(self.file(kind, old_generation))
+            except FileNotFoundError:
+                pass
+
+class ShardSnapshot:
+    """Read-only, zero-copy view of a shard generation as of when it was opened"""
+
+    def __init__(self, shard: VectorShard, generation: int, meta: dict):
+        self.shard = shard
+        self.generation = generation
+        self.meta = meta
+        self.dim = meta["dim"]
+        self.dtype = SHARD_DTYPES[meta["dtype"]]
+        row_bytes = self.dtype.itemsize * self.dim
+
+        base_vec_path = shard.file("base_vec", generation)
+        if base_vec_path.exists():
+            self.base_vectors = np.load(base_vec_path, mmap_mode="r")
+            self.base_ids = np.load(shard.file("base_ids", generation), mmap_mode="r")
+        else:
+            self.base_vectors = np.empty((0, self.dim), dtype=self.dtype)
+            self.base_ids = np.empty(0, dtype=ID_DTYPE)
+
+        self.delta_vec_path = shard.file("delta_vec", generation)
+        self.delta_ids_path = shard.file("delta_ids", generation)
+        self.tomb_path = shard.file("tomb", generation)
+        self.delta_count = VectorShard.delta_rows(self.delta_vec_path, self.delta_ids_path, row_bytes)
+        if self.delta_count:
+            self.delta_vectors = np.memmap(self.delta_vec_path, dtype=self.dtype, mode="r", shape=(self.delta_count, self.dim))
+            self.delta_ids = np.memmap(self.delta_ids_path, dtype=ID_DTYPE, mode="r", shape=(self.delta_count,))
+        else:
+            self.delta_vectors = np.empty((0, self.dim), dtype=self.dtype)
+            self.delta_ids = np.empty(0, dtype=ID_DTYPE)
+        try:
+            self.tombstones = np.fromfile(self.tomb_path, dtype=ID_DTYPE)
+            self.tombstones = self.tombstones[:len(self.tombstones) // 2 * 2].reshape(-1, 2)
+        except FileNotFoundError:
+            self.tombstones = np.empty((0, 2), dtype=ID_DTYPE)
+        self._stat_key = self._file_sizes()
+        self._compute_masks()
+
+    @property
+    def base_count(self) -> int:
+        return len(self.base_ids)
+
+    def _file_sizes(self) -> Tuple[int, ...]:
+        sizes = []
+        for path in (self.delta_vec_path, self.delta_ids_path, self.tomb_path):
+            try:
+                sizes.append(path.stat().st_size)
+            except FileNotFoundError:
+                sizes.append(0)
+        return tuple(sizes)
+
+    def _compute_masks(self):
+        # Latest tombstone position per id: it hides delta rows before that position
+        tomb_pos: Dict[int, int] = {}
+        for entry_id, position in self.tombstones:
+            tomb_pos[int(entry_id)] = max(tomb_pos.get(int(entry_id), 0), int(position))
+        tomb_ids = np.fromiter(tomb_pos.keys(), dtype=ID_DTYPE, count=len(tomb_pos))
+
+        # Base rows precede every delta row and tombstone
+        self.base_valid = ~np.isin(self.base_ids, self.delta_ids) & ~np.isin(self.base_ids, tomb_ids)
+
+        # Within the delta, only the last occurrence of an id counts
+        self.delta_valid = np.zeros(self.delta_count, dtype=bool)
+        if self.delta_count:
+            _, from_end = np.unique(self.delta_ids[::-1], return_index=True)
+            self.delta_valid[self.delta_count - 1 - from_end] = True
+            if tomb_pos:
+                positions = np.array([tomb_pos.get(int(i), -1) for i in self.delta_ids], dtype=ID_DTYPE)
+                self.delta_valid &= positions <= np.arange(self.delta_count)
+
+    @classmethod
+    def open(cls, shard: VectorShard) -> Optional["ShardSnapshot"]:
+        for _ in range(3):
+            meta = shard.read_meta()
+            if meta is None:
+                return None
+            try:
+                return cls(shard, shard.read_generation(), meta)
+            except FileNotFoundError:
+                # Compaction swapped generations while we were opening; retry
+                continue
+        return None
+
+    def is_current(self) -> bool:
+        return self.shard.read_generation() == self.generation and self._file_sizes() == self._stat_key
+
+    def _scores(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return vectors @ query
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_CHUNK_ROWS):
+            chunk = vectors[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+        return scores
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.concatenate([
+            np.where(self.base_valid, self._scores(self.base_vectors, query), -np.inf),
+            np.where(self.delta_valid, self._scores(self.delta_vectors, query), -np.inf),
+        ])
+        ids = np.concatenate([self.base_ids, self.delta_ids])
+        live = int(self.base_valid.sum() + self.delta_valid.sum())
+        k = min(k, live)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def live(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Materialize the live (ids, vectors), for compaction"""
+        ids = np.concatenate([self.base_ids[self.base_valid], self.delta_ids[self.delta_valid]])
+        vectors = np.concatenate([self.base_vectors[self.base_valid], self.delta_vectors[self.delta_valid]])
+        return ids, vectors
+
+class ShardIndexRegistry:
+    """Per-process cache of mmapped shard snapshots, reopened when the shard changes.
+
+    Every API worker maps the same files, so vectors live once in the page cache
+    instead of once per process.
+    """
+
+    def __init__(self, root, max_open: int = MAX_OPEN_SHARDS):
+        self.root = Path(root)
+        self.max_open = max_open
+        self._snapshots: "OrderedDict[int, ShardSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def snapshot(self, user_id: int) -> Optional[ShardSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None and snapshot.is_current():
+                self._snapshots.move_to_end(user_id)
+                return snapshot
+        snapshot = ShardSnapshot.open(VectorShard(self.root, user_id))
+        with self._lock:
+            if snapshot is None:
+                self._snapshots.pop(user_id, None)
+            else:
+                self._snapshots[user_id] = snapshot
+                self._snapshots.move_to_end(user_id)
+                if len(self._snapshots) > self.max_open:
+                    self._snapshots.popitem(last=False)
+        return snapshot
+
+    def search(self, db: Session, user_id: int, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-k (entry_id, score) pairs for a normalized query vector"""
+        snapshot = self.snapshot(user_id)
+        return snapshot.search(query, k) if snapshot is not None else []
+
+    def remove_entry(self, user_id: int, entry_id: int):
+        shard = VectorShard(self.root, user_id)
+        if shard.exists():
+            shard.delete([entry_id])
@@ -1,15 +1,82 @@
-from celery import current_task
+from celery import chord, current_task
 from sqlalchemy.orm import Session
-from app.celery_app import celery_app
+from app.celery_app import celery_app, queue_for_entry_type
 from app.core.database import SessionLocal
 from app.models import models
 from app.services.file_service import FileService
+from app.services.blob_store import BlobStore
+from app.services.embedding_service import EmbeddingService
+from app.services.stats_service import StatsService
+from app.services.summary_service import SummaryService
+from app.services.chunk_service import ChunkService
+from app.services.audio_segments import stitch_timestamps
+from app.services.transcription_service import TranscriptionService
+from app.services.vector_store import VectorShard
+from app.services.document_extraction import UnsupportedDocumentError
+from app.core.config import settings
+from pathlib import Path
+from typing import Optional
+import argparse
 import logging
 import os
 import time
 
 logger = logging.getLogger(__name__)
 
+def schedule_embedding():
+    """Queue a batch embedding run shortly, so entries finishing together share a batch"""
+    embed_pending_entries_task.apply_async(countdown=settings.embedding_batch_delay)
+
+def schedule_processing(entry: models.Entry):
+    """Queue content extraction on the worker pool for the entry's media type"""
+    process_file_task.apply_async(args=(entry.id,), queue=queue_for_entry_type(entry.entry_type))
+
+def schedule_segment_transcription(entry_id: int, segments):
+    """Fan a recording's pending segments out to the transcription pool, stitching once all finish"""
+    finish = finish_transcription_task.si(entry_id)
+    # A segment out of retries fails the chord, which then never calls finish;
+    # the errback records the failure either way
+    finish.link_error(fail_transcription_task.si(entry_id))
+    pending = [segment.position for segment in segments if segment.text is None]
+    if not pending:
+        finish.apply_async()
+        return
+    chord(transcribe_segment_task.si(entry_id, position) for position in pending)(finish)
+
+def extraction_progress():
+    """Progress callback reporting document extraction through the task state, once per percent"""
+    last = {"percent": None}
+    def report(done: int, total: int, unit: str):
+        percent = int(100 * done / total) if total else 100
+        if percent != last["percent"]:
+            last["percent"] = percent
+            current_task.update_state(state='PROGRESS', meta={
+                # Extraction covers 25-75% of the task's overall progress
+                'progress': 25 + percent // 2, unit: done, f'{unit}s': total
+            })
+    return report
+
+def save_extracted_content(
+    db: Session, entry: models.Entry, content: str, timestamps=None, chunks_from: Optional[int] = None
+):
+    """Store an entry's extracted text and its passages, mark it processed and queue its embedding.
+
+    timestamps are a transcript's timed pieces; chunks_from is an entry with
+    identical content whose passages are copied instead of re-split.
+    """
+    entry.content = content
+    if chunks_from is not None:
+        ChunkService.copy(db, chunks_from, entry)
+    else:
+        ChunkService.rebuild(db, entry, timestamps)
+    StatsService.set_processed(db, entry, True)
+    # Any earlier embedding is stale now; the batch task re-embeds the entry
+    EmbeddingService.discard(db, entry)
+    db.commit()
+    # Index the extracted content for semantic search
+    if EmbeddingService.has_text(entry):
+        schedule_embedding()
+
 @celery_app.task(bind=True, max_retries=3, default_retry_delay=5)
 def process_file_task(self, entry_id: int):
     """Background task to process uploaded files with retry and file existence check"""
@@ -26,23 +93,48 @@ def process_file_task(self, entry_id: int):
             raise FileNotFoundError(f"File for entry {entry_id} does not exist: {entry.file_path}")
         # Update task progress
         current_task.update_state(state='PROGRESS', meta={'progress': 25})
+        # Reuse content if the same bytes were processed since this entry was queued
+        duplicate = None
+        if entry.content_hash:
+            duplicate = BlobStore.find_processed_duplicate(db, entry.content_hash, exclude_entry_id=entry.id)
         # Process file based on type
         content = ""
+        timestamps = None
         try:
-            if entry.entry_type == 'text':
-                content = file_service.process_text_file(entry.file_path)
+            if duplicate is not None:
+                content = duplicate.content
+                entry.speech_ratio = duplicate.speech_ratio
+            elif entry.entry_type == 'text':
+                content = file_service.process_text_file(entry.file_path, progress=extraction_progress())
             elif entry.entry_type == 'audio':
-                content = file_service.process_audio_file(entry.file_path)
+                # Long recordings are split at pauses and transcribed in parallel
+                segments = TranscriptionService.plan(db, entry)
+                if segments:
+                    schedule_segment_transcription(entry_id, segments)
+                    logger.info(f"Transcribing entry {entry_id} in {len(segments)} segments")
+                    return {"status": "chunked", "entry_id": entry_id, "segments": len(segments)}
+                if entry.speech_ratio == 0:
+                    # Silence or background noise only; nothing to transcribe
+                    content = ""
+                else:
+                    content, timestamps = stitch_timestamps([file_service.transcribe_audio_file(entry.file_path)])
             elif entry.entry_type == 'image':
                 content = file_service.process_image_file(entry.file_path)
+        except UnsupportedDocumentError as e:
+            # Retrying cannot help a format we do not read
+            logger.error(f"Processing failed for entry {entry_id}: {str(e)}")
+            StatsService.set_processed(db, entry, False)
+            db.commit()
+            current_task.update_state(state='FAILURE', meta={'error': str(e)})
+            return {"status": "failed", "entry_id": entry_id, "error": str(e)}
         except Exception as e:
             logger.error(f"Processing failed for entry {entry_id}: {str(e)}. Retrying...")
             raise self.retry(exc=e)
         current_task.update_state(state='PROGRESS', meta={'progress': 75})
         # Update entry with extracted content
-        entry.content = content
-        entry.processed = True
-        db.commit()
+        save_extracted_content(
+            db, entry, content, timestamps, chunks_from=duplicate.id if duplicate is not None else None
+        )
         current_task.update_state(state='SUCCESS', meta={'progress': 100})
         logger.info(f"Successfully processed file for entry {entry_id}")
         return {"status": "success", "entry_id": entry_id}
@@ -50,7 +142,7 @@ def process_file_task(self, entry_id: int):
         logger.error(str(fnf))
         entry = db.query(models.Entry).filter(models.Entry.id == entry_id).first()
         if entry:
-            entry.processed = False
+            StatsService.set_processed(db, entry, False)
             db.commit()
         current_task.update_state(
             state='FAILURE',
@@ -61,7 +153,7 @@ def process_file_task(self, entry_id: int):
         logger.error(f"Error processing file for entry {entry_id}: {str(e)}")
         entry = db.query(models.Entry).filter(models.Entry.id == entry_id).first()
         if entry:
-            entry.processed = False
+            StatsService.set_processed(db, entry, False)
             db.commit()
         current_task.update_state(
             state='FAILURE',
@@ -71,52 +163,218 @@ def process_file_task(self, entry_id: int):
     finally:
         db.close()
 
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=5)
+def transcribe_segment_task(self, entry_id: int, position: int):
+    """Transcribe one segment of a long recording and checkpoint its text"""
+    db = SessionLocal()
+    try:
+        segment = db.query(models.AudioSegment).filter(
+            models.AudioSegment.entry_id == entry_id,
+            models.AudioSegment.position == position
+        ).first()
+        entry = db.query(models.Entry).filter(models.Entry.id == entry_id).first()
+        if segment is None or entry is None:
+            return {"status": "skipped", "entry_id": entry_id, "position": position}
+        if segment.text is not None:
+            # Finished by an earlier attempt
+            return {"status": "cached", "entry_id": entry_id, "position": position}
+        try:
+            timestamps = FileService().transcribe_audio_range(entry.file_path, segment.start_seconds, segment.end_seconds)
+        except Exception as e:
+            logger.error(f"Transcribing segment {position} of entry {entry_id} failed: {str(e)}. Retrying...")
+            raise self.retry(exc=e)
+        segment.timestamps = [list(timestamp) for timestamp in timestamps]
+        segment.text = " ".join(text for _, _, text in timestamps if text)
+        db.commit()
+        return {"status": "success", "entry_id": entry_id, "position": position}
+    finally:
+        db.close()
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=5)
+def finish_transcription_task(self, entry_id: int):
+    """Stitch a recording's transcribed segments into the entry's content"""
+    db = SessionLocal()
+    try:
+        entry = db.query(models.Entry).filter(models.Entry.id == entry_id).first()
+        if entry is None:
+            return {"status": "skipped", "entry_id": entry_id}
+        stitched = TranscriptionService.stitch(db, entry_id)
+        if stitched is None:
+            raise self.retry(exc=Exception(f"Entry {entry_id} still has untranscribed segments"))
+        content, timestamps = stitched
+        save_extracted_content(db, entry, content, timestamps)
+        logger.info(f"Successfully transcribed entry {entry_id}")
+        return {"status": "success", "entry_id": entry_id}
+    finally:
+        db.close()
+
 @celery_app.task
-def generate_weekly_summary_task(user_id: int, week_start: str, week_end: str):
-    """Background task to generate weekly summaries using GPT-4"""
+def fail_transcription_task(entry_id: int):
+    """Errback of a segmented transcription: mark the entry unprocessed and log why"""
     db = SessionLocal()
-    
     try:
-        # Get user entries for the week
-        from datetime import datetime
-        start_date = datetime.fromisoformat(week_start)
-        end_date = datetime.fromisoformat(week_end)
-        
-        entries = db.query(models.Entry).filter(
-            models.Entry.user_id == user_id,
-            models.Entry.created_at >= start_date,
-            models.Entry.created_at <= end_date,
-            models.Entry.processed == True
-        ).all()
-        
-        if not entries:
-            return {"status": "no_entries"}
-        
-        # Combine all content
-        combined_content = "\n\n".join([
-            f"Entry {i+1} ({entry.entry_type}): {entry.content[:500]}..."
-            for i, entry in enumerate(entries)
-        ])
-        
-        # Generate summary using OpenAI (placeholder for now)
-        summary = f"Weekly summary for {len(entries)} entries from {week_start} to {week_end}. " \
-                 f"Activities included various {', '.join(set(e.entry_type for e in entries))} entries."
-        
-        # Save summary to database
-        weekly_summary = models.WeeklySummary(
-            user_id=user_id,
-            week_start=start_date,
-            week_end=end_date,
-            summary=summary
-        )
-        db.add(weekly_summary)
+        entry = db.query(models.Entry).filter(models.Entry.id == entry_id).first()
+        if entry is None:
+            return {"status": "skipped", "entry_id": entry_id}
+        missing = [segment.position for segment in TranscriptionService.segments(db, entry_id) if segment.text is None]
+        logger.error(f"Transcription of entry {entry_id} failed; untranscribed segments: {missing}")
+        StatsService.set_processed(db, entry, False)
         db.commit()
-        
-        logger.info(f"Generated weekly summary for user {user_id}")
-        return {"status": "success", "summary_id": weekly_summary.id}
-        
+        return {"status": "failed", "entry_id": entry_id, "missing_segments": missing}
+    finally:
+        db.close()
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=30)
+def embed_pending_entries_task(self, batch_size: Optional[int] = None, max_entries: Optional[int] = None):
+    """Background task to embed processed entries that have no SearchIndex row yet.
+
+    Entries are encoded in batches with the model cached on the worker process
+    and written back with one bulk insert per batch. Triggered (with a short
+    countdown so bursts coalesce) whenever an entry finishes processing, and
+    periodically by beat as a safety net.
+    """
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        embedded = EmbeddingService.embed_pending(db, batch_size=batch_size, max_entries=max_entries)
+        elapsed = time.perf_counter() - start
+        rate = embedded / elapsed if elapsed > 0 else 0.0
+        if embedded:
+            logger.info(f"Embedded {embedded} entries in {elapsed:.2f}s ({rate:.1f} entries/sec)")
+        return {"status": "success", "embedded": embedded, "seconds": elapsed, "entries_per_sec": rate}
+    except ImportError as e:
+        # No embedding model installed; semantic search is simply unavailable
+        logger.warning(f"Skipping embeddings: {str(e)}")
+        return {"status": "unavailable"}
     except Exception as e:
-        logger.error(f"Error generating weekly summary: {str(e)}")
-        raise e
+        db.rollback()
+        logger.error(f"Embedding batch failed: {str(e)}. Retrying...")
+        raise self.retry(exc=e)
     finally:
         db.close()
+
+@celery_app.task
+def compact_vector_shards_task():
+    """Periodic task to fold delta segments and tombstones into fresh shard bases"""
+    root = Path(settings.vector_dir)
+    if not root.is_dir():
+        return {"status": "success", "compacted": 0}
+    compacted = 0
+    for user_dir in root.iterdir():
+        if not user_dir.name.isdigit():
+            continue
+        shard = VectorShard(root, int(user_dir.name))
+        if shard.needs_compaction():
+            shard.compact()
+            compacted += 1
+    if compacted:
+        logger.info(f"Compacted {compacted} vector shards")
+    return {"status": "success", "compacted": compacted}
+
+@celery_app.task
+def generate_weekly_summary_task(job_id: int):
+    """Background task to generate the weekly summary a SummaryJob asks for"""
+    db = SessionLocal()
+    try:
+        job = db.get(models.SummaryJob, job_id)
+        if job is None:
+            return {"status": "skipped", "job_id": job_id}
+        job.status = "running"
+        db.commit()
+        try:
+            summary = SummaryService.write_week(db, job.user_id, job.week_start, job.week_end)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error generating weekly summary for job {job_id}: {str(e)}")
+            SummaryService.fail(db, job, str(e))
+            return {"status": "failed", "job_id": job_id}
+        job.status, job.summary_id = "done", summary.id
+        db.commit()
+        logger.info(f"Generated weekly summary for user {job.user_id}")
+        return {"status": "success", "job_id": job_id, "summary_id": summary.id}
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run processing jobs outside of Celery")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill = subparsers.add_parser(
+        "backfill-embeddings",
+        help="Embed every processed entry that has no SearchIndex row yet"
+    )
+    backfill.add_argument("--batch-size", type=int, default=None)
+    backfill.add_argument("--max-entries", type=int, default=None)
+    subparsers.add_parser(
+        "rebuild-vector-shards",
+        help="Rewrite every user's on-disk vector shard from the search_index table"
+    )
+    subparsers.add_parser(
+        "rebuild-entry-chunks",
+        help="Re-split every processed entry's content into search passages"
+    )
+    subparsers.add_parser(
+        "rebuild-user-stats",
+        help="Recompute every user's entry counters from the entries table"
+    )
+    subparsers.add_parser(
+        "rebuild-daily-activity",
+        help="Recompute the per-day activity rollup from the entries table"
+    )
+    period = subparsers.add_parser(
+        "summarize-period",
+        help="Summarize a month, year or other range from a user's stored weekly summaries"
+    )
+    period.add_argument("--user-id", type=int, required=True)
+    period.add_argument("--date-from", required=True, help="YYYY-MM-DD")
+    period.add_argument("--date-to", required=True, help="YYYY-MM-DD")
+    args = parser.parse_args()
+    
+    if args.command == "backfill-embeddings":
+        logging.basicConfig(level=logging.INFO)
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            embedded = EmbeddingService.embed_pending(db, batch_size=args.batch_size, max_entries=args.max_entries)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+        rate = embedded / elapsed if elapsed > 0 else 0.0
+        print(f"Embedded {embedded} entries in {elapsed:.2f}s ({rate:.1f} entries/sec)")
+    elif args.command == "rebuild-vector-shards":
+        db = SessionLocal()
+        try:
+            users = EmbeddingService.rebuild_vector_shards(db)
+        finally:
+            db.close()
+        print(f"Rebuilt vector shards for {users} users")
+    elif args.command == "rebuild-entry-chunks":
+        db = SessionLocal()
+        try:
+            entries = ChunkService.rebuild_all(db)
+        finally:
+            db.close()
+        print(f"Rebuilt passages for {entries} entries")
+    elif args.command == "rebuild-user-stats":
+        db = SessionLocal()
+        try:
+            users = StatsService.rebuild(db)
+        finally:
+            db.close()
+        print(f"Rebuilt entry counters for {users} users")
+    elif args.command == "rebuild-daily-activity":
+        db = SessionLocal()
+        try:
+            rows = StatsService.rebuild_daily_activity(db)
+        finally:
+            db.close()
+        print(f"Rebuilt {rows} daily activity rows")
+    elif args.command == "summarize-period":
+        from datetime import date
+        db = SessionLocal()
+        try:
+            summary = SummaryService.summarize_weeks(
+                db, args.user_id, date.fromisoformat(args.date_from), date.fromisoformat(args.date_to)
+            )
+        finally:
+            db.close()
+        print(summary or "No weekly summaries in that range")
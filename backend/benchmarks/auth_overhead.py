@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Benchmark per-request JWT verification overhead with and without the verified-token cache.
+
+Times verify_token on the same bearer token repeated many times, the way a
+session's requests arrive: once with the cache disabled (full jwt.decode and
+signature check every call) and once with it enabled.
+
+Usage:
+    python benchmarks/auth_overhead.py --requests 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import auth_service
+from app.services.auth_service import AuthService, VerifiedTokenCache, verify_token
+
+
+def time_verify(token: str, requests: int) -> float:
+    """Mean microseconds per verify_token call"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        verify_token(token)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50_000)
+    args = parser.parse_args()
+
+    token = AuthService.create_access_token(data={"sub": "1", "email": "bench@example.com"})
+
+    auth_service.token_cache = VerifiedTokenCache(max_size=0)
+    uncached = time_verify(token, args.requests)
+
+    auth_service.token_cache = VerifiedTokenCache(max_size=10_000)
+    cached = time_verify(token, args.requests)
+    stats = auth_service.token_cache.stats()
+
+    print(f"jwt.decode every request: {uncached:8.2f} us/request")
+    print(f"verified-token cache:     {cached:8.2f} us/request ({uncached / cached:.0f}x faster)")
+    print(f"cache hits={stats['hits']} misses={stats['misses']}")
+
+
+if __name__ == "__main__":
+    main()
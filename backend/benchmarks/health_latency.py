@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Load test: /health latency while logins and uploads run concurrently.
+
+Drives the ASGI app in-process on one event loop, the way a single uvicorn
+worker serves it, so any handler that blocks the loop shows up directly as
+/health latency. Runs a quiet phase (only /health probes) and a loaded phase
+(probes plus demo logins, which hash/verify with bcrypt, and file uploads),
+then compares p50/p99.
+
+Uses a throwaway SQLite database and upload directory.
+
+Usage:
+    python benchmarks/health_latency.py --seconds 10 --logins 4 --uploads 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="lifelog-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(WORKDIR, "uploads"))
+os.environ.setdefault("VECTOR_DIR", os.path.join(WORKDIR, "vectors"))
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.celery_app import celery_app
+from app.core.database import Base, engine
+from app.main import app
+
+# No broker or workers here: processing tasks are queued in memory and never run
+celery_app.conf.result_backend = "cache+memory://"
+
+PASSWORD = "bench-password"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def probe_health(client, stop, latencies, interval=0.005):
+    # Fixed-rate schedule measured from each probe's intended send time, so a
+    # stalled event loop counts against every probe it delayed
+    next_send = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+        await client.get("/health")
+        latencies.append((time.perf_counter() - next_send) * 1000)
+        next_send += interval
+
+
+async def login_worker(client, stop, worker, counts):
+    while not stop.is_set():
+        response = await client.post("/auth/demo", json={"email": f"bench{worker}@example.com", "password": PASSWORD})
+        counts["logins" if response.status_code == 200 else "errors"] += 1
+
+
+async def upload_worker(client, stop, token, worker, counts):
+    headers = {"Authorization": f"Bearer {token}"}
+    # ~1MB of prose. Multipart parsing runs on the event loop, and payloads made
+    # mostly of the boundary's own characters (e.g. hex) hit its slow path
+    body = b"Meeting notes: we discussed the quarterly roadmap and next steps.\n" * 16384
+    sequence = 0
+    while not stop.is_set():
+        sequence += 1
+        files = {"file": (f"note_{worker}_{sequence}.txt", body + str(sequence).encode(), "text/plain")}
+        response = await client.post("/uploads/file", files=files, headers=headers)
+        counts["uploads" if response.status_code == 200 else "errors"] += 1
+
+
+async def run_phase(client, seconds, logins=0, uploads=0, token=None):
+    stop = asyncio.Event()
+    latencies, counts = [], {"logins": 0, "uploads": 0, "errors": 0}
+    tasks = [asyncio.create_task(probe_health(client, stop, latencies))]
+    tasks += [asyncio.create_task(login_worker(client, stop, i, counts)) for i in range(logins)]
+    tasks += [asyncio.create_task(upload_worker(client, stop, token, i, counts)) for i in range(uploads)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, counts
+
+
+async def main(args):
+    Base.metadata.create_all(bind=engine)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        # Register the login users up front so the loaded phase measures verify, not signup
+        for worker in range(args.logins):
+            await client.post("/auth/demo", json={"email": f"bench{worker}@example.com", "password": PASSWORD})
+        response = await client.post("/auth/demo", json={"email": "uploader@example.com", "password": PASSWORD})
+        token = response.json()["access_token"]
+
+        quiet, _ = await run_phase(client, args.seconds)
+        loaded, counts = await run_phase(client, args.seconds, args.logins, args.uploads, token)
+
+    for label, latencies in (("quiet", quiet), ("loaded", loaded)):
+        print(
+            f"/health {label:>6}: n={len(latencies):5d} p50={statistics.median(latencies):7.2f}ms "
+            f"p99={percentile(latencies, 99):7.2f}ms max={max(latencies):7.2f}ms"
+        )
+    print(f"loaded phase: {counts['logins']} logins, {counts['uploads']} uploads, {counts['errors']} errors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--logins", type=int, default=4)
+    parser.add_argument("--uploads", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Import-time budget check for the API and Celery worker entry points.
+
+Runs `python -X importtime` in fresh subprocesses for app.main (what uvicorn
+imports) and for app.celery_app plus the task modules it includes (what
+`celery -A app.celery_app worker` imports), takes the median cumulative time
+over several runs, and exits non-zero if either exceeds its budget or if a
+heavy optional dependency is imported eagerly.
+
+Usage:
+    python benchmarks/import_time.py --runs 5 --api-budget-ms 1200 --worker-budget-ms 800
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "api": ["app.main"],
+    "worker": ["app.celery_app", "app.tasks.processing_tasks"],
+}
+
+# Must only be imported on first use (see model_registry and the lazy imports
+# in file_service, auth_service, semantic_index and principal_cache)
+DEFERRED_MODULES = [
+    "openai", "whisper", "faster_whisper", "torch", "sentence_transformers", "pytesseract", "PIL",
+    "faiss", "google.auth.transport.requests", "redis",
+]
+
+
+def import_once(modules):
+    """Cumulative import time in ms per module, plus the modules that ended up loaded"""
+    code = (
+        f"import sys; import {', '.join(modules)}; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name.strip()
+        if name in modules and cumulative_us.strip().isdigit():
+            cumulative[name] = int(cumulative_us) / 1000
+    eager = [m for m in result.stdout.strip().split(",") if m]
+    return sum(cumulative.values()), eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-budget-ms", type=float, default=float(os.environ.get("API_IMPORT_BUDGET_MS", 1200)))
+    parser.add_argument("--worker-budget-ms", type=float, default=float(os.environ.get("WORKER_IMPORT_BUDGET_MS", 800)))
+    args = parser.parse_args()
+    budgets = {"api": args.api_budget_ms, "worker": args.worker_budget_ms}
+
+    failed = False
+    for role, modules in ENTRY_POINTS.items():
+        timings, eager = [], []
+        for _ in range(args.runs):
+            elapsed, eager = import_once(modules)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+        over = median > budgets[role]
+        print(
+            f"{role:>6}: median {median:7.1f}ms (min {min(timings):.1f}, max {max(timings):.1f}) "
+            f"budget {budgets[role]:.0f}ms {'OVER BUDGET' if over else 'ok'}"
+        )
+        if eager:
+            print(f"{role:>6}: eagerly imported: {', '.join(eager)}")
+        failed |= over or bool(eager)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
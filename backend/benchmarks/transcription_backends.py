@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark transcription backends: wall time and peak RSS per audio minute.
+
+Each backend runs in a fresh subprocess so ru_maxrss reflects only that
+backend's model. Audio is a real recording (--audio, anything ffmpeg decodes)
+or a synthetic speech-like memo; the VAD pass is skipped so every backend sees
+the same samples. Backends that cannot be loaded (usually a missing
+package) are reported as skipped.
+
+Usage:
+    python benchmarks/transcription_backends.py --audio memo.m4a --model base --threads 4
+    python benchmarks/transcription_backends.py --backends whisper,faster-whisper --minutes 2
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.audio_segments import SAMPLE_RATE, read_audio
+from app.services.transcription_backends import TRANSCRIPTION_BACKENDS, create_transcription_backend
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_audio(args):
+    if args.audio:
+        return read_audio(args.audio)
+    from vad_savings import synthetic_memo
+    return synthetic_memo(args.minutes, speech_fraction=1.0)
+
+
+def run_backend(args):
+    """Child process: load one backend, transcribe once, print a JSON result line"""
+    audio = load_audio(args)
+    baseline_rss = peak_rss_mb()
+    try:
+        start = time.perf_counter()
+        backend = create_transcription_backend(args.run, args.model, args.threads)
+        load_seconds = time.perf_counter() - start
+    except Exception as e:
+        # Missing package, or a model that cannot be loaded here
+        print(json.dumps({"backend": args.run, "skipped": f"{type(e).__name__}: {e}"}))
+        return
+    start = time.perf_counter()
+    backend.transcribe(audio)
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        "backend": args.run,
+        "audio_minutes": len(audio) / SAMPLE_RATE / 60,
+        "load_seconds": load_seconds,
+        "seconds": seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "model_rss_mb": peak_rss_mb() - baseline_rss,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(TRANSCRIPTION_BACKENDS))
+    parser.add_argument("--audio", default=None)
+    parser.add_argument("--minutes", type=float, default=1)
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_backend(args)
+        return
+
+    print(f"{'backend':<16}{'load s':>8}{'s/audio min':>13}{'peak RSS MB':>13}{'model MB':>10}")
+    for name in args.backends.split(","):
+        child = [sys.executable, __file__, "--run", name, "--model", args.model,
+                 "--threads", str(args.threads), "--minutes", str(args.minutes)]
+        if args.audio:
+            child += ["--audio", args.audio]
+        output = subprocess.run(child, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if "skipped" in result:
+            print(f"{name:<16}skipped: {result['skipped']}")
+            continue
+        per_minute = result["seconds"] / result["audio_minutes"]
+        print(f"{name:<16}{result['load_seconds']:8.1f}{per_minute:13.2f}"
+              f"{result['peak_rss_mb']:13.0f}{result['model_rss_mb']:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
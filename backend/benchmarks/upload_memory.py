@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark peak RSS and bytes read for concurrent large uploads through the HTTP layer.
+
+Posts multipart uploads to POST /uploads/file on the ASGI app in-process, so
+the request goes through UploadSizeLimitMiddleware, Starlette's multipart
+parser and FileService's streaming save, the way uvicorn would serve it. Two
+modes, each in a fresh subprocess so ru_maxrss reflects only that mode:
+
+    accepted  - MAX_FILE_SIZE above the upload size; every upload is stored
+    oversized - MAX_FILE_SIZE at a tenth of the upload size; every upload
+                should get a 413 without its body being read
+
+Uses a throwaway SQLite database and upload directory.
+
+Usage:
+    python benchmarks/upload_memory.py --concurrency 8 --size-mb 100
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="lifelog-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(WORKDIR, "uploads"))
+os.environ.setdefault("VECTOR_DIR", os.path.join(WORKDIR, "vectors"))
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import Base, engine
+from app.main import app
+from app.services.file_service import UPLOAD_CHUNK_SIZE
+
+# No broker or workers here: processing tasks are queued in memory and never run
+celery_app.conf.result_backend = "cache+memory://"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class CountingFile:
+    """Disk-backed upload body that counts how much of it the client was asked to send"""
+
+    def __init__(self, size_bytes: int):
+        self.file = tempfile.TemporaryFile()
+        block = os.urandom(UPLOAD_CHUNK_SIZE)
+        remaining = size_bytes
+        while remaining > 0:
+            self.file.write(block[:remaining])
+            remaining -= len(block)
+        self.file.seek(0)
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+async def upload(client: httpx.AsyncClient, token: str, body: CountingFile, index: int) -> int:
+    files = {"file": (f"memo_{index}.wav", body, "audio/wav")}
+    response = await client.post("/uploads/file", files=files, headers={"Authorization": f"Bearer {token}"})
+    return response.status_code
+
+
+async def run_mode(mode: str, concurrency: int, size_bytes: int) -> None:
+    settings.max_file_size = size_bytes * 2 if mode == "accepted" else size_bytes // 10
+    Base.metadata.create_all(bind=engine)
+    bodies = [CountingFile(size_bytes) for _ in range(concurrency)]
+    baseline = peak_rss_mb()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        response = await client.post("/auth/demo", json={"email": f"{mode}@example.com", "password": "bench-password"})
+        token = response.json()["access_token"]
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*[upload(client, token, body, i) for i, body in enumerate(bodies)])
+        elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    sent_mb = sum(body.bytes_read for body in bodies) / (1024 * 1024)
+    for body in bodies:
+        body.close()
+    print(
+        f"{mode:>9}: {concurrency} x {size_bytes // (1024 * 1024)}MB uploads in {elapsed:.2f}s, "
+        f"statuses {sorted(set(statuses))}, {sent_mb:.1f}MB of bodies read, "
+        f"peak RSS {peak:.1f}MB (+{peak - baseline:.1f}MB over baseline)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--mode", choices=["accepted", "oversized"])
+    args = parser.parse_args()
+    size_bytes = args.size_mb * 1024 * 1024
+
+    if args.mode:
+        asyncio.run(run_mode(args.mode, args.concurrency, size_bytes))
+        return
+
+    for mode in ("accepted", "oversized"):
+        subprocess.run([
+            sys.executable, __file__,
+            "--mode", mode,
+            "--concurrency", str(args.concurrency),
+            "--size-mb", str(args.size_mb),
+        ], check=True)
+
+
+if __name__ == "__main__":
+    main()
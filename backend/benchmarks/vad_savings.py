@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark transcription time saved by the voice-activity pre-pass.
+
+Builds a synthetic memo: background noise with speech-like bursts (noise
+amplitude-modulated at syllable rate) covering --speech-fraction of the
+recording. Times whisper on the full recording and on the speech kept by
+compact_speech, plus the cost of the VAD pass itself. Without a working
+whisper install only the VAD cost and the audio seconds avoided are reported.
+
+Usage:
+    python benchmarks/vad_savings.py --minutes 5 --speech-fraction 0.2 --model base
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.audio_segments import SAMPLE_RATE, compact_speech
+
+
+def synthetic_memo(minutes: float, speech_fraction: float, seed: int = 0) -> np.ndarray:
+    """Noise floor with speech-like bursts of 2-6s placed at random"""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * SAMPLE_RATE)
+    audio = (0.002 * rng.standard_normal(total)).astype(np.float32)
+    speech_samples = int(total * speech_fraction)
+    while speech_samples > 0:
+        length = min(int(rng.uniform(2, 6) * SAMPLE_RATE), speech_samples)
+        start = int(rng.integers(0, total - length))
+        t = np.arange(length) / SAMPLE_RATE
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))  # ~4 syllables per second
+        audio[start:start + length] += (0.2 * envelope * rng.standard_normal(length)).astype(np.float32)
+        speech_samples -= length
+    return np.clip(audio, -1, 1)
+
+
+def load_model(name: str):
+    try:
+        import whisper
+        return whisper.load_model(name)
+    except (ImportError, AttributeError):
+        return None
+
+
+def time_transcribe(model, audio: np.ndarray) -> float:
+    start = time.perf_counter()
+    model.transcribe(audio, fp16=False)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=5)
+    parser.add_argument("--speech-fraction", type=float, default=0.2)
+    parser.add_argument("--model", default="base")
+    args = parser.parse_args()
+
+    audio = synthetic_memo(args.minutes, args.speech_fraction)
+    start = time.perf_counter()
+    speech, _ = compact_speech(audio)
+    vad_seconds = time.perf_counter() - start
+
+    total_audio = len(audio) / SAMPLE_RATE
+    kept_audio = len(speech) / SAMPLE_RATE
+    print(f"recording:  {total_audio:8.1f}s of audio")
+    print(f"VAD kept:   {kept_audio:8.1f}s ({kept_audio / total_audio:.0%}) in {vad_seconds * 1000:.0f}ms")
+
+    model = load_model(args.model)
+    if model is None:
+        print("openai-whisper not installed; skipping transcription timings")
+        return
+    full = time_transcribe(model, audio)
+    compacted = time_transcribe(model, speech) + vad_seconds
+    print(f"whisper, full recording: {full:8.1f}s")
+    print(f"whisper, speech only:    {compacted:8.1f}s including VAD ({1 - compacted / full:.0%} saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,72 @@ import os
 # Add the app directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.database import engine, Base
-from app.models.models import User, Entry, WeeklySummary, SearchIndex
+from sqlalchemy import func, inspect, text, update
+from app.core.database import engine, Base, SessionLocal
+from app.models.models import ENTRY_PREVIEW_CHARS, User, Entry, EntryChunk, AudioSegment, FileBlob, UserStats, DailyActivity, WeeklySummary, SummaryJob, SummaryCache, SearchIndex
+from app.services.fulltext_index import install_sqlite_fts, install_postgres_fts
+from app.services.stats_service import StatsService
+from app.services.chunk_service import ChunkService
+
+def add_missing_columns(table):
+    """Add nullable columns introduced after the table was created"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"Added column {table.name}.{column.name}.")
+
+def add_search_index_unique_entry():
+    """Make search_index.entry_id unique, as the embedding upsert relies on, keeping
+    the newest row of any entry embedded twice before the index existed"""
+    with engine.begin() as connection:
+        deleted = connection.execute(text(
+            "DELETE FROM search_index WHERE id NOT IN "
+            "(SELECT MAX(id) FROM search_index GROUP BY entry_id) AND entry_id IS NOT NULL"
+        )).rowcount
+        if deleted:
+            print(f"Removed {deleted} duplicate search_index rows.")
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_search_index_entry_id ON search_index (entry_id)"
+        ))
 
 def init_database():
     """Create all database tables."""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    # create_all skips new columns and indexes on tables that already exist
+    add_missing_columns(Entry.__table__)
+    with engine.begin() as connection:
+        connection.execute(
+            update(Entry).where(Entry.preview.is_(None), Entry.content.isnot(None))
+            .values(preview=func.substr(Entry.content, 1, ENTRY_PREVIEW_CHARS))
+        )
+    for index in Entry.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    add_search_index_unique_entry()
+    if engine.dialect.name == "sqlite":
+        # Add the full-text index to databases created before it existed
+        with engine.begin() as connection:
+            install_sqlite_fts(connection, rebuild=True)
+        print("SQLite full-text index is up to date.")
+    elif engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            install_postgres_fts(connection)
+        print("PostgreSQL search_vector column and GIN index are up to date.")
+    # Roll up entries created before the daily_activity table existed
+    db = SessionLocal()
+    try:
+        if db.query(Entry.id).first() and not db.query(DailyActivity.user_id).first():
+            rows = StatsService.rebuild_daily_activity(db)
+            print(f"Rolled up existing entries into {rows} daily activity rows.")
+        # Split entries processed before entry_chunks existed into search passages
+        if db.query(Entry.id).filter(Entry.processed == True).first() and not db.query(EntryChunk.id).first():
+            entries = ChunkService.rebuild_all(db)
+            print(f"Split {entries} existing entries into search passages.")
+    finally:
+        db.close()
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
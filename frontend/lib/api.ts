@@ -19,6 +19,15 @@ export interface WeeklySummary {
   created_at: string
 }
 
+export interface SummaryJob {
+  id: number
+  week_start: string
+  week_end: string
+  status: 'pending' | 'running' | 'done' | 'failed'
+  error?: string | null
+  summary?: WeeklySummary | null
+}
+
 export interface UploadResponse {
   id: string
   message: string
@@ -145,10 +154,19 @@ class ApiClient {
     return this.request<WeeklySummary[]>(`/timeline/weekly-summaries?limit=${limit}`)
   }
 
-  async generateWeeklySummary(): Promise<WeeklySummary> {
-    return this.request<WeeklySummary>('/timeline/generate-summary', {
+  // Generation runs in the background; poll the job until it finishes
+  async generateWeeklySummary(pollMs: number = 2000): Promise<WeeklySummary> {
+    let job = await this.request<SummaryJob>('/timeline/generate-summary', {
       method: 'POST',
     })
+    while (job.status === 'pending' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, pollMs))
+      job = await this.request<SummaryJob>(`/timeline/summary-jobs/${job.id}`)
+    }
+    if (job.status === 'failed' || !job.summary) {
+      throw new Error(job.error || 'Summary generation failed')
+    }
+    return job.summary
   }
 
   // Health check